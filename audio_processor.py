@@ -4,9 +4,115 @@ Audio Processor Module
 Handles audio extraction from MP4 files and audio chunking using FFmpeg.
 """
 
+import asyncio
+import json
+import math
 import os
+import re
 import subprocess
-from typing import List
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from metrics import FFMPEG_SECONDS
+from models import AudioChunk
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """ffmpeg output settings used when re-encoding audio for transcription."""
+    name: str
+    extension: str
+    codec_args: Tuple[str, ...]
+    bitrate_kbps: float  # Approximate average, used to estimate output size
+    description: str
+
+
+ENCODING_PROFILES = {
+    # Mono 16 kHz Opus: Whisper resamples to 16 kHz mono anyway, and Opus
+    # keeps speech intelligible at very low bitrates
+    'speech_opus': EncodingProfile(
+        name='speech_opus',
+        extension='.ogg',
+        codec_args=('-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', '24k', '-application', 'voip'),
+        bitrate_kbps=24,
+        description='Mono 16 kHz Opus at 24 kbps (~10.5 MB per hour)'
+    ),
+    # Same sample rate and channels in MP3, for ffmpeg builds without libopus
+    'speech_mp3': EncodingProfile(
+        name='speech_mp3',
+        extension='.mp3',
+        codec_args=('-ac', '1', '-ar', '16000', '-c:a', 'libmp3lame', '-b:a', '48k'),
+        bitrate_kbps=48,
+        description='Mono 16 kHz MP3 at 48 kbps (~21 MB per hour)'
+    ),
+    # The original high-quality stereo extraction
+    'mp3_hq': EncodingProfile(
+        name='mp3_hq',
+        extension='.mp3',
+        codec_args=('-c:a', 'libmp3lame', '-q:a', '2'),
+        bitrate_kbps=190,
+        description='Stereo VBR MP3 at -q:a 2 (~85 MB per hour)'
+    ),
+}
+
+DEFAULT_ENCODING_PROFILE = os.getenv('AUDIO_ENCODING_PROFILE', 'speech_opus')
+
+# Chunk boundary placement: cuts move into a pause near the target time, or
+# fall back to a hard cut with a short overlap that is de-duplicated on merge
+SILENCE_THRESHOLD_DB = float(os.getenv('CHUNK_SILENCE_THRESHOLD_DB', '-35'))
+SILENCE_MIN_SECONDS = float(os.getenv('CHUNK_SILENCE_MIN_SECONDS', '0.4'))
+SILENCE_SEARCH_SECONDS = float(os.getenv('CHUNK_SILENCE_SEARCH_SECONDS', '30'))
+CHUNK_OVERLAP_SECONDS = float(os.getenv('CHUNK_OVERLAP_SECONDS', '2'))
+
+# Share of the size limit chunks are planned to fill: variable-bitrate audio
+# is denser in some spans than on average, and overlaps add a few seconds.
+# Chunks cut over the limit anyway are split again before they are yielded
+CHUNK_SIZE_MARGIN = float(os.getenv('CHUNK_SIZE_MARGIN', '0.85'))
+
+
+@dataclass(frozen=True)
+class PlannedSegment:
+    """A span of the source audio to cut into one chunk."""
+    start: float
+    end: float
+    overlap: float = 0.0  # Seconds at the start repeated from the previous segment
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """What a single ffprobe call reports about an input file."""
+    duration: float
+    size_mb: float
+    has_video: bool
+    audio_codec: Optional[str]
+
+
+def get_encoding_profile(name: Optional[str] = None) -> EncodingProfile:
+    """
+    Look up an encoding profile by name.
+    
+    Args:
+        name: Profile name (default: AUDIO_ENCODING_PROFILE or 'speech_opus')
+        
+    Returns:
+        EncodingProfile: The matching profile
+        
+    Raises:
+        ValueError: If the profile does not exist
+    """
+    name = name or DEFAULT_ENCODING_PROFILE
+    try:
+        return ENCODING_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown audio encoding profile '{name}'. "
+            f"Available profiles: {', '.join(ENCODING_PROFILES)}"
+        )
 
 
 def get_file_size_mb(file_path: str) -> float:
@@ -24,6 +130,213 @@ def get_file_size_mb(file_path: str) -> float:
     return size_mb
 
 
+def _duration_command(audio_path: str) -> List[str]:
+    """Build the ffprobe command that prints a file's duration in seconds."""
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        audio_path
+    ]
+
+
+def _probe_command(input_path: str) -> List[str]:
+    """Build the ffprobe command that reports duration and streams as JSON."""
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'format=duration,size:stream=codec_type,codec_name',
+        '-of', 'json',
+        input_path
+    ]
+
+
+def _parse_probe(stdout: str) -> MediaInfo:
+    """Parse ffprobe JSON output into a MediaInfo."""
+    data = json.loads(stdout)
+    streams = data.get('streams', [])
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    if audio is None:
+        raise ValueError("the input has no audio track")
+    fmt = data.get('format', {})
+    return MediaInfo(
+        duration=float(fmt['duration']),
+        size_mb=int(fmt.get('size', 0)) / (1024 * 1024),
+        # Cover art in audio files shows up as a single-frame video stream
+        has_video=any(
+            stream.get('codec_type') == 'video' and stream.get('codec_name') not in ('mjpeg', 'png')
+            for stream in streams
+        ),
+        audio_codec=audio.get('codec_name')
+    )
+
+
+def _extract_command(mp4_path: str, output_path: str, profile: EncodingProfile) -> List[str]:
+    """Build the ffmpeg command that extracts the audio track with an encoding profile."""
+    return [
+        'ffmpeg',
+        '-i', mp4_path,
+        '-vn',  # No video
+        *profile.codec_args,
+        '-y',  # Overwrite output file
+        output_path
+    ]
+
+
+def _extract_with_silences_command(input_path: str, output_path: str, profile: EncodingProfile) -> List[str]:
+    """
+    Build one ffmpeg command that encodes the audio track and logs its pauses.
+    
+    The input is decoded once and feeds both outputs: the encoded file and a
+    null output running silencedetect.
+    """
+    return [
+        'ffmpeg',
+        '-i', input_path,
+        '-map', '0:a:0',
+        *profile.codec_args,
+        '-y',
+        output_path,
+        '-map', '0:a:0',
+        '-af', f'silencedetect=noise={SILENCE_THRESHOLD_DB}dB:d={SILENCE_MIN_SECONDS}',
+        '-f', 'null',
+        '-'
+    ]
+
+
+def _parse_silences(stderr: str) -> List[Tuple[float, float]]:
+    """Parse silencedetect output into (start, end) pairs in seconds."""
+    silences = []
+    start = None
+    for match in re.finditer(r'silence_(start|end): (-?[\d.]+)', stderr):
+        kind, value = match.group(1), float(match.group(2))
+        if kind == 'start':
+            start = max(0.0, value)
+        elif start is not None:
+            silences.append((start, value))
+            start = None
+    if start is not None:
+        # Trailing silence runs to the end of the file
+        silences.append((start, math.inf))
+    return silences
+
+
+def _segment_path(audio_path: str, index: int, output_dir: str) -> str:
+    """Output path of a chunk; chunks keep the input's container."""
+    base_name, extension = os.path.splitext(os.path.basename(audio_path))
+    return os.path.join(output_dir, f"{base_name}_chunk_{index:03d}{extension}")
+
+
+def _split_segment(segment: PlannedSegment, size_mb: float, max_size_mb: float) -> List[PlannedSegment]:
+    """
+    Split a segment whose chunk came out over the size limit into shorter ones.
+    
+    The pieces are hard cuts, so each after the first starts
+    CHUNK_OVERLAP_SECONDS early like the hard cuts of plan_chunks.
+    
+    Raises:
+        RuntimeError: If the segment is too short to split any further
+    """
+    if segment.duration <= 1.0:
+        raise RuntimeError(f"Failed to split audio: a {segment.duration:.3f} s chunk is {size_mb:.2f} MB, over the {max_size_mb} MB limit")
+    count = max(2, math.ceil(size_mb / (max_size_mb * CHUNK_SIZE_MARGIN)))
+    step = (segment.end - segment.start) / count
+    lead = min(CHUNK_OVERLAP_SECONDS, step / 2)
+    pieces = [PlannedSegment(segment.start, segment.start + step, segment.overlap)]
+    for k in range(1, count):
+        cut = segment.start + k * step
+        end = segment.end if k == count - 1 else cut + step
+        pieces.append(PlannedSegment(cut - lead, end, lead))
+    return pieces
+
+
+def _cut_segment_command(audio_path: str, segment: PlannedSegment, output_path: str) -> List[str]:
+    """Build the ffmpeg command that copies one planned segment to its own file."""
+    # Segments may overlap, which the segment muxer cannot do; seeking on the
+    # input side makes each cut read only its own span of the file
+    return [
+        'ffmpeg',
+        '-ss', f'{segment.start:.3f}',
+        '-t', f'{segment.duration:.3f}',
+        '-i', audio_path,
+        '-map', '0:a:0',
+        '-c', 'copy',
+        '-y',
+        output_path
+    ]
+
+
+def _planned_chunk(index: int, segment: PlannedSegment, path: str) -> AudioChunk:
+    """Describe a chunk file cut from a planned segment."""
+    return AudioChunk(
+        path=path,
+        index=index,
+        duration=segment.duration,
+        size_mb=get_file_size_mb(path),
+        start=segment.start,
+        overlap=segment.overlap
+    )
+
+
+def _run_command(cmd: List[str], operation: str) -> subprocess.CompletedProcess:
+    """
+    Run an external command, recording its duration.
+    
+    Args:
+        cmd: Command and arguments to execute
+        operation: What the command does, the label of its duration metric
+        
+    Returns:
+        subprocess.CompletedProcess: Result with captured text output
+        
+    Raises:
+        FileNotFoundError: If the executable is not installed
+        subprocess.CalledProcessError: If the command exits with a non-zero status
+    """
+    with FFMPEG_SECONDS.labels(operation=operation).time():
+        return subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+
+async def _run_command_async(cmd: List[str], operation: str) -> Tuple[str, str]:
+    """
+    Run an external command without blocking the event loop.
+    
+    Args:
+        cmd: Command and arguments to execute
+        operation: What the command does, the label of its duration metric
+        
+    Returns:
+        Tuple[str, str]: Captured standard output and standard error
+        
+    Raises:
+        FileNotFoundError: If the executable is not installed
+        subprocess.CalledProcessError: If the command exits with a non-zero status
+    """
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        # Don't leave ffmpeg running if the job is cancelled
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    finally:
+        FFMPEG_SECONDS.labels(operation=operation).observe(time.perf_counter() - start)
+    
+    stdout_text = stdout.decode(errors='replace')
+    stderr_text = stderr.decode(errors='replace')
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stdout_text, stderr_text)
+    return stdout_text, stderr_text
+
+
 def get_audio_duration(audio_path: str) -> float:
     """
     Get the duration of an audio file in seconds using FFmpeg.
@@ -38,14 +351,7 @@ def get_audio_duration(audio_path: str) -> float:
         RuntimeError: If FFmpeg is not installed or fails to get duration
     """
     try:
-        cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            audio_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = _run_command(_duration_command(audio_path), 'duration')
         duration = float(result.stdout.strip())
         return duration
     except FileNotFoundError:
@@ -56,13 +362,65 @@ def get_audio_duration(audio_path: str) -> float:
         raise RuntimeError(f"Failed to parse audio duration: {e}")
 
 
-def extract_audio(mp4_path: str, output_path: str) -> str:
+def probe_media(input_path: str) -> MediaInfo:
+    """
+    Read an input's duration, size and streams with a single ffprobe call.
+    
+    Args:
+        input_path: Path to the video or audio file
+        
+    Returns:
+        MediaInfo: Probe results
+        
+    Raises:
+        RuntimeError: If FFmpeg is not installed, probing fails or there is no audio
+    """
+    try:
+        result = _run_command(_probe_command(input_path), 'probe')
+        return _parse_probe(result.stdout)
+    except FileNotFoundError:
+        raise RuntimeError("FFmpeg is not installed. Please install FFmpeg to use this script.")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to probe media: {e.stderr}")
+    except (ValueError, KeyError) as e:
+        raise RuntimeError(f"Failed to parse media probe: {e}")
+
+
+def extract_audio_with_silences(input_path: str, output_path: str, profile: Optional[EncodingProfile] = None) -> List[Tuple[float, float]]:
+    """
+    Extract and re-encode the audio track and detect its pauses in one pass.
+    
+    Args:
+        input_path: Path to the input video or audio file
+        output_path: Path where the extracted audio should be saved; its
+            extension should match profile.extension
+        profile: Encoding profile (default: get_encoding_profile())
+        
+    Returns:
+        List[Tuple[float, float]]: (start, end) of each pause in seconds
+        
+    Raises:
+        RuntimeError: If FFmpeg is not installed or extraction fails
+    """
+    command = _extract_with_silences_command(input_path, output_path, profile or get_encoding_profile())
+    try:
+        result = _run_command(command, 'extract')
+        return _parse_silences(result.stderr)
+    except FileNotFoundError:
+        raise RuntimeError("FFmpeg is not installed. Please install FFmpeg to use this script.")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to extract audio from MP4: {e.stderr}")
+
+
+def extract_audio(mp4_path: str, output_path: str, profile: Optional[EncodingProfile] = None) -> str:
     """
-    Extract audio from MP4 file and save as MP3.
+    Extract audio from MP4 file and re-encode it with an encoding profile.
     
     Args:
         mp4_path: Path to the input MP4 file
-        output_path: Path where the extracted audio should be saved
+        output_path: Path where the extracted audio should be saved; its
+            extension should match profile.extension
+        profile: Encoding profile (default: get_encoding_profile())
         
     Returns:
         str: Path to the extracted audio file
@@ -71,16 +429,8 @@ def extract_audio(mp4_path: str, output_path: str) -> str:
         RuntimeError: If FFmpeg is not installed or extraction fails
     """
     try:
-        cmd = [
-            'ffmpeg',
-            '-i', mp4_path,
-            '-vn',  # No video
-            '-acodec', 'libmp3lame',  # MP3 codec
-            '-q:a', '2',  # High quality
-            '-y',  # Overwrite output file
-            output_path
-        ]
-        subprocess.run(cmd, capture_output=True, text=True, check=True)
+        command = _extract_command(mp4_path, output_path, profile or get_encoding_profile())
+        _run_command(command, 'extract')
         return output_path
     except FileNotFoundError:
         raise RuntimeError("FFmpeg is not installed. Please install FFmpeg to use this script.")
@@ -92,6 +442,9 @@ def calculate_chunk_duration(file_size_mb: float, duration_seconds: float, max_s
     """
     Calculate the optimal chunk duration to keep chunks under the size limit.
     
+    The duration is that of an average CHUNK_SIZE_MARGIN share of the limit;
+    iter_audio_chunks splits any chunk that still comes out over it.
+    
     Args:
         file_size_mb: Total file size in megabytes
         duration_seconds: Total duration in seconds
@@ -103,52 +456,211 @@ def calculate_chunk_duration(file_size_mb: float, duration_seconds: float, max_s
     if file_size_mb <= max_size_mb:
         return duration_seconds
     
-    # Calculate how many chunks we need
-    num_chunks = (file_size_mb / max_size_mb)
+    # Calculate how many chunks we need, aiming below the limit since the
+    # bitrate, and so the size per second, is not the same across the file
+    num_chunks = (file_size_mb / (max_size_mb * CHUNK_SIZE_MARGIN))
     chunk_duration = duration_seconds / num_chunks
     
     return chunk_duration
 
 
-def split_audio(audio_path: str, chunk_duration: float, output_dir: str) -> List[str]:
+def plan_chunks(
+    duration_seconds: float,
+    max_chunk_duration: float,
+    silences: List[Tuple[float, float]],
+    overlap_seconds: float = CHUNK_OVERLAP_SECONDS,
+    search_seconds: float = SILENCE_SEARCH_SECONDS
+) -> List[PlannedSegment]:
+    """
+    Plan chunk boundaries that fall in pauses instead of mid-word.
+    
+    The number of chunks is the same as a fixed-length split would produce.
+    Each boundary starts at an even share of the duration and moves to the
+    middle of the nearest pause within the search window. The window is
+    limited to half the slack between the even share and max_chunk_duration,
+    so no chunk grows past the limit. Where there is no pause, the cut stays
+    where it is and the next chunk starts overlap_seconds earlier, so words
+    at the seam appear whole in one of the two chunks. The overlap can take a
+    chunk a couple of seconds past max_chunk_duration, which the margin left
+    by calculate_chunk_duration absorbs.
+    
+    Args:
+        duration_seconds: Total duration in seconds
+        max_chunk_duration: Longest allowed chunk, e.g. from calculate_chunk_duration
+        silences: (start, end) pauses, e.g. from extract_audio_with_silences
+        overlap_seconds: Overlap added at hard cuts (default: CHUNK_OVERLAP_SECONDS)
+        search_seconds: Furthest a cut may move to reach a pause (default: CHUNK_SILENCE_SEARCH_SECONDS)
+        
+    Returns:
+        List[PlannedSegment]: Segments in order, covering the whole duration
+    """
+    if duration_seconds <= max_chunk_duration:
+        return [PlannedSegment(0.0, duration_seconds)]
+    
+    count = math.ceil(duration_seconds / max_chunk_duration)
+    target = duration_seconds / count
+    window = max(0.0, min(search_seconds, (max_chunk_duration - target) / 2))
+    pauses = [(start + min(end, duration_seconds)) / 2 for start, end in silences]
+    
+    segments = []
+    previous_cut = 0.0
+    lead = 0.0
+    for k in range(1, count):
+        ideal = k * target
+        candidates = [p for p in pauses if abs(p - ideal) <= window and p > previous_cut]
+        if candidates:
+            cut = min(candidates, key=lambda p: abs(p - ideal))
+            next_lead = 0.0
+        else:
+            cut = ideal
+            next_lead = min(overlap_seconds, target / 2)
+        segments.append(PlannedSegment(previous_cut - lead, cut, lead))
+        previous_cut, lead = cut, next_lead
+    segments.append(PlannedSegment(previous_cut - lead, duration_seconds, lead))
+    return segments
+
+
+def iter_audio_chunks(
+    audio_path: str,
+    segments: List[PlannedSegment],
+    output_dir: str,
+    max_size_mb: Optional[float] = None
+) -> Iterator[AudioChunk]:
     """
-    Split audio file into chunks of specified duration.
+    Cut planned segments out of an audio file one at a time.
+    
+    Each chunk is yielded as soon as FFmpeg has written it, so transcription
+    of the first chunks can start while the rest are still being cut. With
+    max_size_mb, a chunk that comes out over it is split into shorter ones,
+    so there can be more chunks than segments; indexes stay consecutive.
     
     Args:
         audio_path: Path to the audio file to split
-        chunk_duration: Duration of each chunk in seconds
+        segments: Segments from plan_chunks
         output_dir: Directory where chunks should be saved
+        max_size_mb: Largest chunk to yield, e.g. the engine's max_chunk_mb
+            (default: no limit)
         
-    Returns:
-        List[str]: List of paths to the created chunk files
+    Yields:
+        AudioChunk: Each chunk, in segment order
         
     Raises:
         RuntimeError: If FFmpeg is not installed or splitting fails
     """
+    pending = list(segments)
+    index = 0
+    while pending:
+        segment = pending.pop(0)
+        output_path = _segment_path(audio_path, index, output_dir)
+        try:
+            _run_command(_cut_segment_command(audio_path, segment, output_path), 'cut')
+        except FileNotFoundError:
+            raise RuntimeError("FFmpeg is not installed. Please install FFmpeg to use this script.")
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to split audio: {e.stderr}")
+        chunk = _planned_chunk(index, segment, output_path)
+        if max_size_mb is not None and chunk.size_mb > max_size_mb:
+            # Denser than planned: cut the span again as shorter chunks
+            os.remove(output_path)
+            pending[:0] = _split_segment(segment, chunk.size_mb, max_size_mb)
+            continue
+        yield chunk
+        index += 1
+
+
+async def probe_media_async(input_path: str) -> MediaInfo:
+    """
+    Read an input's duration, size and streams without blocking the event loop.
+    
+    Args:
+        input_path: Path to the video or audio file
+        
+    Returns:
+        MediaInfo: Probe results
+        
+    Raises:
+        RuntimeError: If FFmpeg is not installed, probing fails or there is no audio
+    """
     try:
-        # Get base filename without extension
-        base_name = os.path.splitext(os.path.basename(audio_path))[0]
-        output_pattern = os.path.join(output_dir, f"{base_name}_chunk_%03d.mp3")
-        
-        cmd = [
-            'ffmpeg',
-            '-i', audio_path,
-            '-f', 'segment',
-            '-segment_time', str(chunk_duration),
-            '-c', 'copy',
-            '-y',
-            output_pattern
-        ]
-        subprocess.run(cmd, capture_output=True, text=True, check=True)
-        
-        # Collect all created chunk files
-        chunk_files = []
-        for filename in sorted(os.listdir(output_dir)):
-            if filename.startswith(f"{base_name}_chunk_") and filename.endswith('.mp3'):
-                chunk_files.append(os.path.join(output_dir, filename))
-        
-        return chunk_files
+        stdout, _ = await _run_command_async(_probe_command(input_path), 'probe')
+        return _parse_probe(stdout)
     except FileNotFoundError:
         raise RuntimeError("FFmpeg is not installed. Please install FFmpeg to use this script.")
     except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Failed to split audio: {e.stderr}")
+        raise RuntimeError(f"Failed to probe media: {e.stderr}")
+    except (ValueError, KeyError) as e:
+        raise RuntimeError(f"Failed to parse media probe: {e}")
+
+
+async def extract_audio_with_silences_async(input_path: str, output_path: str, profile: Optional[EncodingProfile] = None) -> List[Tuple[float, float]]:
+    """
+    Extract the audio track and detect its pauses in one pass without blocking the event loop.
+    
+    Args:
+        input_path: Path to the input video or audio file
+        output_path: Path where the extracted audio should be saved; its
+            extension should match profile.extension
+        profile: Encoding profile (default: get_encoding_profile())
+        
+    Returns:
+        List[Tuple[float, float]]: (start, end) of each pause in seconds
+        
+    Raises:
+        RuntimeError: If FFmpeg is not installed or extraction fails
+    """
+    command = _extract_with_silences_command(input_path, output_path, profile or get_encoding_profile())
+    try:
+        _, stderr = await _run_command_async(command, 'extract')
+        return _parse_silences(stderr)
+    except FileNotFoundError:
+        raise RuntimeError("FFmpeg is not installed. Please install FFmpeg to use this script.")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to extract audio from MP4: {e.stderr}")
+
+
+async def iter_audio_chunks_async(
+    audio_path: str,
+    segments: List[PlannedSegment],
+    output_dir: str,
+    max_size_mb: Optional[float] = None
+) -> AsyncIterator[AudioChunk]:
+    """
+    Cut planned segments out of an audio file one at a time without blocking the event loop.
+    
+    Each chunk is yielded as soon as FFmpeg has written it, so transcription
+    of the first chunks can start while the rest are still being cut. With
+    max_size_mb, a chunk that comes out over it is split into shorter ones,
+    so there can be more chunks than segments; indexes stay consecutive.
+    
+    Args:
+        audio_path: Path to the audio file to split
+        segments: Segments from plan_chunks
+        output_dir: Directory where chunks should be saved
+        max_size_mb: Largest chunk to yield, e.g. the engine's max_chunk_mb
+            (default: no limit)
+        
+    Yields:
+        AudioChunk: Each chunk, in segment order
+        
+    Raises:
+        RuntimeError: If FFmpeg is not installed or splitting fails
+    """
+    pending = list(segments)
+    index = 0
+    while pending:
+        segment = pending.pop(0)
+        output_path = _segment_path(audio_path, index, output_dir)
+        try:
+            await _run_command_async(_cut_segment_command(audio_path, segment, output_path), 'cut')
+        except FileNotFoundError:
+            raise RuntimeError("FFmpeg is not installed. Please install FFmpeg to use this script.")
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to split audio: {e.stderr}")
+        chunk = _planned_chunk(index, segment, output_path)
+        if max_size_mb is not None and chunk.size_mb > max_size_mb:
+            # Denser than planned: cut the span again as shorter chunks
+            os.remove(output_path)
+            pending[:0] = _split_segment(segment, chunk.size_mb, max_size_mb)
+            continue
+        yield chunk
+        index += 1
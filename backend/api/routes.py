@@ -1,30 +1,45 @@
-import shutil
+import base64
 import os
 import uuid
-from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, HTTPException, Depends
+from datetime import datetime
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
 
-from backend.services.transcription_service import TranscriptionService
-from backend.services.analysis_service import AnalysisService
-from backend.database import get_db, Job, Client, init_db
+from backend.database import get_db, Job, JobChunk, JobStatus, Client, init_db
+from backend.worker import notify_new_job
+from backend.services.job_listing import PageCursor, list_jobs_page
+from backend.services.search_service import MAX_RESULTS, search_jobs
+from backend.services.content_store import read_job_text, set_job_text, delete_job_text, delete_all_job_text
+from backend.services.event_service import ALL_JOBS, EventType, publish_event_async, stream_events
+from backend.services.upload_service import (
+    UploadError,
+    save_upload_file,
+    create_upload,
+    get_upload,
+    append_upload,
+    claim_completed_upload
+)
 
 # Initialize DB
 init_db()
 
 router = APIRouter()
 
-class JobStatus:
-    QUEUED = "queued"
-    PROCESSING = "processing"
-    COMPLETED = "completed"
-    FAILED = "failed"
-
 class JobResult(BaseModel):
     transcription: Optional[str] = None
     analysis: Optional[dict] = None
 
+class JobUsage(BaseModel):
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    audio_seconds: Optional[float] = None  # Audio billed by Whisper
+    api_seconds: Optional[float] = None  # Summed latency of the API calls
+    api_calls: Optional[list] = None  # Each call with its model, latency and tokens or audio seconds
+
 class JobResponse(BaseModel):
     job_id: str
     status: str
@@ -34,10 +49,63 @@ class JobResponse(BaseModel):
     error: Optional[str] = None
     created_at: str
     client_name: Optional[str] = None
+    metadata: Optional[dict] = None
+    usage: Optional[JobUsage] = None
 
     class Config:
         from_attributes = True
 
+class JobSummary(BaseModel):
+    """Lightweight job state for polling clients; no transcription or report."""
+    job_id: str
+    status: str
+    filename: str
+    semantic_title: Optional[str] = None
+    error: Optional[str] = None
+    version: int
+    updated_at: Optional[str] = None
+
+class JobListItem(BaseModel):
+    """Job as shown in the history list; the transcript and report are fetched per job."""
+    job_id: str
+    status: str
+    filename: str
+    semantic_title: Optional[str] = None
+    error: Optional[str] = None
+    created_at: str
+    client_name: Optional[str] = None
+    metadata: Optional[dict] = None
+
+class JobPage(BaseModel):
+    jobs: List[JobListItem]
+    next_cursor: Optional[str] = None
+
+class JobStatusBatch(BaseModel):
+    cursor: int
+    jobs: List[JobSummary]
+    missing: List[str]
+
+class JobChanges(BaseModel):
+    cursor: int
+    jobs: List[JobSummary]
+    has_more: bool
+
+# Upper bound on ids per batch status request (SQLite limits bound parameters)
+MAX_STATUS_IDS = 500
+MAX_CHANGES = 1000
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class SearchResult(BaseModel):
+    job_id: str
+    filename: str
+    semantic_title: Optional[str] = None
+    status: str
+    created_at: str
+    client_name: Optional[str] = None
+    score: Optional[float] = None
+    snippet: Optional[str] = None  # HTML-escaped text with matches in <mark> tags
+
 class ClientCreate(BaseModel):
     name: str
 
@@ -49,56 +117,20 @@ class ClientResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ClientUsage(BaseModel):
+    """API usage of a client's jobs; client_id is None for jobs without a client."""
+    client_id: Optional[str] = None
+    client_name: Optional[str] = None
+    jobs: int
+    prompt_tokens: int
+    completion_tokens: int
+    audio_seconds: float
+    api_seconds: float
+
 class ToDoUpdate(BaseModel):
     index: int
     done: bool
 
-def process_transcription(job_id: str, file_path: str, language: str, model: str, custom_prompt: Optional[str]):
-    db = next(get_db())
-    job = db.query(Job).filter(Job.id == job_id).first()
-    
-    if not job:
-        return
-
-    job.status = JobStatus.PROCESSING
-    db.commit()
-
-    try:
-        # Transcribe
-        transcription_service = TranscriptionService()
-        text = transcription_service.process_file(file_path, language)
-        
-        # Analyze
-        analysis_service = AnalysisService()
-        analysis = analysis_service.analyze_transcription(text, model, custom_prompt)
-        
-        # Generate semantic title
-        semantic_title = analysis_service.generate_title(text)
-        
-        job.transcription = text
-        job.semantic_title = semantic_title
-        job.analysis_report = analysis.get("report")
-        
-        # Convert simple string list to object list for checkboxes
-        raw_todos = analysis.get("todo_list", [])
-        if raw_todos and isinstance(raw_todos[0], str):
-            job.analysis_todo = [{"text": item, "done": False} for item in raw_todos]
-        else:
-            job.analysis_todo = []
-            
-        job.status = JobStatus.COMPLETED
-        db.commit()
-        
-    except Exception as e:
-        job.status = JobStatus.FAILED
-        job.error = str(e)
-        db.commit()
-    finally:
-        # Cleanup uploaded file
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        db.close()
-
 # --- Client Routes ---
 
 @router.post("/clients", response_model=ClientResponse)
@@ -136,6 +168,44 @@ async def list_clients(db: Session = Depends(get_db)):
         created_at=c.created_at.isoformat()
     ) for c in clients]
 
+@router.get("/clients/usage", response_model=List[ClientUsage])
+async def get_client_usage(
+    since: Optional[datetime] = Query(None, description="Only jobs created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only jobs created before this time"),
+    db: Session = Depends(get_db)
+):
+    """Tokens, billed audio and API time summed over each client's jobs."""
+    query = (
+        db.query(
+            Job.client_id,
+            Client.name,
+            func.count(Job.id),
+            func.coalesce(func.sum(Job.prompt_tokens), 0),
+            func.coalesce(func.sum(Job.completion_tokens), 0),
+            func.coalesce(func.sum(Job.audio_seconds), 0.0),
+            func.coalesce(func.sum(Job.api_seconds), 0.0)
+        )
+        .outerjoin(Client, Client.id == Job.client_id)
+        .group_by(Job.client_id, Client.name)
+    )
+    if since:
+        query = query.filter(Job.created_at >= since)
+    if until:
+        query = query.filter(Job.created_at < until)
+    return [
+        ClientUsage(
+            client_id=client_id,
+            client_name=name,
+            jobs=jobs,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            audio_seconds=round(audio_seconds, 3),
+            api_seconds=round(api_seconds, 3)
+        )
+        for client_id, name, jobs, prompt_tokens, completion_tokens, audio_seconds, api_seconds
+        in query.order_by(Client.name).all()
+    ]
+
 @router.delete("/clients/{client_id}")
 async def delete_client(client_id: str, db: Session = Depends(get_db)):
     client = db.query(Client).filter(Client.id == client_id).first()
@@ -145,42 +215,114 @@ async def delete_client(client_id: str, db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Client deleted"}
 
+# --- Upload Routes ---
+
+class UploadCreate(BaseModel):
+    filename: str
+    length: int
+
+class UploadResponse(BaseModel):
+    upload_id: str
+    filename: str
+    length: int
+    offset: int
+    complete: bool
+    sha256: Optional[str] = None
+
+def upload_headers(upload: dict) -> dict:
+    return {
+        "Upload-Offset": str(upload["offset"]),
+        "Upload-Length": str(upload["length"]),
+        "Cache-Control": "no-store",
+    }
+
+@router.post("/uploads", response_model=UploadResponse, status_code=201)
+async def create_resumable_upload(upload: UploadCreate, response: Response):
+    """
+    Start a resumable upload. The file is then sent with PATCH requests and,
+    once complete, passed to /transcribe as upload_id.
+    """
+    try:
+        state = create_upload(upload.filename, upload.length)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    response.headers.update(upload_headers(state))
+    response.headers["Location"] = f"/api/uploads/{state['upload_id']}"
+    return UploadResponse(**state)
+
+@router.head("/uploads/{upload_id}")
+async def get_upload_offset(upload_id: str):
+    """Return the offset to resume from in the Upload-Offset header."""
+    try:
+        state = get_upload(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return Response(status_code=200, headers=upload_headers(state))
+
+@router.patch("/uploads/{upload_id}", response_model=UploadResponse)
+async def append_to_upload(upload_id: str, request: Request, response: Response, upload_offset: int = Header(...)):
+    """
+    Append the request body at Upload-Offset. The body is streamed straight
+    to disk, so it is never held in memory as a whole.
+    """
+    try:
+        state = await append_upload(upload_id, upload_offset, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    response.headers.update(upload_headers(state))
+    return UploadResponse(**state)
+
 # --- Job Routes ---
 
 @router.post("/transcribe", response_model=JobResponse)
 async def create_transcription_job(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     language: str = Form("it"),
     model: str = Form("gpt-4o"),
     custom_prompt: Optional[str] = Form(None),
     client_id: Optional[str] = Form(None),
+    concurrency: Optional[int] = Form(None),
+    use_cache: bool = Form(True),
     db: Session = Depends(get_db)
 ):
-    job_id = str(uuid.uuid4())
+    if concurrency is not None and concurrency < 1:
+        raise HTTPException(status_code=400, detail="Concurrency must be at least 1")
+    if (file is None) == (upload_id is None):
+        raise HTTPException(status_code=400, detail="Provide either a file or the upload_id of a completed upload")
     
-    # Save uploaded file
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, f"{job_id}_{file.filename}")
+    job_id = str(uuid.uuid4())
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Save uploaded file (streamed to disk without blocking the event loop)
+    try:
+        if upload_id:
+            file_path, filename, size, sha256 = claim_completed_upload(upload_id, job_id)
+        else:
+            filename = file.filename
+            file_path, size, sha256 = await save_upload_file(file, job_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
     new_job = Job(
         id=job_id,
-        filename=file.filename,
+        filename=filename,
         status=JobStatus.QUEUED,
         language=language,
         model=model,
         custom_prompt=custom_prompt,
-        client_id=client_id
+        client_id=client_id,
+        concurrency=concurrency,
+        use_cache=use_cache,
+        file_path=file_path,
+        job_metadata={"upload_bytes": size, "upload_sha256": sha256}
     )
     db.add(new_job)
     db.commit()
     db.refresh(new_job)
     
-    background_tasks.add_task(process_transcription, job_id, file_path, language, model, custom_prompt)
+    # Picked up by a worker from the durable queue; survives API restarts
+    await publish_event_async(job_id, EventType.STATUS, {"status": JobStatus.QUEUED})
+    notify_new_job()
     
     return map_job_to_response(new_job)
 
@@ -216,12 +358,8 @@ async def update_job_content(job_id: str, update: JobContentUpdate, db: Session
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    if update.semantic_title is not None:
-        job.semantic_title = update.semantic_title
-    if update.transcription is not None:
-        job.transcription = update.transcription
-    if update.analysis_report is not None:
-        job.analysis_report = update.analysis_report
+    if update.semantic_title is not None or update.transcription is not None or update.analysis_report is not None:
+        set_job_text(db, job, update.semantic_title, update.transcription, update.analysis_report)
     if update.analysis_todo is not None:
         job.analysis_todo = update.analysis_todo
         from sqlalchemy.orm.attributes import flag_modified
@@ -231,20 +369,137 @@ async def update_job_content(job_id: str, update: JobContentUpdate, db: Session
     db.refresh(job)
     return map_job_to_response(job)
 
+SUMMARY_COLUMNS = (Job.id, Job.status, Job.filename, Job.semantic_title, Job.error, Job.version, Job.updated_at)
+
+def map_row_to_summary(row) -> JobSummary:
+    return JobSummary(
+        job_id=row.id,
+        status=row.status,
+        filename=row.filename,
+        semantic_title=row.semantic_title,
+        error=row.error,
+        version=row.version or 0,
+        updated_at=row.updated_at.isoformat() if row.updated_at else None
+    )
+
+@router.get("/status", response_model=JobStatusBatch)
+async def get_jobs_status(ids: str, since: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Status of several jobs in one request, e.g. /status?ids=a,b,c.
+    
+    With `since` (the cursor of the previous response) only jobs changed
+    after it are returned. Unknown or deleted ids are listed in `missing`.
+    """
+    job_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not job_ids:
+        raise HTTPException(status_code=400, detail="No job ids given")
+    if len(job_ids) > MAX_STATUS_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATUS_IDS} job ids per request")
+    
+    rows = db.query(*SUMMARY_COLUMNS).filter(Job.id.in_(job_ids)).all()
+    found = {row.id for row in rows}
+    changed = [row for row in rows if since is None or (row.version or 0) > since]
+    # Versions only grow, so any later change to these jobs is above this cursor
+    cursor = max([since or 0, *((row.version or 0) for row in rows)])
+    return JobStatusBatch(
+        cursor=cursor,
+        jobs=[map_row_to_summary(row) for row in sorted(changed, key=lambda row: row.version or 0)],
+        missing=[job_id for job_id in job_ids if job_id not in found]
+    )
+
+@router.get("/jobs/changes", response_model=JobChanges)
+async def get_job_changes(since: int = 0, client_id: Optional[str] = None, limit: int = Query(MAX_CHANGES, ge=1, le=MAX_CHANGES), db: Session = Depends(get_db)):
+    """
+    Jobs created or changed after the `since` cursor, oldest change first.
+    
+    Pass the returned cursor as `since` on the next poll; while has_more is
+    true there are further changes to fetch right away. Deletions are not
+    listed here: they show up as `missing` in /status or on /events.
+    """
+    query = db.query(*SUMMARY_COLUMNS).filter(Job.version > since)
+    if client_id:
+        query = query.filter(Job.client_id == client_id)
+    rows = query.order_by(Job.version, Job.id).limit(limit).all()
+    has_more = len(rows) == limit
+    if has_more:
+        # Jobs written by one statement share a version; never split them
+        # across pages, or the ones after the cursor would be skipped
+        last = rows[-1]
+        rows += query.filter(Job.version == last.version, Job.id > last.id).order_by(Job.id).all()
+    cursor = rows[-1].version if rows else since
+    return JobChanges(cursor=cursor, jobs=[map_row_to_summary(row) for row in rows], has_more=has_more)
+
 @router.get("/status/{job_id}", response_model=JobResponse)
 async def get_job_status(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(Job).options(joinedload(Job.client)).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return map_job_to_response(job)
+
+def encode_page_cursor(cursor: PageCursor) -> str:
+    created_at, job_id = cursor
+    raw = f"{created_at.isoformat()}|{job_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_page_cursor(cursor: str) -> PageCursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, job_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), job_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/jobs", response_model=JobPage)
+async def list_jobs(
+    client_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    Newest jobs first, one page at a time. Pass next_cursor as `cursor` to get
+    the following page; it is null on the last one.
+    
+    Only summaries are returned: the transcript, report and to-do list are
+    left unloaded and come from /status/{job_id} when a job is opened.
+    """
+    after = decode_page_cursor(cursor) if cursor else None
+    jobs, next_page = list_jobs_page(db, client_id, after, limit)
+    return JobPage(
+        jobs=[map_job_to_list_item(job) for job in jobs],
+        next_cursor=encode_page_cursor(next_page) if next_page else None
+    )
+
+@router.post("/jobs/{job_id}/retry", response_model=JobResponse)
+async def retry_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Re-queue a failed job. Chunks transcribed by the failed attempt are
+    restored from their checkpoints, so only the missing ones are re-sent.
+    """
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != JobStatus.FAILED:
+        raise HTTPException(status_code=400, detail=f"Only failed jobs can be retried (job is {job.status})")
+    if not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=409, detail="Uploaded file is no longer available, please upload it again")
+    
+    job.status = JobStatus.QUEUED
+    job.error = None
+    job.attempts = 0
+    db.commit()
+    db.refresh(job)
+    
+    await publish_event_async(job_id, EventType.STATUS, {"status": JobStatus.QUEUED})
+    notify_new_job()
     return map_job_to_response(job)
 
-@router.get("/jobs", response_model=List[JobResponse])
-async def list_jobs(client_id: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(Job)
-    if client_id:
-        query = query.filter(Job.client_id == client_id)
-    jobs = query.order_by(Job.created_at.desc()).all()
-    return [map_job_to_response(job) for job in jobs]
+def remove_retained_upload(job: Job) -> None:
+    """Delete the upload kept for retrying a job, unless a worker may still need it."""
+    if job.status in (JobStatus.QUEUED, JobStatus.PROCESSING):
+        return
+    if job.file_path and os.path.exists(job.file_path):
+        os.remove(job.file_path)
 
 @router.delete("/jobs/{job_id}")
 async def delete_job(job_id: str, db: Session = Depends(get_db)):
@@ -252,23 +507,79 @@ async def delete_job(job_id: str, db: Session = Depends(get_db)):
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
+    remove_retained_upload(job)
+    delete_job_text(db, job)
     db.delete(job)
     db.commit()
+    await publish_event_async(job_id, EventType.DELETED)
     return {"message": "Job deleted successfully"}
 
 @router.delete("/jobs")
 async def delete_all_jobs(db: Session = Depends(get_db)):
+    for job in db.query(Job).filter(Job.file_path.isnot(None)).all():
+        remove_retained_upload(job)
+    db.query(JobChunk).delete()
+    delete_all_job_text(db)
     db.query(Job).delete()
     db.commit()
+    await publish_event_async(ALL_JOBS, EventType.DELETED)
     return {"message": "All jobs deleted successfully"}
 
+# --- Search ---
+
+@router.get("/search", response_model=List[SearchResult])
+async def search(q: str = Query(..., min_length=1), client_id: Optional[str] = None, limit: int = Query(20, ge=1, le=MAX_RESULTS), db: Session = Depends(get_db)):
+    """
+    Full-text search over job titles, reports and transcriptions, best
+    matches first. Words must all appear; use quotes for exact phrases.
+    """
+    results = search_jobs(db, q, client_id, limit)
+    return [SearchResult(**{**result, "created_at": result["created_at"].isoformat()}) for result in results]
+
+# --- Event Stream ---
+
+@router.get("/events")
+async def job_event_stream(
+    request: Request,
+    job_id: Optional[List[str]] = Query(None),
+    since: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None)
+):
+    """
+    Server-Sent Events stream of job status changes and per-chunk progress.
+    
+    Browsers reconnect automatically and send Last-Event-ID, so the stream
+    resumes where it left off. Without it, `since` picks the starting event;
+    otherwise only new events are sent. Filter with repeated job_id params.
+    """
+    start = last_event_id if last_event_id is not None else since
+    return StreamingResponse(
+        stream_events(start, job_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def map_job_to_list_item(job: Job) -> JobListItem:
+    return JobListItem(
+        job_id=job.id,
+        status=job.status,
+        filename=job.filename,
+        semantic_title=job.semantic_title,
+        error=job.error,
+        created_at=job.created_at.isoformat(),
+        client_name=job.client.name if job.client else None,
+        metadata=job.job_metadata
+    )
+
 def map_job_to_response(job: Job) -> JobResponse:
     result = None
     if job.status == JobStatus.COMPLETED:
+        # Decompressed here only: list and status queries never load the content
+        job_text = read_job_text(job.content)
         result = JobResult(
-            transcription=job.transcription,
+            transcription=job_text.transcription,
             analysis={
-                "report": job.analysis_report,
+                "report": job_text.analysis_report,
                 "todo_list": job.analysis_todo
             }
         )
@@ -281,5 +592,13 @@ def map_job_to_response(job: Job) -> JobResponse:
         result=result,
         error=job.error,
         created_at=job.created_at.isoformat(),
-        client_name=job.client.name if job.client else None
+        client_name=job.client.name if job.client else None,
+        metadata=job.job_metadata,
+        usage=JobUsage(
+            prompt_tokens=job.prompt_tokens,
+            completion_tokens=job.completion_tokens,
+            audio_seconds=job.audio_seconds,
+            api_seconds=job.api_seconds,
+            api_calls=job.api_calls
+        )
     )
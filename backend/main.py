@@ -1,6 +1,7 @@
 import os
 import sys
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -8,8 +9,28 @@ from fastapi.middleware.cors import CORSMiddleware
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.api import routes
+from backend.database import SessionLocal
+from backend.services.job_queue import requeue_expired_jobs
+from backend.services.upload_service import UploadSizeLimitMiddleware
+from backend.worker import start_embedded_worker, stop_embedded_worker
+from metrics import CONTENT_TYPE, METRICS_ENABLED, render_metrics
 
-app = FastAPI(title="Video to Text & AI Analysis")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Recover jobs orphaned by a crash or restart before accepting new work
+    db = SessionLocal()
+    try:
+        requeued = requeue_expired_jobs(db)
+        if requeued:
+            print(f"Re-queued {requeued} orphaned job(s)")
+    finally:
+        db.close()
+
+    worker_task = start_embedded_worker()
+    yield
+    await stop_embedded_worker(worker_task)
+
+app = FastAPI(title="Video to Text & AI Analysis", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -20,9 +41,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized multipart uploads while they stream in, not after they are spooled
+app.add_middleware(UploadSizeLimitMiddleware, paths=("/api/transcribe",))
+
 # API Routes
 app.include_router(routes.router, prefix="/api")
 
+# Prometheus scrape endpoint (a plain function: the queue gauges query the database)
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 # Static files (Frontend)
 frontend_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend")
 app.mount("/", StaticFiles(directory=frontend_path, html=True), name="frontend")
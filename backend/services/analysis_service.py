@@ -1,20 +1,243 @@
+import hashlib
+import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from rate_limiter import call_with_retry, get_rate_limiter
+from result_cache import ResultCache, make_cache_key
+from metrics import CACHE_REQUESTS
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts are estimated from the text length without it
+    tiktoken = None
+
 load_dotenv()
 
+# Transcripts estimated above this many tokens are analyzed section by section
+# (map) and the section notes merged into one report (reduce)
+ANALYSIS_MAP_REDUCE_TOKENS = int(os.getenv('ANALYSIS_MAP_REDUCE_TOKENS', '24000'))
+ANALYSIS_SECTION_TOKENS = int(os.getenv('ANALYSIS_SECTION_TOKENS', '6000'))
+# Sections analyzed in parallel per job; every call still goes through the shared chat limiter
+ANALYSIS_CONCURRENCY = int(os.getenv('ANALYSIS_CONCURRENCY', '4'))
+# Rough size of a token in characters when tiktoken is not installed,
+# close enough for English and Romance languages
+CHARS_PER_TOKEN = 4
+
+# Context window per model; prompts are planned to fit it with room left for the answer
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_TOKENS = 16385
+COMPLETION_RESERVE_TOKENS = 4096
+
+TITLE_MODEL = "gpt-3.5-turbo"  # Use cheaper model for title generation
+# Part of every cache key: bump it when a prompt changes so answers to the old prompts are not reused
+PROMPT_VERSION = "2"
+
+# Local cache of analyses and titles keyed by transcript, model, custom prompt and PROMPT_VERSION
+ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE_ENABLED', '1') != '0'
+ANALYSIS_CACHE_PATH = os.getenv('ANALYSIS_CACHE_PATH', os.path.join('cache', 'analysis_cache.db'))
+ANALYSIS_CACHE_MAX_MB = float(os.getenv('ANALYSIS_CACHE_MAX_MB', '128'))
+ANALYSIS_CACHE_TTL_HOURS = float(os.getenv('ANALYSIS_CACHE_TTL_HOURS', '720'))
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+class AnalysisError(RuntimeError):
+    """Raised when the model does not return a usable analysis."""
+
+
+def get_analysis_cache() -> Optional[ResultCache]:
+    """Return the process-wide analysis and title cache, or None if disabled."""
+    global _cache
+    with _cache_lock:
+        if ANALYSIS_CACHE_ENABLED and _cache is None:
+            _cache = ResultCache(
+                ANALYSIS_CACHE_PATH,
+                int(ANALYSIS_CACHE_MAX_MB * 1024 * 1024),
+                ttl_seconds=ANALYSIS_CACHE_TTL_HOURS * 3600
+            )
+    return _cache
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Count the tokens of text for model, or estimate them when tiktoken is not installed."""
+    if tiktoken is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def prompt_budget(model: str) -> int:
+    """Largest prompt, in tokens, that leaves room in the model's context for the answer."""
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS) - COMPLETION_RESERVE_TOKENS
+
+
+def split_sections(text: str, max_tokens: int = ANALYSIS_SECTION_TOKENS, model: str = "gpt-4o") -> List[str]:
+    """
+    Split a transcript into consecutive sections of at most about `max_tokens`,
+    cutting between sentences where possible and between words otherwise.
+    """
+    # Cut by characters, at the text's own characters-per-token ratio
+    chars_per_token = len(text) / max(1, count_tokens(text, model))
+    max_chars = max(1, int(max_tokens * chars_per_token))
+    sections = []
+    current = ""
+    for sentence in re.split(r'(?<=[.!?])\s+|\n+', text):
+        pieces = [sentence]
+        if len(sentence) > max_chars:
+            # A run-on sentence (or text without punctuation): cut it between words
+            pieces, piece = [], ""
+            for word in sentence.split():
+                if piece and len(piece) + len(word) + 1 > max_chars:
+                    pieces.append(piece)
+                    piece = ""
+                piece = f"{piece} {word}" if piece else word
+            pieces.append(piece)
+        for piece in pieces:
+            if not piece.strip():
+                continue
+            if current and len(current) + len(piece) + 1 > max_chars:
+                sections.append(current)
+                current = ""
+            current = f"{current} {piece}" if current else piece
+    if current:
+        sections.append(current)
+    return sections
+
+
 class AnalysisService:
     def __init__(self):
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found")
-        self.client = OpenAI(api_key=api_key)
+        # Retries are handled by the shared rate limiter, not per client
+        self.client = OpenAI(api_key=api_key, max_retries=0)
+        self.limiter = get_rate_limiter("chat")
+        # How the last analysis and title were obtained: "hit", "miss" or "bypass"
+        self.stats: dict = {}
+        # Tokens and latency of every chat call made by this instance
+        self.usage: dict = {"prompt_tokens": 0, "completion_tokens": 0, "calls": []}
+        self._usage_lock = threading.Lock()
+
+    def _cached(self, stat: str, key_parts: tuple, use_cache: bool, compute):
+        """
+        Return the cached JSON result for key_parts, or compute and store it.
+
+        use_cache=False skips the lookup but still stores the fresh result.
+        """
+        cache = get_analysis_cache()
+        if cache is None:
+            return compute()
+        key = make_cache_key(stat, PROMPT_VERSION, *key_parts)
+        if use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                self.stats[stat] = "hit"
+                CACHE_REQUESTS.labels(cache=stat[:-len("_cache")], result="hit").inc()
+                return json.loads(cached)
+        self.stats[stat] = "miss" if use_cache else "bypass"
+        CACHE_REQUESTS.labels(cache=stat[:-len("_cache")], result=self.stats[stat]).inc()
+        result = compute()
+        cache.put(key, json.dumps(result))
+        return result
+
+    def _create_completion(self, **kwargs):
+        """
+        Send a chat completion through the shared rate limiter, retrying
+        throttled and transient failures.
 
-    def generate_title(self, text: str) -> str:
+        The prompt is counted first and its last message shortened if it
+        would not fit the model's context; tokens used and latency are
+        added to self.usage.
+        """
+        model = kwargs["model"]
+        messages = kwargs["messages"]
+        budget = prompt_budget(model)
+        prompt_tokens = sum(count_tokens(message["content"], model) for message in messages)
+        if prompt_tokens > budget:
+            # Section planning keeps analyses under the budget; this only catches
+            # what it cannot split, such as a very long custom prompt. The middle
+            # goes, so the instructions at both ends are kept
+            last = messages[-1]["content"]
+            excess = int((prompt_tokens - budget) * len(last) / max(1, count_tokens(last, model))) + 2
+            middle = len(last) // 2
+            shortened = last[:max(0, middle - excess // 2 - excess % 2)] + "…" + last[middle + excess // 2:]
+            print(f"Prompt of {prompt_tokens} tokens exceeds the {budget} token budget of {model}; shortening it")
+            kwargs["messages"] = messages[:-1] + [{**messages[-1], "content": shortened}]
+            prompt_tokens = sum(count_tokens(message["content"], model) for message in kwargs["messages"])
+
+        start = time.perf_counter()
+        response = call_with_retry(
+            lambda: self.client.chat.completions.create(**kwargs),
+            limiter=self.limiter
+        )
+        usage = getattr(response, "usage", None)
+        call = {
+            "api": "chat",
+            "model": model,
+            "seconds": round(time.perf_counter() - start, 3),
+            "prompt_tokens": getattr(usage, "prompt_tokens", None) or prompt_tokens,
+            "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+        }
+        with self._usage_lock:
+            self.usage["prompt_tokens"] += call["prompt_tokens"]
+            self.usage["completion_tokens"] += call["completion_tokens"]
+            self.usage["calls"].append(call)
+        return response
+
+    def _complete_json(self, model: str, prompt: str) -> dict:
+        """Run an analysis prompt and parse the JSON object it answers with."""
+        response = self._create_completion(
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that analyzes meeting transcriptions."},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        content = response.choices[0].message.content
+        try:
+            result = json.loads(content)
+        except (TypeError, json.JSONDecodeError) as e:
+            raise AnalysisError(f"The model returned invalid JSON: {e}") from e
+        if not isinstance(result, dict):
+            raise AnalysisError("The model did not return a JSON object")
+        return result
+
+    def generate_title(self, text: str, use_cache: bool = True) -> str:
         """
         Generate a short, semantic title for the transcription.
         """
+        try:
+            # Only the start of the transcript is sent, so only it is part of the key
+            return self._cached("title_cache", (TITLE_MODEL, text[:500]), use_cache, lambda: self._generate_title(text))
+        except Exception as e:
+            print(f"Error generating title: {e}")
+            return "Untitled Meeting"
+
+    def _generate_title(self, text: str) -> str:
         prompt = f"""
         Based on the following meeting transcription, generate a short, descriptive title (maximum 5 words).
         The title should capture the main topic or purpose of the meeting.
@@ -25,28 +248,47 @@ class AnalysisService:
         Respond with ONLY the title, nothing else.
         """
         
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",  # Use cheaper model for title generation
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that generates concise meeting titles."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=20
-            )
-            
-            title = response.choices[0].message.content.strip()
-            # Remove quotes if present
-            title = title.strip('"\'')
-            return title
-        except Exception as e:
-            print(f"Error generating title: {e}")
-            return "Untitled Meeting"
+        response = self._create_completion(
+            model=TITLE_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that generates concise meeting titles."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=20
+        )
+        
+        title = response.choices[0].message.content.strip()
+        # Remove quotes if present
+        title = title.strip('"\'')
+        return title
 
-    def analyze_transcription(self, text: str, model: str = "gpt-4o", custom_prompt: str = None) -> dict:
+    def analyze_transcription(self, text: str, model: str = "gpt-4o", custom_prompt: str = None, use_cache: bool = True) -> dict:
         """
         Analyze the transcription to extract a To-Do list and a Meeting Report.
+
+        Long transcripts (above ANALYSIS_MAP_REDUCE_TOKENS) are analyzed in
+        sections in parallel and the results merged, so they fit the model's
+        context window; the output has the same keys either way. Results are
+        cached; use_cache=False asks the model again.
+
+        Raises:
+            AnalysisError: If the model's answer cannot be used
         """
+        key_parts = (
+            model, custom_prompt or "", hashlib.sha256(text.encode('utf-8')).hexdigest(),
+            # The section settings change what a long transcript's analysis looks like
+            str(ANALYSIS_MAP_REDUCE_TOKENS), str(ANALYSIS_SECTION_TOKENS)
+        )
+        return self._cached(
+            "analysis_cache", key_parts, use_cache,
+            lambda: self._analyze(text, model, custom_prompt)
+        )
+
+    def _analyze(self, text: str, model: str, custom_prompt: str = None) -> dict:
+        # Above the threshold, or when the transcript would not fit the model at all, plan sections
+        if count_tokens(text, model) > min(ANALYSIS_MAP_REDUCE_TOKENS, prompt_budget(model) // 2):
+            return self._analyze_in_sections(text, model, custom_prompt)
+
         base_prompt = """
         You are an expert AI assistant. Analyze the following meeting transcription and provide:
         1. A list of "To Do" items.
@@ -65,19 +307,103 @@ class AnalysisService:
         Format the output as a JSON object with keys "todo_list" (list of strings) and "report" (string).
         """
 
-        try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that analyzes meeting transcriptions."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            content = response.choices[0].message.content
-            import json
-            return json.loads(content)
-        except Exception as e:
-            print(f"Error during analysis: {e}")
-            return {"todo_list": [], "report": "Error generating report."}
+        return self._normalize(self._complete_json(model, prompt))
+
+    def _analyze_in_sections(self, text: str, model: str, custom_prompt: str = None) -> dict:
+        # Sections and their notes stay well inside the model's context
+        section_tokens = min(ANALYSIS_SECTION_TOKENS, prompt_budget(model) // 2)
+        sections = split_sections(text, section_tokens, model)
+        print(f"Analyzing {len(sections)} transcript sections in parallel")
+        notes = self._map(self._section_prompt, sections, model, custom_prompt)
+
+        # Notes of very long meetings may still not fit one prompt: condense them in groups
+        reduce_tokens = min(ANALYSIS_MAP_REDUCE_TOKENS, prompt_budget(model) // 2)
+        while len(notes) > 1 and count_tokens(self._format_notes(notes), model) > reduce_tokens:
+            groups = self._group_notes(notes, section_tokens, model)
+            if len(groups) == len(notes):
+                break
+            notes = self._map(self._condense_prompt, groups, model, custom_prompt)
+
+        return self._normalize(self._complete_json(model, self._reduce_prompt(notes, custom_prompt)))
+
+    def _map(self, build_prompt, parts: list, model: str, custom_prompt: str = None) -> List[dict]:
+        """Run one prompt per part in parallel and return the results in order."""
+        total = len(parts)
+
+        def run(index: int) -> dict:
+            result = self._complete_json(model, build_prompt(parts[index], index, total, custom_prompt))
+            return {
+                "summary": str(result.get("summary") or ""),
+                "todo_list": self._normalize(result)["todo_list"],
+            }
+
+        with ThreadPoolExecutor(max_workers=max(1, min(ANALYSIS_CONCURRENCY, total))) as executor:
+            return list(executor.map(run, range(total)))
+
+    @staticmethod
+    def _instructions(custom_prompt: str = None) -> str:
+        return f"\n\nAdditional Instructions:\n{custom_prompt}" if custom_prompt else ""
+
+    def _section_prompt(self, section: str, index: int, total: int, custom_prompt: str = None) -> str:
+        return f"""
+        You are an expert AI assistant. The following is part {index + 1} of {total} of a long meeting transcription.
+        From this part only, extract:
+        1. The "To Do" items it mentions.
+        2. A summary of its key points and decisions, keeping names, figures and dates.{self._instructions(custom_prompt)}
+
+        Transcription (part {index + 1} of {total}):
+        {section}
+
+        Format the output as a JSON object with keys "todo_list" (list of strings) and "summary" (string).
+        """
+
+    def _condense_prompt(self, group: List[dict], index: int, total: int, custom_prompt: str = None) -> str:
+        return f"""
+        You are an expert AI assistant. The following are notes on consecutive parts of a long meeting.
+        Combine them into a single shorter summary and a single "To Do" list without duplicates,
+        keeping names, figures, dates and decisions.{self._instructions(custom_prompt)}
+
+        {self._format_notes(group)}
+
+        Format the output as a JSON object with keys "todo_list" (list of strings) and "summary" (string).
+        """
+
+    def _reduce_prompt(self, notes: List[dict], custom_prompt: str = None) -> str:
+        return f"""
+        You are an expert AI assistant. The following are notes on the consecutive parts of one meeting transcription, in order.
+        Based on them, provide:
+        1. A single list of "To Do" items for the whole meeting, merging duplicates.
+        2. A concise meeting report summarizing the key points, decisions, and next steps.{self._instructions(custom_prompt)}
+
+        {self._format_notes(notes)}
+
+        Format the output as a JSON object with keys "todo_list" (list of strings) and "report" (string).
+        """
+
+    @staticmethod
+    def _format_notes(notes: List[dict]) -> str:
+        blocks = []
+        for index, note in enumerate(notes):
+            todos = "\n".join(f"- {item}" for item in note["todo_list"]) or "- (none)"
+            blocks.append(f"Part {index + 1} of {len(notes)}\nSummary:\n{note['summary']}\nTo Do:\n{todos}")
+        return "\n\n".join(blocks)
+
+    def _group_notes(self, notes: List[dict], max_tokens: int, model: str) -> List[List[dict]]:
+        """Pack consecutive notes into groups of at most max_tokens."""
+        groups = [[]]
+        for note in notes:
+            if groups[-1] and count_tokens(self._format_notes(groups[-1] + [note]), model) > max_tokens:
+                groups.append([])
+            groups[-1].append(note)
+        return groups
+
+    @staticmethod
+    def _normalize(result: dict) -> dict:
+        """Keep the documented output shape whatever extra keys the model adds."""
+        todo_list = result.get("todo_list") or []
+        if not isinstance(todo_list, list):
+            todo_list = [todo_list]
+        return {
+            "todo_list": [str(item) for item in todo_list if item],
+            "report": str(result.get("report") or ""),
+        }
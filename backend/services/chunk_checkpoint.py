@@ -0,0 +1,69 @@
+import asyncio
+import sys
+import os
+from typing import Dict
+
+# Add root directory to sys.path to import existing modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from checkpoint import ChunkCheckpoint
+from models import AudioChunk, TranscriptionResult
+from backend.database import SessionLocal, JobChunk, db_writer
+
+class JobChunkCheckpoint(ChunkCheckpoint):
+    """
+    Stores completed chunk transcriptions of a job in the job_chunks table,
+    so a retried job only re-sends the chunks that failed.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def load(self, plan_key: str) -> Dict[int, TranscriptionResult]:
+        db = SessionLocal()
+        try:
+            rows = db.query(JobChunk).filter(
+                JobChunk.job_id == self.job_id,
+                JobChunk.plan_key == plan_key
+            ).all()
+            return {
+                row.chunk_index: TranscriptionResult(
+                    chunk_index=row.chunk_index,
+                    text=row.text,
+                    processing_time=row.processing_time or 0.0
+                )
+                for row in rows
+            }
+        finally:
+            db.close()
+
+    def _save_write(self, plan_key: str, chunk: AudioChunk, result: TranscriptionResult):
+        def write(db) -> None:
+            db.merge(JobChunk(
+                job_id=self.job_id,
+                chunk_index=chunk.index,
+                plan_key=plan_key,
+                text=result.text,
+                processing_time=result.processing_time,
+                duration=chunk.duration,
+                size_mb=chunk.size_mb
+            ))
+
+        return write
+
+    def _clear_write(self, db) -> None:
+        db.query(JobChunk).filter(JobChunk.job_id == self.job_id).delete()
+
+    def save(self, plan_key: str, chunk: AudioChunk, result: TranscriptionResult) -> None:
+        db_writer.run(self._save_write(plan_key, chunk, result))
+
+    def clear(self) -> None:
+        db_writer.run(self._clear_write)
+
+    # Writes are queued on the writer thread and awaited, not run in the executor
+
+    async def save_async(self, plan_key: str, chunk: AudioChunk, result: TranscriptionResult) -> None:
+        await asyncio.wrap_future(db_writer.submit(self._save_write(plan_key, chunk, result)))
+
+    async def clear_async(self) -> None:
+        await asyncio.wrap_future(db_writer.submit(self._clear_write))
@@ -0,0 +1,401 @@
+import hashlib
+import json
+import os
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from backend.database import IS_SQLITE, SessionLocal, engine, Job, JobContent
+
+try:
+    import zstandard
+except ImportError:  # Optional: content is compressed with zlib without it
+    zstandard = None
+
+# Codec for newly written content; blobs keep the codec they were written with
+CONTENT_CODEC = os.getenv('CONTENT_CODEC', 'zstd' if zstandard else 'zlib')
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+
+# Archival tier: content not modified for this many days moves from the
+# database to content-addressed files (0 keeps everything in the database)
+CONTENT_ARCHIVE_DIR = os.getenv('CONTENT_ARCHIVE_DIR', 'archive')
+CONTENT_ARCHIVE_AFTER_DAYS = float(os.getenv('CONTENT_ARCHIVE_AFTER_DAYS', '0'))
+ARCHIVE_BATCH_SIZE = 100
+
+# Full-text index columns, in the order of their bm25 weights
+SEARCH_COLUMNS = ("semantic_title", "analysis_report", "transcription")
+SEARCH_WEIGHTS = (10.0, 3.0, 1.0)
+
+MIGRATION_BATCH_SIZE = 200
+
+_fts_enabled = False
+
+
+@dataclass
+class JobText:
+    """The heavy, rarely read part of a job."""
+    transcription: Optional[str] = None
+    analysis_report: Optional[str] = None
+
+
+# --- Compression ---
+
+def compress(raw: bytes, codec: str = CONTENT_CODEC) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("CONTENT_CODEC=zstd requires the zstandard package")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    if codec == 'zlib':
+        return zlib.compress(raw, ZLIB_LEVEL)
+    raise ValueError(f"Unknown content codec '{codec}'")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This content was compressed with zstd; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown content codec '{codec}'")
+
+
+# --- Archive files ---
+
+def _archive_path(key: str) -> str:
+    return os.path.join(CONTENT_ARCHIVE_DIR, key[:2], key)
+
+
+def _write_archive(data: bytes) -> str:
+    """Store a blob under its sha256; identical blobs share one file. Returns the key."""
+    key = hashlib.sha256(data).hexdigest()
+    path = _archive_path(key)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return key
+
+
+def _release_archive(db: Session, key: Optional[str], content_id: int) -> None:
+    """Delete an archive file once no other job's content points at it."""
+    if not key:
+        return
+    shared = db.query(JobContent.id).filter(JobContent.archive_key == key, JobContent.id != content_id).first()
+    if shared is None:
+        _remove_archive_after_commit(db, key)
+
+
+def _remove_archive_after_commit(db: Session, key: str) -> None:
+    """
+    Delete an archive file when the session commits. Until then a rollback
+    would leave rows pointing at it, so the file must stay.
+    """
+    db.info.setdefault("released_archive_keys", set()).add(key)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remove_released_archives(session: Session) -> None:
+    keys = session.info.pop("released_archive_keys", None)
+    if not keys:
+        return
+    # Content archived meanwhile by another session may have reused a file
+    with engine.connect() as conn:
+        for key in keys:
+            if conn.execute(text("SELECT 1 FROM job_contents WHERE archive_key = :key LIMIT 1"), {"key": key}).first():
+                continue
+            if os.path.exists(_archive_path(key)):
+                os.remove(_archive_path(key))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _keep_released_archives(session: Session) -> None:
+    session.info.pop("released_archive_keys", None)
+
+
+# --- Reading and writing job content ---
+
+def read_job_text(content: Optional[JobContent]) -> JobText:
+    """Decompress a job's content, from the database or its archive file."""
+    if content is None:
+        return JobText()
+    data = content.data
+    if data is None:
+        with open(_archive_path(content.archive_key), 'rb') as f:
+            data = f.read()
+    return JobText(**json.loads(decompress(data, content.codec)))
+
+
+def set_job_text(db: Session, job: Job, semantic_title: Optional[str] = None, transcription: Optional[str] = None, analysis_report: Optional[str] = None) -> None:
+    """
+    Update a job's title and content together, keeping the search index in step.
+
+    Fields left as None are unchanged. All changes to a job's title, transcript
+    or report go through here; the caller commits.
+    """
+    content = job.content
+    # Every stored content is indexed, so an existing one has an index entry
+    indexed = content is not None
+    old_text = read_job_text(content)
+    old_title = job.semantic_title
+
+    if semantic_title is not None:
+        job.semantic_title = semantic_title
+    new_text = JobText(
+        transcription=transcription if transcription is not None else old_text.transcription,
+        analysis_report=analysis_report if analysis_report is not None else old_text.analysis_report
+    )
+
+    if new_text != old_text or content is None:
+        raw = json.dumps(asdict(new_text)).encode('utf-8')
+        data = compress(raw)
+        if content is None:
+            content = JobContent(job_id=job.id)
+            job.content = content
+        old_archive_key = content.archive_key
+        content.codec = CONTENT_CODEC
+        content.data = data
+        content.archive_key = None
+        content.archived_at = None
+        content.raw_bytes = len(raw)
+        content.stored_bytes = len(data)
+        db.flush()
+        _release_archive(db, old_archive_key, content.id)
+    else:
+        db.flush()
+
+    if fts_enabled(db):
+        if indexed:
+            _unindex(db, content.id, old_title, old_text)
+        _index(db, content.id, job.semantic_title, new_text)
+
+
+def delete_job_text(db: Session, job: Job) -> None:
+    """
+    Remove a job's content, search entry and archive file. The caller deletes
+    the job and commits; the file is only deleted once the commit succeeds.
+    """
+    content = job.content
+    if content is None:
+        return
+    if fts_enabled(db):
+        _unindex(db, content.id, job.semantic_title, read_job_text(content))
+    _release_archive(db, content.archive_key, content.id)
+    job.content = None
+    db.flush()
+
+
+def delete_all_job_text(db: Session) -> None:
+    """Remove the content of every job, for clearing the history. The caller commits; archive files go after it."""
+    for (key,) in db.query(JobContent.archive_key).filter(JobContent.archive_key.isnot(None)).distinct():
+        _remove_archive_after_commit(db, key)
+    if fts_enabled(db):
+        db.execute(text("INSERT INTO jobs_fts(jobs_fts) VALUES ('delete-all')"))
+    db.query(JobContent).delete(synchronize_session=False)
+
+
+def archive_old_content(days: float = CONTENT_ARCHIVE_AFTER_DAYS) -> int:
+    """
+    Move content not modified for `days` out of the database into archive files.
+
+    The blobs are written as they are, so archiving costs no recompression and
+    reading an archived job only adds one file read. Returns the number of
+    jobs archived.
+    """
+    if days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = 0
+    db = SessionLocal()
+    try:
+        while True:
+            batch = (
+                db.query(JobContent)
+                .filter(JobContent.data.isnot(None), JobContent.updated_at < cutoff)
+                .limit(ARCHIVE_BATCH_SIZE)
+                .all()
+            )
+            if not batch:
+                return archived
+            for content in batch:
+                key = _write_archive(content.data)
+                db.query(JobContent).filter(JobContent.id == content.id).update({
+                    JobContent.data: None,
+                    JobContent.archive_key: key,
+                    JobContent.archived_at: datetime.utcnow(),
+                    # Archiving is not a modification
+                    JobContent.updated_at: JobContent.updated_at,
+                }, synchronize_session=False)
+            db.commit()
+            db.expire_all()
+            archived += len(batch)
+    finally:
+        db.close()
+
+
+# --- Search index ---
+
+def fts_enabled(db: Session) -> bool:
+    """Whether the FTS5 index exists (SQLite built with FTS5)."""
+    global _fts_enabled
+    if not _fts_enabled and IS_SQLITE:
+        _fts_enabled = db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'jobs_fts'")).first() is not None
+    return _fts_enabled
+
+
+def _index_values(title: Optional[str], job_text: JobText) -> dict:
+    return {
+        "semantic_title": title or "",
+        "analysis_report": job_text.analysis_report or "",
+        "transcription": job_text.transcription or "",
+    }
+
+
+def _index(db: Session, content_id: int, title: Optional[str], job_text: JobText) -> None:
+    columns = ", ".join(SEARCH_COLUMNS)
+    params = ", ".join(f":{name}" for name in SEARCH_COLUMNS)
+    db.execute(
+        text(f"INSERT INTO jobs_fts(rowid, {columns}) VALUES (:rowid, {params})"),
+        {"rowid": content_id, **_index_values(title, job_text)}
+    )
+
+
+def _unindex(db: Session, content_id: int, title: Optional[str], job_text: JobText) -> None:
+    # The index keeps no copy of the text, so removing an entry takes the
+    # exact values it was indexed with
+    columns = ", ".join(SEARCH_COLUMNS)
+    params = ", ".join(f":{name}" for name in SEARCH_COLUMNS)
+    db.execute(
+        text(f"INSERT INTO jobs_fts(jobs_fts, rowid, {columns}) VALUES ('delete', :rowid, {params})"),
+        {"rowid": content_id, **_index_values(title, job_text)}
+    )
+
+
+def rebuild_search_index(db: Session) -> int:
+    """Re-index the content of every job. Returns the number of jobs indexed."""
+    db.execute(text("INSERT INTO jobs_fts(jobs_fts) VALUES ('delete-all')"))
+    count = 0
+    last_id = 0
+    while True:
+        batch = (
+            db.query(JobContent, Job.semantic_title)
+            .join(Job, Job.id == JobContent.job_id)
+            .filter(JobContent.id > last_id)
+            .order_by(JobContent.id)
+            .limit(MIGRATION_BATCH_SIZE)
+            .all()
+        )
+        if not batch:
+            return count
+        for content, title in batch:
+            _index(db, content.id, title, read_job_text(content))
+        last_id = batch[-1][0].id
+        count += len(batch)
+        db.expunge_all()
+
+
+def _create_search_index() -> bool:
+    """
+    Create the FTS5 index used by /api/search, if missing. Returns True if created.
+
+    The index is contentless: it holds the search terms but no copy of the
+    text, which stays compressed in job_contents. Its row ids are
+    job_contents.id, so VACUUM does not break the mapping.
+    """
+    columns = ", ".join(SEARCH_COLUMNS)
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'jobs_fts'")).first():
+            return False
+        try:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE jobs_fts USING fts5({columns}, content='', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+        except Exception as e:
+            print(f"Full-text search unavailable, falling back to substring search: {e}")
+            return False
+        # Titles weigh most, then reports, then the transcript itself
+        conn.execute(text(f"INSERT INTO jobs_fts(jobs_fts, rank) VALUES ('rank', 'bm25({weights})')"))
+    return True
+
+
+def _drop_inline_search_index() -> None:
+    """Drop the earlier search index that read the text straight from the jobs table."""
+    with engine.begin() as conn:
+        row = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'jobs_fts'")).first()
+        if row is None or "content='jobs'" not in row[0]:
+            return
+        for trigger in ("jobs_fts_insert", "jobs_fts_delete", "jobs_fts_update"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text("DROP TABLE jobs_fts"))
+
+
+def migrate_inline_content() -> int:
+    """
+    Move transcripts and reports stored in the jobs table by older versions
+    into compressed job_contents rows, then drop the emptied columns.
+
+    Returns:
+        int: Number of jobs migrated
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("jobs")}
+    if "transcription" not in columns:
+        return 0
+
+    migrated = 0
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.execute(text(
+                "SELECT id, transcription, analysis_report FROM jobs "
+                "WHERE transcription IS NOT NULL OR analysis_report IS NOT NULL LIMIT :limit"
+            ), {"limit": MIGRATION_BATCH_SIZE}).all()
+            if not rows:
+                break
+            for job_id, transcription, analysis_report in rows:
+                job = db.get(Job, job_id)
+                if job.content is None:
+                    set_job_text(db, job, transcription=transcription, analysis_report=analysis_report)
+                # Plain SQL, so moving the text does not count as a job change
+                db.execute(
+                    text("UPDATE jobs SET transcription = NULL, analysis_report = NULL WHERE id = :id"),
+                    {"id": job_id}
+                )
+                migrated += 1
+            db.commit()
+    finally:
+        db.close()
+
+    # SQLite 3.35+ can drop columns; on older versions they just stay empty
+    with engine.begin() as conn:
+        try:
+            conn.execute(text("ALTER TABLE jobs DROP COLUMN transcription"))
+            conn.execute(text("ALTER TABLE jobs DROP COLUMN analysis_report"))
+        except Exception:
+            pass
+    if migrated:
+        print(f"Moved the transcripts of {migrated} job(s) to compressed storage; "
+              "run VACUUM on the database to return the freed space to the disk")
+    return migrated
+
+
+def init_content_store() -> None:
+    """Create the search index and migrate databases from older versions. Called by init_db()."""
+    if IS_SQLITE:
+        _drop_inline_search_index()
+        if _create_search_index():
+            db = SessionLocal()
+            try:
+                rebuild_search_index(db)
+                db.commit()
+            finally:
+                db.close()
+    migrate_inline_content()
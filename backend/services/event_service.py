@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from backend.database import SessionLocal, JobEvent, db_writer
+
+# Events older than this are pruned; clients disconnected for longer reload the job list
+EVENT_RETENTION_HOURS = float(os.getenv('EVENT_RETENTION_HOURS', '24'))
+# How often each API process checks for events written by other processes (dedicated workers)
+EVENT_POLL_SECONDS = float(os.getenv('EVENT_POLL_SECONDS', '1'))
+# Comment lines sent on idle connections so proxies don't time them out
+KEEPALIVE_SECONDS = 15
+EVENT_BATCH_SIZE = 200
+
+
+# job_id of events that concern every job, e.g. clearing the history
+ALL_JOBS = "*"
+
+
+class EventType:
+    STATUS = "job.status"
+    PROGRESS = "job.progress"
+    DELETED = "job.deleted"
+
+
+def _event_write(job_id: str, event_type: str, data: Optional[dict]):
+    def write(db) -> int:
+        event = JobEvent(job_id=job_id, type=event_type, data=data or {})
+        db.add(event)
+        db.flush()
+        return event.id
+
+    return write
+
+
+def publish_event(job_id: str, event_type: str, data: Optional[dict] = None) -> int:
+    """
+    Record a job event and wake the event streams in this process.
+
+    Events are stored in the database so clients can resume from their last
+    event id, and so events published by dedicated worker processes reach
+    the API process. Blocks until the event is written; coroutines use
+    publish_event_async.
+
+    Returns:
+        int: The event id
+    """
+    event_id = db_writer.run(_event_write(job_id, event_type, data))
+    broadcaster.notify(event_id)
+    return event_id
+
+
+async def publish_event_async(job_id: str, event_type: str, data: Optional[dict] = None) -> int:
+    """publish_event for coroutines: the write is queued on the writer thread and awaited."""
+    event_id = await asyncio.wrap_future(db_writer.submit(_event_write(job_id, event_type, data)))
+    broadcaster.notify(event_id)
+    return event_id
+
+
+def latest_event_id() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(func.max(JobEvent.id)).scalar() or 0
+    finally:
+        db.close()
+
+
+def fetch_events(after_id: int, job_ids: Optional[List[str]] = None, limit: int = EVENT_BATCH_SIZE) -> List[JobEvent]:
+    """Return events newer than after_id, oldest first, optionally for some jobs only."""
+    db = SessionLocal()
+    try:
+        query = db.query(JobEvent).filter(JobEvent.id > after_id)
+        if job_ids:
+            query = query.filter(JobEvent.job_id.in_([*job_ids, ALL_JOBS]))
+        events = query.order_by(JobEvent.id).limit(limit).all()
+        for event in events:
+            db.expunge(event)
+        return events
+    finally:
+        db.close()
+
+
+def prune_events() -> int:
+    """Delete events past the retention window. Returns the number removed."""
+    cutoff = datetime.utcnow() - timedelta(hours=EVENT_RETENTION_HOURS)
+    db = SessionLocal()
+    try:
+        removed = db.query(JobEvent).filter(JobEvent.created_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+        return removed
+    finally:
+        db.close()
+
+
+def format_sse(event: JobEvent) -> str:
+    payload = {"job_id": event.job_id, **(event.data or {})}
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(payload)}\n\n"
+
+
+class EventBroadcaster:
+    """
+    Wakes the SSE connections of this process when new events exist.
+
+    Events published in this process wake subscribers directly. For events
+    written by other processes, one shared poller per process checks the
+    latest event id, so the database cost does not grow with the number of
+    open connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._latest_id = 0
+        self._poller: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> Tuple[asyncio.AbstractEventLoop, asyncio.Event]:
+        loop = asyncio.get_running_loop()
+        subscriber = (loop, asyncio.Event())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        if self._poller is None or self._poller.done():
+            self._poller = loop.create_task(self._poll())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Tuple[asyncio.AbstractEventLoop, asyncio.Event]) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def notify(self, event_id: int) -> None:
+        """Wake all subscribers. Safe to call from any thread."""
+        with self._lock:
+            self._latest_id = max(self._latest_id, event_id)
+            subscribers = list(self._subscribers)
+        for loop, wake in subscribers:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self.unsubscribe((loop, wake))
+
+    async def _poll(self) -> None:
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    return
+            latest = await asyncio.get_running_loop().run_in_executor(None, latest_event_id)
+            if latest > self._latest_id:
+                self.notify(latest)
+            await asyncio.sleep(EVENT_POLL_SECONDS)
+
+
+broadcaster = EventBroadcaster()
+
+
+async def stream_events(last_event_id: Optional[int], job_ids: Optional[List[str]] = None, is_disconnected=None) -> AsyncIterator[str]:
+    """
+    Yield job events formatted for a text/event-stream response.
+
+    Args:
+        last_event_id: Resume after this event; None starts with new events only
+        job_ids: Only stream events for these jobs (default: all jobs)
+        is_disconnected: Optional coroutine function telling when the client left
+    """
+    subscriber = broadcaster.subscribe()
+    _, wake = subscriber
+    loop = asyncio.get_running_loop()
+    cursor = last_event_id if last_event_id is not None else await loop.run_in_executor(None, latest_event_id)
+    last_sent = loop.time()
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            wake.clear()
+            events = await loop.run_in_executor(None, fetch_events, cursor, job_ids)
+            for event in events:
+                cursor = event.id
+                yield format_sse(event)
+            if events:
+                last_sent = loop.time()
+                if len(events) == EVENT_BATCH_SIZE:
+                    continue
+            if is_disconnected is not None and await is_disconnected():
+                return
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            if loop.time() - last_sent >= KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = loop.time()
+    finally:
+        broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, defer, joinedload
+
+from backend.database import Job
+
+# Position in the history list: (created_at, id) of the last job already shown
+PageCursor = Tuple[datetime, str]
+
+
+def list_jobs_page(db: Session, client_id: Optional[str] = None, after: Optional[PageCursor] = None, limit: int = 50) -> Tuple[List[Job], Optional[PageCursor]]:
+    """
+    One page of the job history, newest first.
+
+    The to-do list, prompt and per-call usage columns stay unloaded
+    (transcripts and reports live in job_contents), and the client is joined
+    in the same query, so a page costs a single indexed range scan however
+    many jobs the table holds.
+
+    Returns:
+        Tuple[List[Job], Optional[PageCursor]]: The jobs and the cursor of the
+            next page, None on the last page
+    """
+    query = db.query(Job).options(
+        defer(Job.analysis_todo),
+        defer(Job.custom_prompt),
+        defer(Job.api_calls),
+        joinedload(Job.client)
+    )
+    if client_id:
+        query = query.filter(Job.client_id == client_id)
+    if after:
+        # Keyset pagination: continue after the last job of the previous page,
+        # with the id breaking ties between jobs created at the same instant
+        query = query.filter(tuple_(Job.created_at, Job.id) < tuple_(*after))
+    jobs = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit + 1).all()
+
+    if len(jobs) <= limit:
+        return jobs, None
+    last = jobs[limit - 1]
+    return jobs[:limit], (last.created_at, last.id)
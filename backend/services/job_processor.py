@@ -0,0 +1,150 @@
+import asyncio
+import os
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from backend.services.transcription_service import TranscriptionService
+from backend.services.analysis_service import AnalysisService
+from backend.services.chunk_checkpoint import JobChunkCheckpoint
+from backend.services.event_service import EventType, publish_event_async
+from backend.services.content_store import set_job_text
+from backend.services.stage_graph import StageGraph
+from backend.database import get_db, db_writer, Job, JobStatus
+from models import TranscriptionResult
+from metrics import JOBS_FINISHED, STAGE_SECONDS
+
+async def update_job(job_id: str, values: dict) -> None:
+    """Write job columns through the serialized writer without blocking the event loop."""
+    def write(db) -> None:
+        db.query(Job).filter(Job.id == job_id).update(values, synchronize_session=False)
+
+    await asyncio.wrap_future(db_writer.submit(write))
+
+def usage_values(transcription_usage: dict, analysis_usage: dict) -> dict:
+    """Job columns for the API usage of one run."""
+    calls = transcription_usage["calls"] + analysis_usage["calls"]
+    return {
+        Job.prompt_tokens: analysis_usage["prompt_tokens"],
+        Job.completion_tokens: analysis_usage["completion_tokens"],
+        Job.audio_seconds: transcription_usage["audio_seconds"],
+        Job.api_seconds: round(sum(call["seconds"] for call in calls), 3),
+        Job.api_calls: calls,
+    }
+
+async def process_transcription(job_id: str, file_path: str, language: str, model: str, custom_prompt: Optional[str], concurrency: Optional[int] = None, use_cache: bool = True):
+    # Read what the job needs up front; no session stays open while it runs
+    db = next(get_db())
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            return
+        job_metadata = job.job_metadata or {}
+    finally:
+        db.close()
+
+    await update_job(job_id, {Job.status: JobStatus.PROCESSING})
+
+    completed = False
+    checkpoint = JobChunkCheckpoint(job_id)
+
+    async def report_chunk(result: TranscriptionResult, done: int, total: int) -> None:
+        await publish_event_async(job_id, EventType.PROGRESS, {
+            "stage": "transcribing",
+            "completed": done,
+            "total": total,
+            "chunk_index": result.chunk_index,
+        })
+
+    async def save_text(**values) -> None:
+        """Commit part of the job's title, transcript and report as soon as it is ready."""
+        def write(db) -> None:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if job is not None:
+                set_job_text(db, job, **values)
+
+        await asyncio.wrap_future(db_writer.submit(write))
+
+    async def transcribe(results: dict) -> str:
+        # Chunks finished by an earlier attempt are restored, not re-sent
+        await publish_event_async(job_id, EventType.PROGRESS, {"stage": "preparing"})
+        with STAGE_SECONDS.labels(stage="transcribe").time():
+            return await transcription_service.process_file_async(
+                file_path, language, max_concurrency=concurrency, checkpoint=checkpoint,
+                on_chunk_complete=report_chunk
+            )
+
+    async def analyze(results: dict) -> dict:
+        # The chat client is synchronous, keep it off the event loop
+        await publish_event_async(job_id, EventType.PROGRESS, {"stage": "analyzing"})
+        with STAGE_SECONDS.labels(stage="analysis").time():
+            return await run_in_threadpool(analysis_service.analyze_transcription, results["transcribe"], model, custom_prompt, use_cache)
+
+    async def save_analysis(analysis: dict) -> None:
+        # Convert simple string list to object list for checkboxes
+        raw_todos = analysis.get("todo_list", [])
+        if raw_todos and isinstance(raw_todos[0], str):
+            analysis_todo = [{"text": item, "done": False} for item in raw_todos]
+        else:
+            analysis_todo = []
+
+        def write(db) -> None:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if job is not None:
+                set_job_text(db, job, analysis_report=analysis.get("report") or "")
+                job.analysis_todo = analysis_todo
+
+        await asyncio.wrap_future(db_writer.submit(write))
+
+    async def make_title(results: dict) -> str:
+        with STAGE_SECONDS.labels(stage="title").time():
+            return await run_in_threadpool(analysis_service.generate_title, results["transcribe"], use_cache)
+
+    # Post-transcription stages only wait for what they read; new ones are added
+    # here next to the title and analysis and run alongside them
+    stages = StageGraph()
+    stages.add("transcribe", transcribe, commit=lambda text: save_text(transcription=text))
+    stages.add("analysis", analyze, depends_on=("transcribe",), commit=save_analysis)
+    stages.add("title", make_title, depends_on=("transcribe",), commit=lambda title: save_text(semantic_title=title))
+
+    transcription_service = analysis_service = None
+    try:
+        transcription_service = TranscriptionService()
+        analysis_service = AnalysisService()
+        results = await stages.run()
+        semantic_title = results["title"]
+        usage = usage_values(transcription_service.usage, analysis_service.usage)
+
+        def complete(db) -> None:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if job is None:
+                return
+            for column, value in usage.items():
+                setattr(job, column.key, value)
+            job.job_metadata = {**job_metadata, **transcription_service.stats, **analysis_service.stats, "stage_seconds": stages.durations}
+            job.status = JobStatus.COMPLETED
+            job.error = None
+
+        await asyncio.wrap_future(db_writer.submit(complete))
+        completed = True
+        JOBS_FINISHED.labels(status=JobStatus.COMPLETED).inc()
+        await publish_event_async(job_id, EventType.STATUS, {"status": JobStatus.COMPLETED, "semantic_title": semantic_title})
+
+    except asyncio.CancelledError:
+        # Worker shutdown or lost lease: keep the upload so the job can run again
+        raise
+    except Exception as e:
+        # Keep the upload and chunk checkpoints so the job can be retried
+        values = {Job.status: JobStatus.FAILED, Job.error: str(e)}
+        if transcription_service is not None and analysis_service is not None:
+            # What the failed run used is billed all the same
+            values.update(usage_values(transcription_service.usage, analysis_service.usage))
+        await update_job(job_id, values)
+        JOBS_FINISHED.labels(status=JobStatus.FAILED).inc()
+        await publish_event_async(job_id, EventType.STATUS, {"status": JobStatus.FAILED, "error": str(e)})
+    finally:
+        # Cleanup uploaded file and checkpoints once the job completed
+        if completed:
+            await checkpoint.clear_async()
+            if os.path.exists(file_path):
+                os.remove(file_path)
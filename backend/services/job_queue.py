@@ -0,0 +1,160 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from backend.database import SessionLocal, Job, JobStatus
+from backend.services.event_service import EventType, publish_event
+from metrics import register_collector
+
+# A processing job whose lease is not renewed within this window is considered orphaned
+LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '60'))
+# Jobs are failed instead of re-queued after this many claims
+MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[Job]:
+    """
+    Atomically take the oldest queued job and put it under a lease for this worker.
+
+    The status check in the UPDATE makes the claim safe when several worker
+    processes poll the same table.
+    """
+    candidates = (
+        db.query(Job.id)
+        .filter(Job.status == JobStatus.QUEUED)
+        .order_by(Job.created_at)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        now = datetime.utcnow()
+        claimed = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.status == JobStatus.QUEUED)
+            .update({
+                Job.status: JobStatus.PROCESSING,
+                Job.lease_owner: worker_id,
+                Job.lease_expires_at: now + timedelta(seconds=LEASE_SECONDS),
+                Job.heartbeat_at: now,
+                Job.attempts: func.coalesce(Job.attempts, 0) + 1,
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if claimed:
+            publish_event(job_id, EventType.STATUS, {"status": JobStatus.PROCESSING})
+            return db.query(Job).filter(Job.id == job_id).first()
+    return None
+
+
+def heartbeat(db: Session, job_id: str, worker_id: str) -> bool:
+    """
+    Extend the lease on a job. Returns False if the worker no longer owns it.
+    """
+    now = datetime.utcnow()
+    renewed = (
+        db.query(Job)
+        .filter(
+            Job.id == job_id,
+            Job.lease_owner == worker_id,
+            Job.status == JobStatus.PROCESSING,
+        )
+        .update({
+            Job.lease_expires_at: now + timedelta(seconds=LEASE_SECONDS),
+            Job.heartbeat_at: now,
+            # Lease upkeep is not a change polling clients need to see
+            Job.version: Job.version,
+            Job.updated_at: Job.updated_at,
+        }, synchronize_session=False)
+    )
+    db.commit()
+    return bool(renewed)
+
+
+def release_job(db: Session, job_id: str, worker_id: str, requeue: bool = False) -> None:
+    """
+    Drop this worker's lease. With requeue=True the job goes back to the queue
+    immediately instead of waiting for the lease to expire (used on shutdown).
+    """
+    owned = db.query(Job).filter(Job.id == job_id, Job.lease_owner == worker_id)
+    requeued = 0
+    if requeue:
+        # Only jobs that were interrupted mid-run; a shutdown is not a failed attempt
+        requeued = owned.filter(Job.status == JobStatus.PROCESSING).update({
+            Job.status: JobStatus.QUEUED,
+            Job.attempts: func.coalesce(Job.attempts, 1) - 1,
+        }, synchronize_session=False)
+    owned.update({
+        Job.lease_owner: None,
+        Job.lease_expires_at: None,
+    }, synchronize_session=False)
+    db.commit()
+    if requeued:
+        publish_event(job_id, EventType.STATUS, {"status": JobStatus.QUEUED})
+
+
+def requeue_expired_jobs(db: Session) -> int:
+    """
+    Return orphaned processing jobs to the queue.
+
+    A job is orphaned when its lease expired (its worker crashed or was
+    restarted) or it has no lease at all (it was started before the queue
+    existed). Jobs that already used up MAX_ATTEMPTS are failed instead.
+
+    Returns:
+        int: Number of jobs re-queued or failed
+    """
+    now = datetime.utcnow()
+    expired = (
+        db.query(Job)
+        .filter(
+            Job.status == JobStatus.PROCESSING,
+            or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now),
+        )
+        .all()
+    )
+    for job in expired:
+        job.lease_owner = None
+        job.lease_expires_at = None
+        if (job.attempts or 0) >= MAX_ATTEMPTS:
+            job.status = JobStatus.FAILED
+            job.error = f"Worker lost the job {job.attempts} times, giving up"
+        else:
+            job.status = JobStatus.QUEUED
+    if expired:
+        db.commit()
+    for job in expired:
+        publish_event(job.id, EventType.STATUS, {"status": job.status, "error": job.error})
+    return len(expired)
+
+
+class _QueueCollector:
+    """Queue depth and jobs in flight, read from the database at scrape time so they cover every worker process."""
+
+    def describe(self):
+        # Lets the registry learn the names without querying the database at import time
+        yield GaugeMetricFamily('transcribe_jobs_queued', 'Jobs waiting for a worker')
+        yield GaugeMetricFamily('transcribe_jobs_in_flight', 'Jobs being processed by a worker')
+
+    def collect(self):
+        db = SessionLocal()
+        try:
+            # An index range scan on ix_jobs_status_created_at
+            counts = dict(
+                db.query(Job.status, func.count(Job.id))
+                .filter(Job.status.in_((JobStatus.QUEUED, JobStatus.PROCESSING)))
+                .group_by(Job.status)
+                .all()
+            )
+        finally:
+            db.close()
+        yield GaugeMetricFamily('transcribe_jobs_queued', 'Jobs waiting for a worker', value=counts.get(JobStatus.QUEUED, 0))
+        yield GaugeMetricFamily(
+            'transcribe_jobs_in_flight', 'Jobs being processed by a worker', value=counts.get(JobStatus.PROCESSING, 0)
+        )
+
+
+register_collector(_QueueCollector())
@@ -0,0 +1,208 @@
+import html
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.database import Client, Job, JobContent
+from backend.services.content_store import fts_enabled, read_job_text
+
+# Words of context around the first match in each snippet
+SNIPPET_TOKENS = 16
+MAX_RESULTS = 100
+# Jobs decompressed per batch by the substring fallback
+FALLBACK_BATCH_SIZE = 200
+
+# Placeholders for the highlight tags, swapped in once the snippet text is escaped
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn what a user typed into an FTS5 query.
+
+    Quoted parts stay phrases and every other word must appear somewhere in
+    the job. Operators and punctuation are treated as plain text. Words are
+    not matched as prefixes: a short prefix expands to thousands of terms
+    and turns a millisecond lookup into a scan of the whole index.
+    """
+    terms = []
+    for phrase in re.findall(r'"([^"]*)"', query):
+        words = re.findall(r'\w+', phrase)
+        if words:
+            terms.append('"' + " ".join(words) + '"')
+    words = re.findall(r'\w+', re.sub(r'"[^"]*"', " ", query))
+    terms += [f'"{word}"' for word in words]
+    return " ".join(terms)
+
+
+def highlight(snippet: Optional[str]) -> Optional[str]:
+    """Escape snippet text for HTML and turn the match placeholders into <mark> tags."""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+class _FoldTable(dict):
+    """str.translate table filled in as new characters are seen."""
+
+    def __missing__(self, codepoint: int) -> str:
+        decomposed = unicodedata.normalize("NFKD", chr(codepoint).lower())
+        folded = decomposed[0] if decomposed else chr(codepoint)
+        self[codepoint] = folded
+        return folded
+
+
+_FOLD_TABLE = _FoldTable()
+
+
+def fold(value: str) -> str:
+    """Lowercase and strip accents like the search index does, one character for one."""
+    return value.translate(_FOLD_TABLE)
+
+
+def query_words(query: str) -> List[str]:
+    return [fold(word) for word in re.findall(r'\w+', query)]
+
+
+def make_snippet(values: Tuple[Optional[str], ...], words: List[str], tokens: int = SNIPPET_TOKENS) -> Optional[str]:
+    """
+    Cut the words around the first match out of the first field that has
+    one, and mark every query word in it.
+
+    Returns:
+        Optional[str]: HTML-safe snippet, or None when no field matches
+    """
+    if not words:
+        return None
+    pattern = re.compile(r'\b(?:' + "|".join(re.escape(word) for word in words) + r')\b')
+    for value in values:
+        if not value:
+            continue
+        folded = fold(value)
+        first = pattern.search(folded)
+        if first is None:
+            continue
+        spans = [match.span() for match in re.finditer(r'\w+', value)]
+        center = next(i for i, (start, end) in enumerate(spans) if end > first.start())
+        window = spans[max(0, center - tokens // 2):center + tokens // 2]
+        start, end = window[0][0], window[-1][1]
+
+        parts = []
+        position = start
+        for match in pattern.finditer(folded, start, end):
+            parts += [value[position:match.start()], _MARK_START, value[match.start():match.end()], _MARK_END]
+            position = match.end()
+        parts.append(value[position:end])
+        snippet = ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(value) else "")
+        return highlight(snippet)
+    return None
+
+
+def search_jobs(db: Session, query: str, client_id: Optional[str] = None, limit: int = 20) -> List[dict]:
+    """
+    Find jobs whose title, report or transcription mention the query.
+
+    Returns:
+        List[dict]: Best matches first, each with the job's summary fields and
+            an HTML-safe snippet with the matches wrapped in <mark>
+    """
+    limit = min(limit, MAX_RESULTS)
+    if fts_enabled(db):
+        return _search_fts(db, query, client_id, limit)
+    return _search_substring(db, query, client_id, limit)
+
+
+def _result(job: Job, client_name: Optional[str], score: Optional[float], snippet: Optional[str]) -> dict:
+    return {
+        "job_id": job.id,
+        "filename": job.filename,
+        "semantic_title": job.semantic_title,
+        "status": job.status,
+        "created_at": job.created_at,
+        "client_name": client_name,
+        "score": score,
+        "snippet": snippet,
+    }
+
+
+def _search_fts(db: Session, query: str, client_id: Optional[str], limit: int) -> List[dict]:
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    # Rank from the index alone; only the returned page of jobs is decompressed
+    client_filter = "AND jobs.client_id = :client_id" if client_id else ""
+    ranked = db.execute(text(f"""
+        SELECT jobs_fts.rowid, jobs_fts.rank FROM jobs_fts
+        JOIN job_contents ON job_contents.id = jobs_fts.rowid
+        JOIN jobs ON jobs.id = job_contents.job_id
+        WHERE jobs_fts MATCH :match {client_filter}
+        ORDER BY jobs_fts.rank
+        LIMIT :limit
+    """), {"match": match, "client_id": client_id, "limit": limit}).all()
+    if not ranked:
+        return []
+
+    rows = {
+        content.id: (job, content, client_name)
+        for job, content, client_name in (
+            db.query(Job, JobContent, Client.name)
+            .join(JobContent, JobContent.job_id == Job.id)
+            .outerjoin(Client, Client.id == Job.client_id)
+            .filter(JobContent.id.in_([rowid for rowid, _ in ranked]))
+        )
+    }
+    words = query_words(query)
+    results = []
+    for rowid, rank in ranked:
+        if rowid not in rows:
+            continue
+        job, content, client_name = rows[rowid]
+        job_text = read_job_text(content)
+        snippet = make_snippet((job.semantic_title, job_text.analysis_report, job_text.transcription), words)
+        results.append(_result(job, client_name, -rank, snippet))
+    return results
+
+
+def _search_substring(db: Session, query: str, client_id: Optional[str], limit: int) -> List[dict]:
+    """
+    Case- and accent-insensitive word search for databases without FTS5.
+
+    Content is compressed, so the database cannot filter it: jobs are
+    decompressed newest first until enough of them match. Slow on large
+    histories with few matches; use SQLite with FTS5 for those.
+    """
+    words = query_words(query)
+    if not words:
+        return []
+    patterns = [re.compile(r'\b' + re.escape(word) + r'\b') for word in words]
+
+    base = (
+        db.query(Job, JobContent, Client.name)
+        .join(JobContent, JobContent.job_id == Job.id)
+        .outerjoin(Client, Client.id == Job.client_id)
+    )
+    if client_id:
+        base = base.filter(Job.client_id == client_id)
+
+    results = []
+    offset = 0
+    while len(results) < limit:
+        batch = base.order_by(Job.created_at.desc(), Job.id.desc()).offset(offset).limit(FALLBACK_BATCH_SIZE).all()
+        if not batch:
+            break
+        offset += len(batch)
+        for job, content, client_name in batch:
+            job_text = read_job_text(content)
+            values = (job.semantic_title, job_text.analysis_report, job_text.transcription)
+            folded = fold(" ".join(value or "" for value in values))
+            if all(pattern.search(folded) for pattern in patterns):
+                results.append(_result(job, client_name, None, make_snippet(values, words)))
+                if len(results) == limit:
+                    break
+        db.expunge_all()
+    return results
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Stage:
+    name: str
+    # Receives the results of every stage finished so far, keyed by stage name
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    depends_on: Tuple[str, ...] = ()
+    # Persists the stage's result as soon as it is ready, before later stages finish
+    commit: Optional[Callable[[Any], Awaitable[None]]] = None
+
+
+class StageGraph:
+    """
+    Runs the processing stages of a job as a dependency graph: each stage
+    starts once the stages it depends on are done, so independent stages run
+    concurrently and the job takes as long as its longest chain.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        # Seconds spent in each stage, including its commit
+        self.durations: Dict[str, float] = {}
+
+    def add(self, name: str, run: Callable[[Dict[str, Any]], Awaitable[Any]], depends_on: Tuple[str, ...] = (), commit: Optional[Callable[[Any], Awaitable[None]]] = None) -> None:
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already defined")
+        self.stages[name] = Stage(name, run, tuple(depends_on), commit)
+
+    def order(self) -> List[Stage]:
+        """Return the stages with every stage after its dependencies; raises ValueError on unknown or cyclic dependencies."""
+        ordered: List[Stage] = []
+        state: Dict[str, str] = {}
+
+        def visit(stage: Stage) -> None:
+            if state.get(stage.name) == "done":
+                return
+            if state.get(stage.name) == "visiting":
+                raise ValueError(f"Stage '{stage.name}' depends on itself")
+            state[stage.name] = "visiting"
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+                visit(self.stages[dependency])
+            state[stage.name] = "done"
+            ordered.append(stage)
+
+        for stage in self.stages.values():
+            visit(stage)
+        return ordered
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every stage and return their results by name.
+
+        The first failing stage cancels the ones still running and its
+        exception is raised; results already committed stay committed.
+        """
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, "asyncio.Future"] = {}
+
+        async def execute(stage: Stage) -> None:
+            if stage.depends_on:
+                await asyncio.gather(*(tasks[name] for name in stage.depends_on))
+            start = time.perf_counter()
+            result = await stage.run(results)
+            if stage.commit is not None:
+                await stage.commit(result)
+            self.durations[stage.name] = round(time.perf_counter() - start, 3)
+            results[stage.name] = result
+
+        # Dependencies come first, so every task a stage waits on already exists
+        for stage in self.order():
+            tasks[stage.name] = asyncio.ensure_future(execute(stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return results
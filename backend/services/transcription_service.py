@@ -1,77 +1,139 @@
+import asyncio
 import sys
 import os
-import time
-from typing import List
+from typing import List, Optional
 
 # Add root directory to sys.path to import existing modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from audio_processor import (
-    extract_audio,
+    probe_media_async,
+    extract_audio_with_silences_async,
     get_file_size_mb,
-    get_audio_duration,
     calculate_chunk_duration,
-    split_audio
+    plan_chunks,
+    iter_audio_chunks_async,
+    get_encoding_profile
 )
-from whisper_client import transcribe_with_retry
+from whisper_client import ChunkCallback, transcribe_chunks_async, transcribe_chunk_stream_async
+from transcription_engines import TranscriptionEngine, get_transcription_engine
 from file_manager import create_temp_directory, cleanup_temp_files
+from transcript_merger import merge_transcriptions
 from models import AudioChunk, TranscriptionResult
-
-MAX_FILE_SIZE_MB = 24
+from checkpoint import ChunkCheckpoint, compute_segment_plan_key
+from metrics import STAGE_SECONDS
 
 class TranscriptionService:
-    def process_file(self, file_path: str, language: str = "it") -> str:
+    def __init__(self, engine: Optional[TranscriptionEngine] = None):
+        # Set by TRANSCRIPTION_ENGINE; it decides the chunk size and how many chunks run at once
+        self.engine = engine or get_transcription_engine()
+        # Statistics about the last processed file (chunk count, cache hits/misses)
+        self.stats: dict = {}
+        # Audio sent to the engine by the last processed file and the latency of each request
+        self.usage: dict = {"audio_seconds": 0.0, "calls": []}
+
+    def process_file(self, file_path: str, language: str = "it", max_concurrency: Optional[int] = None, checkpoint: Optional[ChunkCheckpoint] = None, on_chunk_complete: Optional[ChunkCallback] = None) -> str:
+        """
+        Synchronous entry point; runs process_file_async on a private event loop.
+        """
+        return asyncio.run(self.process_file_async(file_path, language, max_concurrency, checkpoint, on_chunk_complete))
+
+    async def process_file_async(self, file_path: str, language: str = "it", max_concurrency: Optional[int] = None, checkpoint: Optional[ChunkCheckpoint] = None, on_chunk_complete: Optional[ChunkCallback] = None) -> str:
         temp_dir = None
         try:
             temp_dir = create_temp_directory()
             
-            # Determine if it's video or audio
-            ext = os.path.splitext(file_path)[1].lower()
+            # One up-front probe provides the duration and streams for the whole plan
+            media = await probe_media_async(file_path)
+            duration = media.duration
             audio_file = file_path
+            silences = []
+            profile = get_encoding_profile()
+            
+            max_chunk_mb = self.engine.max_chunk_mb
             
-            if ext in ['.mp4', '.mpeg']:
-                audio_file = os.path.join(temp_dir, "extracted_audio.mp3")
-                extract_audio(file_path, audio_file)
+            # Video is always re-encoded; audio only when it would otherwise need chunking.
+            # This is the only decode pass: it writes the encoded audio and finds
+            # the pauses used to place chunk boundaries at the same time.
+            if media.has_video or media.size_mb > max_chunk_mb:
+                audio_file = os.path.join(temp_dir, "extracted_audio" + profile.extension)
+                with STAGE_SECONDS.labels(stage="extract").time():
+                    silences = await extract_audio_with_silences_async(file_path, audio_file, profile)
             
             # Check size and chunk if needed
             audio_size_mb = get_file_size_mb(audio_file)
             chunks: List[AudioChunk] = []
             
-            if audio_size_mb > MAX_FILE_SIZE_MB:
-                duration = get_audio_duration(audio_file)
-                chunk_duration = calculate_chunk_duration(audio_size_mb, duration, MAX_FILE_SIZE_MB)
-                chunk_paths = split_audio(audio_file, chunk_duration, temp_dir)
+            if audio_size_mb > max_chunk_mb:
+                # Cut in pauses where possible so words are not split between chunks;
+                # segments are stream-copied from the compact encoded file
+                chunk_duration = calculate_chunk_duration(audio_size_mb, duration, max_chunk_mb)
+                segments = plan_chunks(duration, chunk_duration, silences)
                 
-                for idx, chunk_path in enumerate(chunk_paths):
-                    chunks.append(AudioChunk(
-                        path=chunk_path,
-                        index=idx,
-                        duration=chunk_duration,
-                        size_mb=get_file_size_mb(chunk_path)
-                    ))
+                # Each chunk is transcribed as soon as it is cut, overlapping the remaining cuts
+                async def cut_chunks():
+                    # Chunks are handed off without waiting, so this is the cutting time
+                    with STAGE_SECONDS.labels(stage="split").time():
+                        async for chunk in iter_audio_chunks_async(audio_file, segments, temp_dir, max_chunk_mb):
+                            chunks.append(chunk)
+                            yield chunk
+                
+                results: List[TranscriptionResult] = await transcribe_chunk_stream_async(
+                    cut_chunks(),
+                    total=len(segments),
+                    plan_key=compute_segment_plan_key(audio_size_mb, segments),
+                    language=language,
+                    max_workers=max_concurrency,
+                    on_chunk_complete=on_chunk_complete,
+                    checkpoint=checkpoint,
+                    engine=self.engine
+                )
             else:
                 chunks.append(AudioChunk(
                     path=audio_file,
                     index=0,
-                    duration=0.0,
+                    duration=duration,
                     size_mb=audio_size_mb
                 ))
+                results = await transcribe_chunks_async(
+                    chunks,
+                    language=language,
+                    max_workers=max_concurrency,
+                    on_chunk_complete=on_chunk_complete,
+                    checkpoint=checkpoint,
+                    engine=self.engine
+                )
             
-            # Transcribe
-            results = []
-            for chunk in chunks:
-                text = transcribe_with_retry(chunk.path, language=language)
-                results.append(TranscriptionResult(
-                    chunk_index=chunk.index,
-                    text=text,
-                    processing_time=0
-                ))
-            
-            results.sort(key=lambda r: r.chunk_index)
-            combined_text = "\n".join(result.text for result in results)
+            # Join in order, removing words repeated where chunks overlap
+            combined_text = merge_transcriptions(chunks, results)
+            self.stats = {
+                "chunks": len(results),
+                "chunks_resumed": sum(1 for result in results if result.resumed),
+                "cache_hits": sum(1 for result in results if result.cached),
+                "cache_misses": sum(1 for result in results if not result.cached and not result.resumed),
+                "overlapping_seams": sum(1 for chunk in chunks if chunk.overlap > 0),
+            }
+            self.stats["encoding_profile"] = profile.name if audio_file != file_path else None
+            self.stats["audio_mb"] = round(audio_size_mb, 2)
+            self.stats["transcription_engine"] = self.engine.name
+
+            # Cached and resumed chunks were not sent (or billed) this time
+            durations = {chunk.index: chunk.duration for chunk in chunks}
+            calls = [
+                {
+                    "api": "whisper",
+                    "engine": self.engine.name,
+                    "model": self.engine.model,
+                    "seconds": round(result.processing_time, 3),
+                    "audio_seconds": round(durations.get(result.chunk_index, 0.0), 3),
+                }
+                for result in results if not result.cached and not result.resumed
+            ]
+            self.usage = {"audio_seconds": round(sum(call["audio_seconds"] for call in calls), 3), "calls": calls}
             
             return combined_text
             
         finally:
             if temp_dir:
-                cleanup_temp_files(temp_dir)
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, cleanup_temp_files, temp_dir)
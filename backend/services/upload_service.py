@@ -0,0 +1,347 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from metrics import STAGE_SECONDS
+
+UPLOAD_DIR = "uploads"
+# Bytes read and written per step while streaming an upload to disk
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+MAX_UPLOAD_MB = float(os.getenv('MAX_UPLOAD_MB', '4096'))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+# Room for the form fields and part headers next to the file in a multipart body
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+# Unfinished resumable uploads older than this are removed
+UPLOAD_EXPIRY_HOURS = float(os.getenv('UPLOAD_EXPIRY_HOURS', '24'))
+
+
+class UploadError(Exception):
+    """Raised when an upload is rejected; carries the HTTP status to return."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware rejecting multipart uploads over MAX_UPLOAD_MB while they stream in.
+
+    The form parser spools the whole body before the route runs, so the
+    limit is enforced here: a declared Content-Length over the limit is
+    rejected before anything is read, and the bytes actually received are
+    counted so a body without (or lying about) its length is cut off too:
+    the 413 is sent from here and the route sees the client as disconnected,
+    so it stops reading and its own response is dropped.
+    """
+
+    def __init__(self, app, paths: Tuple[str, ...], max_bytes: Optional[int] = None):
+        self.app = app
+        self.paths = paths
+        self.max_bytes = (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES) if max_bytes is None else max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds the {MAX_UPLOAD_MB:.0f} MB limit"
+        headers = dict(scope["headers"])
+        try:
+            declared = int(headers.get(b"content-length", b""))
+        except ValueError:
+            declared = None
+        if declared is not None and declared > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    if not response_started:
+                        await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                    rejected = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, tracked_send)
+
+
+def _safe_filename(filename: Optional[str]) -> str:
+    name = os.path.basename(filename or "upload")
+    return re.sub(r'[^\w.\- ]', '_', name) or "upload"
+
+
+def _append(file_obj, data: bytes) -> None:
+    file_obj.write(data)
+
+
+async def _write_stream(
+    stream: AsyncIterator[bytes],
+    path: str,
+    mode: str,
+    hasher,
+    start_size: int,
+    max_bytes: int,
+    limit_detail: str
+) -> int:
+    """
+    Write an async byte stream to disk without blocking the event loop,
+    hashing and enforcing the size limit as data arrives; going over it
+    raises a 413 UploadError with limit_detail.
+
+    Returns:
+        int: Total size of the file after writing
+    """
+    size = start_size
+    file_obj = await run_in_threadpool(open, path, mode)
+    try:
+        async for data in stream:
+            if not data:
+                continue
+            size += len(data)
+            if size > max_bytes:
+                raise UploadError(413, limit_detail)
+            hasher.update(data)
+            await run_in_threadpool(_append, file_obj, data)
+    finally:
+        await run_in_threadpool(file_obj.close)
+    return size
+
+
+async def _iter_upload_file(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        data = await upload.read(UPLOAD_BUFFER_SIZE)
+        if not data:
+            return
+        yield data
+
+
+async def save_upload_file(upload: UploadFile, job_id: str) -> Tuple[str, int, str]:
+    """
+    Stream a multipart upload to the uploads directory in fixed-size buffers.
+
+    Returns:
+        Tuple[str, int, str]: Stored path, size in bytes and SHA-256 of the content
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{_safe_filename(upload.filename)}")
+    hasher = hashlib.sha256()
+    try:
+        with STAGE_SECONDS.labels(stage="upload").time():
+            size = await _write_stream(
+                _iter_upload_file(upload), file_path, 'wb', hasher, 0, MAX_UPLOAD_BYTES,
+                f"Upload exceeds the {MAX_UPLOAD_MB:.0f} MB limit"
+            )
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return file_path, size, hasher.hexdigest()
+
+
+# --- Resumable uploads ---
+#
+# Modelled on the tus protocol: the client declares the total length, then
+# sends the file in PATCH requests carrying the offset they start at. After a
+# dropped connection it asks for the current offset and continues from there.
+# The partial file on disk is the source of truth for the offset.
+
+# Running hashes of uploads in progress in this process; rebuilt from disk if missing
+_hashers: Dict[str, "hashlib._Hash"] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _forget_upload(upload_id: str) -> None:
+    """Drop the in-process state of an upload that is complete or removed."""
+    _hashers.pop(upload_id, None)
+    _locks.pop(upload_id, None)
+
+
+def _meta_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.upload.json")
+
+
+def _part_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.part")
+
+
+def _read_meta(upload_id: str) -> dict:
+    if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+        raise UploadError(404, "Upload not found")
+    try:
+        with open(_meta_path(upload_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError(404, "Upload not found")
+
+
+def _write_meta(upload_id: str, meta: dict) -> None:
+    temp_path = _meta_path(upload_id) + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(temp_path, _meta_path(upload_id))
+
+
+def _current_offset(upload_id: str, meta: dict) -> int:
+    if meta.get("complete"):
+        return meta["length"]
+    try:
+        return os.path.getsize(_part_path(upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+def _hash_file_prefix(path: str) -> "hashlib._Hash":
+    hasher = hashlib.sha256()
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(UPLOAD_BUFFER_SIZE), b''):
+                hasher.update(block)
+    return hasher
+
+
+def _remove_expired_uploads() -> None:
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    cutoff = time.time() - UPLOAD_EXPIRY_HOURS * 3600
+    for name in os.listdir(UPLOAD_DIR):
+        if not name.endswith(".upload.json"):
+            continue
+        upload_id = name[:-len(".upload.json")]
+        try:
+            meta = _read_meta(upload_id)
+        except (UploadError, ValueError):
+            continue
+        if meta.get("complete") or meta.get("created_at", 0) >= cutoff:
+            continue
+        for path in (_part_path(upload_id), _meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        _forget_upload(upload_id)
+
+
+def create_upload(filename: str, length: int) -> dict:
+    """Register a resumable upload of `length` bytes and return its state."""
+    if length <= 0:
+        raise UploadError(400, "Upload length must be positive")
+    if length > MAX_UPLOAD_BYTES:
+        raise UploadError(413, f"Upload exceeds the {MAX_UPLOAD_MB:.0f} MB limit")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    _remove_expired_uploads()
+
+    upload_id = uuid.uuid4().hex
+    meta = {
+        "filename": _safe_filename(filename),
+        "length": length,
+        "created_at": time.time(),
+        "complete": False,
+    }
+    open(_part_path(upload_id), 'wb').close()
+    _write_meta(upload_id, meta)
+    _hashers[upload_id] = hashlib.sha256()
+    return get_upload(upload_id)
+
+
+def get_upload(upload_id: str) -> dict:
+    """Return the state of a resumable upload, including the offset to resume from."""
+    meta = _read_meta(upload_id)
+    return {
+        "upload_id": upload_id,
+        "filename": meta["filename"],
+        "length": meta["length"],
+        "offset": _current_offset(upload_id, meta),
+        "complete": meta.get("complete", False),
+        "sha256": meta.get("sha256"),
+    }
+
+
+async def append_upload(upload_id: str, offset: int, stream: AsyncIterator[bytes]) -> dict:
+    """
+    Append a request body to a resumable upload, starting at `offset`.
+
+    The offset must match what the server already has; otherwise the client
+    is told to fetch the current offset and resend from there.
+    """
+    # Only uploads that exist get a lock, so unknown ids do not accumulate
+    _read_meta(upload_id)
+    lock = _locks.setdefault(upload_id, asyncio.Lock())
+    async with lock:
+        meta = _read_meta(upload_id)
+        if meta.get("complete"):
+            raise UploadError(409, "Upload is already complete")
+        current = _current_offset(upload_id, meta)
+        if offset != current:
+            raise UploadError(409, f"Offset mismatch: upload is at {current}")
+
+        hasher = _hashers.get(upload_id)
+        if hasher is None:
+            # Resumed in a new process: rebuild the running hash from what is on disk
+            hasher = await run_in_threadpool(_hash_file_prefix, _part_path(upload_id))
+            _hashers[upload_id] = hasher
+
+        try:
+            with STAGE_SECONDS.labels(stage="upload_slice").time():
+                size = await _write_stream(
+                    stream, _part_path(upload_id), 'ab', hasher, current, meta["length"],
+                    "Upload exceeds its declared length"
+                )
+        except BaseException:
+            # Over the declared length or connection dropped mid-request: keep what
+            # was written for the next attempt and rebuild the hash from it
+            _hashers.pop(upload_id, None)
+            raise
+
+        if size == meta["length"]:
+            meta["complete"] = True
+            meta["sha256"] = hasher.hexdigest()
+            _write_meta(upload_id, meta)
+
+    if meta.get("complete"):
+        _forget_upload(upload_id)
+    return get_upload(upload_id)
+
+
+def claim_completed_upload(upload_id: str, job_id: str) -> Tuple[str, str, int, str]:
+    """
+    Move a completed resumable upload into place for a job.
+
+    Returns:
+        Tuple[str, str, int, str]: Stored path, original filename, size in bytes and SHA-256
+    """
+    meta = _read_meta(upload_id)
+    if not meta.get("complete"):
+        raise UploadError(409, "Upload is not complete yet")
+    file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{meta['filename']}")
+    os.replace(_part_path(upload_id), file_path)
+    os.remove(_meta_path(upload_id))
+    _forget_upload(upload_id)
+    return file_path, meta["filename"], meta["length"], meta["sha256"]
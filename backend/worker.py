@@ -0,0 +1,261 @@
+"""
+Transcription Worker
+
+Pulls queued jobs from the database and processes them under a lease.
+
+Runs embedded in the API process by default; dedicated worker processes can be
+started next to the API with:
+
+    python -m backend.worker --processes 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import uuid
+from typing import Dict, Optional
+
+# Add root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database import SessionLocal, db_writer, Job, JobStatus, init_db
+from backend.services.job_processor import process_transcription
+from backend.services.content_store import archive_old_content
+from backend.services.event_service import EventType, publish_event, prune_events
+from backend.services.job_queue import (
+    LEASE_SECONDS,
+    claim_next_job,
+    heartbeat,
+    release_job,
+    requeue_expired_jobs
+)
+from metrics import start_metrics_server
+
+# Jobs processed at the same time by one worker process
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '2'))
+# Seconds between queue polls when nothing wakes the worker up
+POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '2'))
+
+
+class Worker:
+    def __init__(self, worker_id: Optional[str] = None, concurrency: int = WORKER_CONCURRENCY, poll_interval: float = POLL_INTERVAL):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._wake_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+    def wake(self) -> None:
+        """
+        Ask the worker to poll the queue now instead of at the next interval.
+        Safe to call from any thread.
+        """
+        if self._loop and self._wake_event:
+            self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        print(f"Worker {self.worker_id} started (concurrency {self.concurrency})")
+
+        loop_time = self._loop.time
+        next_sweep = 0.0
+        try:
+            while not self._stopping:
+                # Re-queue jobs orphaned by crashed or restarted workers
+                if loop_time() >= next_sweep:
+                    await self._loop.run_in_executor(None, self._requeue_expired)
+                    next_sweep = loop_time() + LEASE_SECONDS / 2
+
+                while len(self._tasks) < self.concurrency:
+                    job = await self._loop.run_in_executor(None, self._claim)
+                    if job is None:
+                        break
+                    self._tasks[job.id] = asyncio.ensure_future(self._run_job(job))
+
+                self._wake_event.clear()
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._stopping = True
+            await self._cancel_running_jobs()
+
+    def stop(self) -> None:
+        self._stopping = True
+        self.wake()
+
+    def _requeue_expired(self) -> None:
+        db = SessionLocal()
+        try:
+            count = requeue_expired_jobs(db)
+            if count:
+                print(f"Worker {self.worker_id} re-queued {count} orphaned job(s)")
+        finally:
+            db.close()
+        prune_events()
+        archived = archive_old_content()
+        if archived:
+            print(f"Worker {self.worker_id} archived the content of {archived} job(s)")
+
+    def _claim(self) -> Optional[Job]:
+        db = SessionLocal()
+        try:
+            while True:
+                job = claim_next_job(db, self.worker_id)
+                if job is None:
+                    return None
+                if job.file_path and os.path.exists(job.file_path):
+                    db.expunge(job)
+                    return job
+                job.status = JobStatus.FAILED
+                job.error = "Uploaded file is no longer available"
+                job.lease_owner = None
+                job.lease_expires_at = None
+                db.commit()
+                publish_event(job.id, EventType.STATUS, {"status": job.status, "error": job.error})
+        finally:
+            db.close()
+
+    async def _run_job(self, job: Job) -> None:
+        processing = asyncio.ensure_future(process_transcription(
+            job.id, job.file_path, job.language, job.model, job.custom_prompt, job.concurrency,
+            use_cache=job.use_cache is not False
+        ))
+        keepalive = asyncio.ensure_future(self._keep_lease(job.id, processing))
+        try:
+            await processing
+        except asyncio.CancelledError:
+            # Shutdown, or the lease was lost to another worker
+            pass
+        except Exception as e:
+            print(f"Worker {self.worker_id} failed job {job.id}: {e}")
+        finally:
+            keepalive.cancel()
+            # On shutdown hand the job back right away instead of waiting for the lease to expire
+            await self._loop.run_in_executor(None, self._release, job.id, self._stopping)
+            self._tasks.pop(job.id, None)
+            self.wake()
+
+    def _release(self, job_id: str, requeue: bool) -> None:
+        db = SessionLocal()
+        try:
+            release_job(db, job_id, self.worker_id, requeue=requeue)
+        finally:
+            db.close()
+
+    async def _keep_lease(self, job_id: str, processing: asyncio.Task) -> None:
+        while not processing.done():
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            owned = await asyncio.wrap_future(
+                db_writer.submit(lambda db: heartbeat(db, job_id, self.worker_id))
+            )
+            if not owned:
+                print(f"Worker {self.worker_id} lost the lease on job {job_id}, stopping it")
+                processing.cancel()
+                return
+
+    async def _cancel_running_jobs(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Worker running inside the API process, if enabled
+_embedded_worker: Optional[Worker] = None
+
+
+def start_embedded_worker() -> Optional[asyncio.Task]:
+    """
+    Start a worker on the running event loop unless EMBEDDED_WORKER=0,
+    which is the setting to use when dedicated worker processes are running.
+    """
+    global _embedded_worker
+    if os.getenv('EMBEDDED_WORKER', '1') == '0':
+        return None
+    _embedded_worker = Worker()
+    return asyncio.ensure_future(_embedded_worker.run())
+
+
+async def stop_embedded_worker(task: Optional[asyncio.Task]) -> None:
+    global _embedded_worker
+    if _embedded_worker is None or task is None:
+        return
+    _embedded_worker.stop()
+    await asyncio.gather(task, return_exceptions=True)
+    _embedded_worker = None
+
+
+def notify_new_job() -> None:
+    """Wake the embedded worker after a job has been queued."""
+    if _embedded_worker is not None:
+        _embedded_worker.wake()
+
+
+def _run_worker_process(concurrency: int, metrics_port: Optional[int] = None) -> None:
+    init_db()
+    if metrics_port:
+        start_metrics_server(metrics_port)
+        print(f"Serving metrics on port {metrics_port}")
+    worker = Worker(concurrency=concurrency)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Run dedicated transcription worker processes')
+    parser.add_argument(
+        '-p', '--processes',
+        type=int,
+        default=1,
+        help='Number of worker processes to start (default: 1)'
+    )
+    parser.add_argument(
+        '-c', '--concurrency',
+        type=int,
+        default=WORKER_CONCURRENCY,
+        help=f'Jobs processed at the same time by each process (default: {WORKER_CONCURRENCY})'
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Serve Prometheus metrics from this port; process N of --processes uses port + N'
+    )
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run_worker_process(args.concurrency, args.metrics_port)
+        return
+
+    # The processes share the account's API budgets unless told otherwise
+    os.environ.setdefault('RATE_LIMIT_PROCESSES', str(args.processes))
+    processes = [
+        multiprocessing.Process(
+            target=_run_worker_process,
+            args=(args.concurrency, args.metrics_port + index if args.metrics_port else None)
+        )
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
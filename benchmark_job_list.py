@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Benchmark Job List Queries
+
+Fills a scratch SQLite database with synthetic jobs and measures the history
+list and queue lookups without the job indexes and with the client loaded
+lazily (the previous query layer), then with the indexes and the eager
+client join used by the API.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, text, tuple_
+from sqlalchemy.orm import sessionmaker, defer
+
+from backend.database import Base, Client, Job, JobContent, JobStatus
+from backend.services.content_store import CONTENT_CODEC, compress
+from backend.services.job_listing import list_jobs_page
+
+
+PAGE_SIZE = 50  # Same default page size as GET /api/jobs
+JOB_INDEXES = ("ix_jobs_created_at_id", "ix_jobs_client_created_at", "ix_jobs_status_created_at")
+
+
+def populate(engine, job_count: int, client_count: int, transcript_kb: float) -> list:
+    """
+    Insert clients and jobs spread over the last two years.
+
+    Args:
+        engine: Engine of the scratch database
+        job_count: Number of jobs to create
+        client_count: Number of clients the jobs are spread over
+        transcript_kb: Size of each completed job's transcript
+
+    Returns:
+        list: The client ids
+    """
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    client_ids = [str(uuid.uuid4()) for _ in range(client_count)]
+    transcript = "x" * int(transcript_kb * 1024)
+    raw = ('{"transcription": "%s", "analysis_report": "report"}' % transcript).encode()
+    blob = compress(raw)
+    with engine.begin() as conn:
+        conn.execute(Client.__table__.insert(), [
+            {"id": client_id, "name": f"Client {i}", "created_at": now} for i, client_id in enumerate(client_ids)
+        ])
+        batch = []
+        contents = []
+        for i in range(job_count):
+            # A handful of jobs are waiting, the rest are history
+            status = JobStatus.QUEUED if i % 5000 == 0 else JobStatus.COMPLETED
+            job_id = str(uuid.uuid4())
+            batch.append({
+                "id": job_id,
+                "filename": f"meeting_{i}.mp4",
+                "status": status,
+                "created_at": now - timedelta(seconds=rng.randint(0, 2 * 365 * 86400)),
+                "client_id": rng.choice(client_ids),
+                "job_metadata": {"chunks": 3},
+                "version": i + 1,
+            })
+            if status == JobStatus.COMPLETED:
+                contents.append({
+                    "job_id": job_id,
+                    "codec": CONTENT_CODEC,
+                    "data": blob,
+                    "raw_bytes": len(raw),
+                    "stored_bytes": len(blob),
+                })
+            if len(batch) == 5000:
+                conn.execute(Job.__table__.insert(), batch)
+                conn.execute(JobContent.__table__.insert(), contents)
+                batch, contents = [], []
+        if batch:
+            conn.execute(Job.__table__.insert(), batch)
+        if contents:
+            conn.execute(JobContent.__table__.insert(), contents)
+    return client_ids
+
+
+def previous_list_query(db, client_id=None, after=None, limit=PAGE_SIZE):
+    """The history query before the eager client join; client names load one by one."""
+    query = db.query(Job).options(
+        defer(Job.analysis_todo),
+        defer(Job.custom_prompt)
+    )
+    if client_id:
+        query = query.filter(Job.client_id == client_id)
+    if after:
+        query = query.filter(tuple_(Job.created_at, Job.id) < tuple_(*after))
+    jobs = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit + 1).all()
+    return jobs[:limit], None
+
+
+def run_scenarios(engine, list_page, client_id: str, deep_cursor, repeat: int) -> dict:
+    """
+    Time each scenario and count the SQL statements it issues.
+
+    Returns:
+        dict: Scenario name -> (median milliseconds, statements per run)
+    """
+    Session = sessionmaker(bind=engine)
+    statements = []
+    listener = lambda *args: statements.append(1)
+    event.listen(engine, "before_cursor_execute", listener)
+
+    def first_page(db):
+        jobs, _ = list_page(db)
+        return [job.client.name if job.client else None for job in jobs]
+
+    def client_page(db):
+        jobs, _ = list_page(db, client_id=client_id)
+        return [job.client.name if job.client else None for job in jobs]
+
+    def deep_page(db):
+        jobs, _ = list_page(db, after=deep_cursor)
+        return [job.client.name if job.client else None for job in jobs]
+
+    def queued_lookup(db):
+        # The candidate query a worker runs on every claim
+        return (
+            db.query(Job.id)
+            .filter(Job.status == JobStatus.QUEUED)
+            .order_by(Job.created_at)
+            .limit(5)
+            .all()
+        )
+
+    results = {}
+    try:
+        for name, scenario in (
+            ("First page", first_page),
+            ("First page, one client", client_page),
+            ("Page 200", deep_page),
+            ("Queued job lookup", queued_lookup),
+        ):
+            timings = []
+            for _ in range(repeat):
+                db = Session()
+                statements.clear()
+                start = time.perf_counter()
+                scenario(db)
+                timings.append((time.perf_counter() - start) * 1000)
+                db.close()
+            results[name] = (statistics.median(timings), len(statements))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return results
+
+
+def benchmark_job_list(job_count: int, client_count: int, transcript_kb: float, repeat: int) -> tuple:
+    """
+    Build the scratch database and measure both query layers on it.
+
+    Returns:
+        tuple: (before, after) scenario results from run_scenarios
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(temp_dir, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for name in JOB_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+        print(f"Creating {job_count} jobs for {client_count} clients...")
+        client_ids = populate(engine, job_count, client_count, transcript_kb)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+            deep_cursor = conn.execute(text(
+                "SELECT created_at, id FROM jobs ORDER BY created_at DESC, id DESC "
+                f"LIMIT 1 OFFSET {PAGE_SIZE * 199 - 1}"
+            )).one()
+        deep_cursor = (datetime.fromisoformat(deep_cursor[0]), deep_cursor[1])
+
+        before = run_scenarios(engine, previous_list_query, client_ids[0], deep_cursor, repeat)
+
+        # Same migration path as init_db() on an existing transcribe.db
+        for index in Job.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+        after = run_scenarios(engine, list_jobs_page, client_ids[0], deep_cursor, repeat)
+        engine.dispose()
+    return before, after
+
+
+def print_report(job_count: int, before: dict, after: dict) -> None:
+    """
+    Print median latency and statement counts before and after.
+
+    Args:
+        job_count: Number of jobs in the database
+        before: Results without the indexes and eager loading
+        after: Results with them
+    """
+    print(f"\nJobs: {job_count}, page size: {PAGE_SIZE}\n")
+    print(f"{'Scenario':<24} {'Before (ms)':>11} {'Queries':>7} {'After (ms)':>10} {'Queries':>7} {'Speedup':>8}")
+    for name, (before_ms, before_queries) in before.items():
+        after_ms, after_queries = after[name]
+        speedup = before_ms / after_ms if after_ms else 0.0
+        print(f"{name:<24} {before_ms:>11.2f} {before_queries:>7} {after_ms:>10.2f} "
+              f"{after_queries:>7} {speedup:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure job list latency with and without the job indexes and eager client loading'
+    )
+    parser.add_argument('--jobs', type=int, default=100000, help='Number of synthetic jobs (default: 100000)')
+    parser.add_argument('--clients', type=int, default=50, help='Number of clients (default: 50)')
+    parser.add_argument('--transcript-kb', type=float, default=1.0, help='Transcript size per job (default: 1)')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per scenario (default: 20)')
+    args = parser.parse_args()
+
+    before, after = benchmark_job_list(args.jobs, args.clients, args.transcript_kb, args.repeat)
+    print_report(args.jobs, before, after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Benchmark Pipeline Stages
+
+Generates synthetic speech-like media with ffmpeg and measures each stage of
+the pipeline offline, against a local fake OpenAI server: audio extraction
+with pause detection, chunk cutting, TranscriptionService.process_file and
+the full process_transcription job path. Results are written as JSON so runs on
+different versions can be compared to catch regressions.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fake_openai_server import start_fake_openai_server
+
+
+STAGES = ('extract_audio_with_silences', 'cut_chunks', 'process_file', 'process_transcription')
+
+
+def generate_media(
+    output_path: str,
+    seconds: float,
+    video: bool = True,
+    speech_seconds: float = 4.0,
+    pause_seconds: float = 1.0,
+    noise: float = 0.05
+) -> str:
+    """
+    Generate speech-like audio (or a video with it) of the given length.
+
+    The audio is a pitch-gliding tone with a syllable-rate envelope and some
+    noise, in bursts of speech_seconds separated by pause_seconds of silence,
+    so silence detection finds pauses to cut chunks at like in real meetings.
+
+    Args:
+        output_path: Where to write the file (.mp4 for video, e.g. .wav for audio)
+        seconds: Length of the media
+        video: Add a low-resolution test pattern video track
+        speech_seconds: Length of each burst of "speech"
+        pause_seconds: Length of the silence between bursts
+        noise: Amplitude of the noise mixed into the speech (0-1)
+
+    Returns:
+        str: output_path
+
+    Raises:
+        RuntimeError: If FFmpeg is not installed or fails
+    """
+    cycle = speech_seconds + pause_seconds
+    expression = (
+        f"(0.4*sin(2*PI*(160+60*sin(2*PI*0.7*t))*t)*(0.6+0.4*sin(2*PI*4*t))"
+        f"+{noise}*(2*random(0)-1))*lt(mod(t,{cycle}),{speech_seconds})"
+    )
+    cmd = ['ffmpeg', '-y', '-f', 'lavfi', '-i', f"aevalsrc='{expression}':s=44100:d={seconds}"]
+    if video:
+        cmd += [
+            '-f', 'lavfi', '-i', f'testsrc2=size=320x240:rate=10:duration={seconds}',
+            '-map', '1:v', '-map', '0:a',
+            '-c:v', 'mpeg4', '-q:v', '10', '-c:a', 'aac', '-b:a', '128k', '-shortest'
+        ]
+    cmd.append(output_path)
+    try:
+        subprocess.run(cmd, capture_output=True, text=True, check=True)
+    except FileNotFoundError:
+        raise RuntimeError("FFmpeg is not installed. Please install FFmpeg to run the benchmark.")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to generate media: {e.stderr}")
+    return output_path
+
+
+def configure_environment(base_url: str, work_dir: str, engine: str, chunk_mb: float) -> None:
+    """
+    Point the pipeline at the fake server and at scratch storage.
+
+    Must run before the pipeline modules are imported: they read their
+    settings at import time. Values already set in the environment win, so
+    e.g. a rate limit can still be benchmarked.
+    """
+    os.environ['OPENAI_BASE_URL'] = base_url
+    os.environ['OPENAI_API_KEY'] = 'benchmark'
+    os.environ['TRANSCRIPTION_ENGINE'] = engine
+    os.environ.setdefault('TRANSCRIPTION_BASE_URL', base_url)
+    if chunk_mb:
+        # Short synthetic inputs only get chunked below the real request limit
+        os.environ['TRANSCRIPTION_MAX_CHUNK_MB'] = str(chunk_mb)
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(work_dir, 'benchmark.db'))
+    # Every run sends its requests instead of reading the previous run's results
+    os.environ.setdefault('WHISPER_CACHE_ENABLED', '0')
+    os.environ.setdefault('ANALYSIS_CACHE_ENABLED', '0')
+    # Measure the pipeline, not the production request budget
+    os.environ.setdefault('WHISPER_REQUESTS_PER_MINUTE', '0')
+    os.environ.setdefault('CHAT_REQUESTS_PER_MINUTE', '0')
+
+
+def summarize(samples: List[float], media_seconds: float) -> dict:
+    """
+    Latency statistics of one stage and its throughput in media seconds per second.
+
+    Args:
+        samples: Wall-clock seconds of each run
+        media_seconds: Length of the media processed by one run
+
+    Returns:
+        dict: runs, min/median/mean/p95/max seconds and realtime_factor
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+    median = ordered[count // 2] if count % 2 else (ordered[count // 2 - 1] + ordered[count // 2]) / 2
+    return {
+        'runs': count,
+        'seconds': {
+            'min': round(ordered[0], 4),
+            'median': round(median, 4),
+            'mean': round(sum(ordered) / count, 4),
+            'p95': round(ordered[min(count - 1, int(round(0.95 * (count - 1))))], 4),
+            'max': round(ordered[-1], 4),
+        },
+        # How many seconds of media one second of processing gets through
+        'realtime_factor': round(media_seconds / median, 2) if median else None,
+    }
+
+
+def _call_latencies(calls: List[dict]) -> Dict[str, dict]:
+    """Per-API latency summary of the calls recorded in usage['calls']."""
+    by_api: Dict[str, List[float]] = {}
+    for call in calls:
+        by_api.setdefault(call['api'], []).append(call['seconds'])
+    return {api: {'calls': len(values), **summarize(values, 0)['seconds']} for api, values in by_api.items()}
+
+
+def _server_delta(server, before: Dict[str, int]) -> Dict[str, int]:
+    after = server.stats
+    return {name: after[name] - before.get(name, 0) for name in after}
+
+
+def benchmark_extract(input_file: str, media_seconds: float, repeat: int, profile_name: Optional[str]) -> dict:
+    """
+    Time extract_audio_with_silences on the input file, the single decode
+    pass that encodes the audio and finds the pauses.
+
+    Returns:
+        dict: Latency summary plus the encoded size and the pauses found
+    """
+    from audio_processor import extract_audio_with_silences, get_encoding_profile, get_file_size_mb
+    from file_manager import create_temp_directory, cleanup_temp_files
+
+    profile = get_encoding_profile(profile_name)
+    samples = []
+    size_mb = 0.0
+    silences = []
+    for _ in range(repeat):
+        temp_dir = create_temp_directory()
+        try:
+            output_path = os.path.join(temp_dir, 'extracted' + profile.extension)
+            start = time.perf_counter()
+            silences = extract_audio_with_silences(input_file, output_path, profile)
+            samples.append(time.perf_counter() - start)
+            size_mb = get_file_size_mb(output_path)
+        finally:
+            cleanup_temp_files(temp_dir)
+    return {
+        **summarize(samples, media_seconds),
+        'profile': profile.name,
+        'output_mb': round(size_mb, 3),
+        'silences': len(silences),
+    }
+
+
+def benchmark_cut_chunks(input_file: str, media_seconds: float, repeat: int, profile_name: Optional[str]) -> dict:
+    """
+    Time planning the chunks at pauses and cutting them with iter_audio_chunks,
+    as process_file does for audio above the engine's request size limit.
+
+    Returns:
+        dict: Latency summary plus the planned chunk length and chunk count
+    """
+    from audio_processor import (
+        calculate_chunk_duration,
+        extract_audio_with_silences,
+        get_encoding_profile,
+        get_file_size_mb,
+        iter_audio_chunks,
+        plan_chunks
+    )
+    from file_manager import create_temp_directory, cleanup_temp_files
+    from transcription_engines import get_transcription_engine
+
+    profile = get_encoding_profile(profile_name)
+    max_chunk_mb = get_transcription_engine().max_chunk_mb
+    source_dir = create_temp_directory()
+    samples = []
+    chunks = 0
+    try:
+        # Cut what the pipeline cuts: the encoded audio, at the pauses found while encoding it
+        audio_path = os.path.join(source_dir, 'extracted' + profile.extension)
+        silences = extract_audio_with_silences(input_file, audio_path, profile)
+        chunk_duration = calculate_chunk_duration(get_file_size_mb(audio_path), media_seconds, max_chunk_mb)
+        for _ in range(repeat):
+            temp_dir = create_temp_directory()
+            try:
+                start = time.perf_counter()
+                segments = plan_chunks(media_seconds, chunk_duration, silences)
+                chunks = sum(1 for _ in iter_audio_chunks(audio_path, segments, temp_dir, max_chunk_mb))
+                samples.append(time.perf_counter() - start)
+            finally:
+                cleanup_temp_files(temp_dir)
+    finally:
+        cleanup_temp_files(source_dir)
+    return {**summarize(samples, media_seconds), 'chunk_seconds': round(chunk_duration, 3), 'chunks': chunks}
+
+
+def benchmark_process_file(input_file: str, media_seconds: float, repeat: int, concurrency: Optional[int], server) -> dict:
+    """
+    Time TranscriptionService.process_file against the fake server.
+
+    Returns:
+        dict: Latency summary, the service stats of the last run, Whisper
+            request latencies and the requests the server answered
+    """
+    from backend.services.transcription_service import TranscriptionService
+
+    samples = []
+    calls: List[dict] = []
+    stats: dict = {}
+    before = server.stats
+    for _ in range(repeat):
+        service = TranscriptionService()
+        start = time.perf_counter()
+        service.process_file(input_file, max_concurrency=concurrency)
+        samples.append(time.perf_counter() - start)
+        calls.extend(service.usage['calls'])
+        stats = service.stats
+    return {
+        **summarize(samples, media_seconds),
+        'stats': stats,
+        'api_latency': _call_latencies(calls),
+        'server_requests': _server_delta(server, before),
+    }
+
+
+def benchmark_job(input_file: str, media_seconds: float, repeat: int, concurrency: Optional[int], server) -> dict:
+    """
+    Time the full process_transcription job path, database writes included,
+    on a scratch database.
+
+    Returns:
+        dict: Latency summary, mean seconds per job stage, API latencies and
+            the requests the server answered
+    """
+    from backend.database import Job, JobStatus, SessionLocal, init_db
+    from backend.services.job_processor import process_transcription
+    from file_manager import create_temp_directory, cleanup_temp_files
+
+    init_db()
+    upload_dir = create_temp_directory()
+    samples = []
+    calls: List[dict] = []
+    stage_seconds: Dict[str, List[float]] = {}
+    before = server.stats
+    try:
+        for _ in range(repeat):
+            # The job deletes its upload when it completes
+            job_id = str(uuid.uuid4())
+            file_path = os.path.join(upload_dir, job_id + os.path.splitext(input_file)[1])
+            shutil.copyfile(input_file, file_path)
+            db = SessionLocal()
+            try:
+                db.add(Job(
+                    id=job_id, filename=os.path.basename(input_file), status=JobStatus.QUEUED,
+                    language='it', model='gpt-4o', concurrency=concurrency, use_cache=False, file_path=file_path
+                ))
+                db.commit()
+            finally:
+                db.close()
+
+            start = time.perf_counter()
+            asyncio.run(process_transcription(job_id, file_path, 'it', 'gpt-4o', None, concurrency, use_cache=False))
+            samples.append(time.perf_counter() - start)
+
+            db = SessionLocal()
+            try:
+                job = db.query(Job).filter(Job.id == job_id).first()
+                if job.status != JobStatus.COMPLETED:
+                    raise RuntimeError(f"Benchmark job failed: {job.error}")
+                calls.extend(job.api_calls or [])
+                for stage, seconds in ((job.job_metadata or {}).get('stage_seconds') or {}).items():
+                    stage_seconds.setdefault(stage, []).append(seconds)
+            finally:
+                db.close()
+    finally:
+        cleanup_temp_files(upload_dir)
+    return {
+        **summarize(samples, media_seconds),
+        'stage_seconds': {stage: round(sum(values) / len(values), 4) for stage, values in stage_seconds.items()},
+        'api_latency': _call_latencies(calls),
+        'server_requests': _server_delta(server, before),
+    }
+
+
+def _version_info() -> dict:
+    """Code and tool versions the results were measured with."""
+    def first_line(cmd: List[str]) -> Optional[str]:
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            return result.stdout.splitlines()[0].strip() if result.stdout else None
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'git_commit': first_line(['git', 'rev-parse', 'HEAD']),
+        'git_describe': first_line(['git', 'describe', '--always', '--dirty']),
+        'ffmpeg': first_line(['ffmpeg', '-version']),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def run_benchmarks(args) -> dict:
+    """
+    Generate the input (unless one is given), start the fake server and run
+    the selected stages.
+
+    Returns:
+        dict: The JSON report
+    """
+    work_dir = tempfile.mkdtemp(prefix='benchmark_pipeline_')
+    server = start_fake_openai_server(
+        whisper_latency=args.whisper_latency,
+        whisper_seconds_per_mb=args.whisper_seconds_per_mb,
+        chat_latency=args.chat_latency,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    try:
+        configure_environment(server.base_url, work_dir, args.engine, args.chunk_mb)
+        from audio_processor import get_audio_duration, get_file_size_mb
+        from transcription_engines import get_transcription_engine
+
+        engine = get_transcription_engine()
+
+        if args.input:
+            input_file = args.input
+        else:
+            extension = '.mp4' if args.media == 'video' else '.wav'
+            input_file = generate_media(
+                os.path.join(work_dir, 'synthetic' + extension), args.seconds, video=args.media == 'video',
+                speech_seconds=args.speech_seconds, pause_seconds=args.pause_seconds, noise=args.noise
+            )
+        media_seconds = get_audio_duration(input_file)
+
+        stages = {}
+        for stage in args.stages:
+            print(f"Benchmarking {stage}...", file=sys.stderr)
+            if stage == 'extract_audio_with_silences':
+                stages[stage] = benchmark_extract(input_file, media_seconds, args.repeat, args.profile)
+            elif stage == 'cut_chunks':
+                stages[stage] = benchmark_cut_chunks(input_file, media_seconds, args.repeat, args.profile)
+            elif stage == 'process_file':
+                stages[stage] = benchmark_process_file(input_file, media_seconds, args.repeat, args.concurrency, server)
+            elif stage == 'process_transcription':
+                stages[stage] = benchmark_job(input_file, media_seconds, args.repeat, args.concurrency, server)
+
+        return {
+            'benchmark': 'pipeline',
+            'created_at': datetime.utcnow().isoformat() + 'Z',
+            'version': _version_info(),
+            'input': {
+                'file': os.path.basename(input_file) if args.input else None,
+                'synthetic': not args.input,
+                'media': args.media if not args.input else None,
+                'seconds': round(media_seconds, 3),
+                'size_mb': round(get_file_size_mb(input_file), 3),
+            },
+            'config': {
+                'repeat': args.repeat,
+                'concurrency': args.concurrency,
+                'profile': args.profile,
+                'engine': engine.name,
+                'model': engine.model,
+                'chunk_mb': engine.max_chunk_mb,
+                'whisper_latency': args.whisper_latency,
+                'whisper_seconds_per_mb': args.whisper_seconds_per_mb,
+                'chat_latency': args.chat_latency,
+                'throttle_rate': args.throttle_rate,
+                'retry_after': args.retry_after,
+            },
+            'stages': stages,
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_report(report: dict) -> None:
+    """
+    Print the per-stage latencies and throughput as a table.
+
+    Args:
+        report: Report from run_benchmarks
+    """
+    media = report['input']
+    print(f"\nInput: {media['seconds']:.0f}s, {media['size_mb']:.1f} MB\n")
+    print(f"{'Stage':<28} {'Runs':>4} {'Median (s)':>10} {'p95 (s)':>8} {'x realtime':>10}")
+    for stage, result in report['stages'].items():
+        seconds = result['seconds']
+        factor = result['realtime_factor']
+        print(f"{stage:<28} {result['runs']:>4} {seconds['median']:>10.2f} {seconds['p95']:>8.2f} "
+              f"{factor if factor is not None else '-':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure pipeline stage latency and throughput offline on synthetic media and a fake OpenAI API'
+    )
+    parser.add_argument('--input', help='Benchmark this file instead of generated media')
+    parser.add_argument('--media', choices=('video', 'audio'), default='video', help='Generated media type (default: video)')
+    parser.add_argument('--seconds', type=float, default=600, help='Generated media length (default: 600)')
+    parser.add_argument('--speech-seconds', type=float, default=4.0, help='Length of each speech burst (default: 4)')
+    parser.add_argument('--pause-seconds', type=float, default=1.0, help='Silence between speech bursts (default: 1)')
+    parser.add_argument('--noise', type=float, default=0.05, help='Noise amplitude in the speech, 0-1 (default: 0.05)')
+    parser.add_argument('--stages', type=lambda value: [stage.strip() for stage in value.split(',') if stage.strip()],
+                        default=list(STAGES), help=f"Comma-separated stages to run (default: {','.join(STAGES)})")
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage (default: 3)')
+    parser.add_argument('--profile', help='Audio encoding profile (default: AUDIO_ENCODING_PROFILE)')
+    parser.add_argument('--engine', choices=('openai', 'openai_compatible', 'local'), default='openai',
+                        help='Transcription engine; the HTTP engines are served by the fake server (default: openai)')
+    parser.add_argument('--chunk-mb', type=float, default=1.0,
+                        help="Engine request size limit, low so short inputs are chunked; 0 keeps the engine's (default: 1)")
+    parser.add_argument('--concurrency', type=int, default=None, help="Chunks transcribed in parallel (default: the engine's limit)")
+    parser.add_argument('--whisper-latency', type=float, default=0.5, help='Fake seconds per transcription request (default: 0.5)')
+    parser.add_argument('--whisper-seconds-per-mb', type=float, default=0.2, help='Fake extra seconds per MB uploaded (default: 0.2)')
+    parser.add_argument('--chat-latency', type=float, default=0.3, help='Fake seconds per chat completion (default: 0.3)')
+    parser.add_argument('--throttle-rate', type=float, default=0.05, help='Fraction of requests answered with 429 (default: 0.05)')
+    parser.add_argument('--retry-after', type=float, default=0.2, help='Retry-After seconds sent with a 429 (default: 0.2)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the 429 injection (default: 42)')
+    parser.add_argument('--output', help='Write the JSON report to this file and print a table instead')
+    args = parser.parse_args()
+
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(unknown)}. Available: {', '.join(STAGES)}")
+    if args.input and not os.path.exists(args.input):
+        parser.error(f"File not found: {args.input}")
+
+    try:
+        # Progress and retry messages of the pipeline must not end up in the JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            report = run_benchmarks(args)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print_report(report)
+        print(f"\nReport written to {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark Encoding Profiles
+
+Encodes an input file with every audio encoding profile and reports the
+encoding time, output size and how many transcription requests the result
+needs with the configured engine's chunk size.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+from audio_processor import (
+    ENCODING_PROFILES,
+    extract_audio,
+    get_audio_duration,
+    get_file_size_mb
+)
+from file_manager import create_temp_directory, cleanup_temp_files
+from transcription_engines import get_transcription_engine
+
+
+MEETING_HOURS = 2.0  # Reference meeting length for the projection column
+
+
+def benchmark_profiles(input_file: str) -> list:
+    """
+    Encode the input with each profile and measure the result.
+
+    Args:
+        input_file: Path to the input video or audio file
+
+    Returns:
+        list: One dict per profile with encode time, size and request counts
+    """
+    duration = get_audio_duration(input_file)
+    max_chunk_mb = get_transcription_engine().max_chunk_mb
+    temp_dir = create_temp_directory()
+    rows = []
+    try:
+        for profile in ENCODING_PROFILES.values():
+            output_path = os.path.join(temp_dir, profile.name + profile.extension)
+            start = time.time()
+            extract_audio(input_file, output_path, profile)
+            elapsed = time.time() - start
+
+            size_mb = get_file_size_mb(output_path)
+            mb_per_hour = size_mb / duration * 3600 if duration else 0.0
+            rows.append({
+                'profile': profile.name,
+                'encode_seconds': elapsed,
+                'size_mb': size_mb,
+                'mb_per_hour': mb_per_hour,
+                'requests': max(1, math.ceil(size_mb / max_chunk_mb)),
+                'meeting_requests': max(1, math.ceil(mb_per_hour * MEETING_HOURS / max_chunk_mb)),
+            })
+    finally:
+        cleanup_temp_files(temp_dir)
+    return rows
+
+
+def print_report(input_file: str, rows: list) -> None:
+    """
+    Print the benchmark results as a table, relative to the mp3_hq profile.
+
+    Args:
+        input_file: Path to the benchmarked file
+        rows: Results from benchmark_profiles
+    """
+    baseline = next((row for row in rows if row['profile'] == 'mp3_hq'), rows[0])
+    print(f"\nInput: {input_file} ({get_file_size_mb(input_file):.1f} MB)\n")
+    print(f"{'Profile':<12} {'Encode (s)':>10} {'Size (MB)':>10} {'MB/hour':>8} "
+          f"{'Size vs hq':>10} {'Requests':>8} {f'{MEETING_HOURS:g}h meeting':>11}")
+    for row in rows:
+        ratio = row['size_mb'] / baseline['size_mb'] if baseline['size_mb'] else 0.0
+        print(f"{row['profile']:<12} {row['encode_seconds']:>10.1f} {row['size_mb']:>10.2f} "
+              f"{row['mb_per_hour']:>8.1f} {ratio:>10.0%} {row['requests']:>8} "
+              f"{row['meeting_requests']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare audio encoding profiles by encode time, size and request count'
+    )
+    parser.add_argument('input_file', help='Path to a video or audio file to encode')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_file):
+        print(f"Error: File '{args.input_file}' does not exist.")
+        sys.exit(1)
+
+    try:
+        rows = benchmark_profiles(args.input_file)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+    print_report(args.input_file, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Checkpoint Module
+
+Persists per-chunk transcription results as they finish, so a failed or
+interrupted run can resume and only re-send the chunks that are missing.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from dataclasses import asdict
+from typing import Dict, List, Sequence
+
+from models import AudioChunk, TranscriptionResult
+from result_cache import make_cache_key
+
+
+def compute_plan_key(chunks: List[AudioChunk]) -> str:
+    """
+    Identify a chunk plan so results are only reused for the same split.
+
+    Args:
+        chunks: Chunks the audio was split into
+
+    Returns:
+        str: Key derived from each chunk's index, duration and size
+    """
+    return make_cache_key(*(
+        f"{chunk.index}:{chunk.duration:.3f}:{chunk.size_mb:.6f}" for chunk in chunks
+    ))
+
+
+def compute_segment_plan_key(audio_size_mb: float, segments: Sequence) -> str:
+    """
+    Identify a chunk plan before its chunks have been cut.
+    
+    Args:
+        audio_size_mb: Size of the audio the segments are cut from
+        segments: Planned segments (objects with start, end and overlap)
+        
+    Returns:
+        str: Key derived from the audio size and each segment's span
+    """
+    return make_cache_key(f"{audio_size_mb:.6f}", *(
+        f"{index}:{segment.start:.3f}:{segment.end:.3f}:{segment.overlap:.3f}"
+        for index, segment in enumerate(segments)
+    ))
+
+
+class ChunkCheckpoint:
+    """
+    Storage for completed chunk results. The base class stores nothing.
+    """
+
+    def load(self, plan_key: str) -> Dict[int, TranscriptionResult]:
+        """
+        Return results saved for this chunk plan, keyed by chunk index.
+
+        Args:
+            plan_key: Key of the current chunk plan (see compute_plan_key)
+
+        Returns:
+            Dict[int, TranscriptionResult]: Previously completed chunks
+        """
+        return {}
+
+    def save(self, plan_key: str, chunk: AudioChunk, result: TranscriptionResult) -> None:
+        """
+        Persist the result of one completed chunk.
+
+        Args:
+            plan_key: Key of the current chunk plan
+            chunk: The chunk that was transcribed
+            result: Its transcription result
+        """
+
+    def clear(self) -> None:
+        """Remove all saved results once the run has completed."""
+
+    # Coroutine versions for code running on an event loop. They run the
+    # blocking methods in the default executor; subclasses with a
+    # non-blocking store can override them.
+
+    async def load_async(self, plan_key: str) -> Dict[int, TranscriptionResult]:
+        """load() without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.load, plan_key)
+
+    async def save_async(self, plan_key: str, chunk: AudioChunk, result: TranscriptionResult) -> None:
+        """save() without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.save, plan_key, chunk, result)
+
+    async def clear_async(self) -> None:
+        """clear() without blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.clear)
+
+
+class FileCheckpoint(ChunkCheckpoint):
+    """
+    Checkpoint stored as a JSON file, used by the command-line script.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: JSON file holding the checkpoint
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._plan_key = None
+        self._entries: Dict[str, dict] = {}
+
+    def load(self, plan_key: str) -> Dict[int, TranscriptionResult]:
+        with self._lock:
+            self._plan_key = plan_key
+            self._entries = {}
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return {}
+            if data.get('plan_key') != plan_key:
+                # Different input or chunking; the saved results don't apply
+                return {}
+            self._entries = data.get('chunks', {})
+            return {
+                int(index): TranscriptionResult(**entry['result'])
+                for index, entry in self._entries.items()
+            }
+
+    def save(self, plan_key: str, chunk: AudioChunk, result: TranscriptionResult) -> None:
+        with self._lock:
+            if plan_key != self._plan_key:
+                self._plan_key = plan_key
+                self._entries = {}
+            self._entries[str(chunk.index)] = {
+                'chunk': asdict(chunk),
+                'result': asdict(result),
+            }
+            # Write to a temporary file first so a crash never leaves a truncated checkpoint
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'plan_key': plan_key, 'chunks': self._entries}, f)
+            os.replace(temp_path, self.path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
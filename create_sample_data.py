@@ -6,6 +6,7 @@ import uuid
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.database import SessionLocal, Client, Job
+from backend.services.content_store import set_job_text
 
 def create_sample_data():
     db = SessionLocal()
@@ -158,11 +159,11 @@ def create_sample_data():
                 status=job_data["status"],
                 language="en",
                 model="gpt-4o",
-                transcription=job_data.get("transcription"),
-                analysis_report=job_data.get("analysis_report"),
                 analysis_todo=job_data.get("analysis_todo")
             )
             db.add(job)
+            if job_data.get("transcription"):
+                set_job_text(db, job, transcription=job_data["transcription"], analysis_report=job_data.get("analysis_report"))
         
         db.commit()
         print(f"Created {len(jobs_data)} jobs")
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI Server Module
+
+A local stand-in for the OpenAI API endpoints used by the pipeline (Whisper
+transcriptions and chat completions) with configurable latency and injected
+429 responses. Point the clients at it with OPENAI_BASE_URL to run the
+pipeline and its benchmarks offline, without an API key or API costs.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+# Sentence repeated to build transcripts, more of it for larger uploads
+TRANSCRIPT_SENTENCE = "Synthetic benchmark speech about the quarterly plan and the next steps."
+TITLE = "Synthetic Benchmark Meeting"
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    HTTP server answering /v1/audio/transcriptions and /v1/chat/completions.
+
+    Attributes:
+        whisper_latency: Seconds added to every transcription request
+        whisper_seconds_per_mb: Extra seconds per MB of uploaded audio
+        chat_latency: Seconds added to every chat completion
+        throttle_rate: Fraction of requests (0-1) answered with a 429
+        retry_after: Retry-After seconds sent with the 429 responses
+        stats: Requests answered per endpoint, and how many were throttled
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple,
+        whisper_latency: float = 0.5,
+        whisper_seconds_per_mb: float = 0.2,
+        chat_latency: float = 0.3,
+        throttle_rate: float = 0.0,
+        retry_after: float = 0.2,
+        seed: Optional[int] = None
+    ):
+        super().__init__(address, _FakeOpenAIHandler)
+        self.whisper_latency = whisper_latency
+        self.whisper_seconds_per_mb = whisper_seconds_per_mb
+        self.chat_latency = chat_latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"transcriptions": 0, "chat_completions": 0, "throttled": 0}
+
+    @property
+    def base_url(self) -> str:
+        """URL to use as OPENAI_BASE_URL."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def should_throttle(self) -> bool:
+        """Draw whether the next request is answered with a 429, and count it."""
+        with self._lock:
+            throttled = self._random.random() < self.throttle_rate
+            if throttled:
+                self._stats["throttled"] += 1
+            return throttled
+
+    def count(self, endpoint: str) -> None:
+        with self._lock:
+            self._stats[endpoint] += 1
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server: FakeOpenAIServer
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path.endswith('/audio/transcriptions'):
+            self._transcription(body)
+        elif path.endswith('/chat/completions'):
+            self._chat_completion(body)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "invalid_request_error"}})
+
+    def _throttled(self) -> bool:
+        if not self.server.should_throttle():
+            return False
+        self._send_json(
+            429,
+            {"error": {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}},
+            {"Retry-After": f"{self.server.retry_after:g}"}
+        )
+        return True
+
+    def _transcription(self, body: bytes) -> None:
+        if self._throttled():
+            return
+        # The multipart body is dominated by the audio, close enough for the latency model
+        size_mb = len(body) / (1024 * 1024)
+        time.sleep(self.server.whisper_latency + size_mb * self.server.whisper_seconds_per_mb)
+        # Transcript length grows with the upload so merging has real work to do
+        sentences = max(1, int(size_mb * 20))
+        self.server.count("transcriptions")
+        self._send_json(200, {"text": " ".join([TRANSCRIPT_SENTENCE] * sentences)})
+
+    def _chat_completion(self, body: bytes) -> None:
+        if self._throttled():
+            return
+        try:
+            request = json.loads(body or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+        time.sleep(self.server.chat_latency)
+
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            # Covers the full, section and reduce prompts of the analysis
+            content = json.dumps({
+                "report": "## Summary\nSynthetic benchmark report.",
+                "summary": "Synthetic benchmark section.",
+                "todo_list": ["Review the benchmark results", "Compare with the previous version"],
+            })
+        else:
+            content = TITLE
+        prompt_chars = sum(len(str(message.get("content") or "")) for message in request.get("messages") or [])
+        prompt_tokens = prompt_chars // 4
+        completion_tokens = len(content) // 4
+
+        self.server.count("chat_completions")
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model") or "gpt-4o",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_openai_server(port: int = 0, host: str = '127.0.0.1', **options) -> FakeOpenAIServer:
+    """
+    Start a fake OpenAI server on a daemon thread.
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        host: Interface to bind
+        **options: FakeOpenAIServer settings (latencies, throttle_rate, retry_after, seed)
+
+    Returns:
+        FakeOpenAIServer: The running server; use server.base_url as OPENAI_BASE_URL
+    """
+    server = FakeOpenAIServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name='fake-openai', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve a fake OpenAI API (Whisper and chat completions) for offline runs'
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8089, help='Port to listen on (default: 8089)')
+    parser.add_argument('--whisper-latency', type=float, default=0.5, help='Seconds per transcription request (default: 0.5)')
+    parser.add_argument('--whisper-seconds-per-mb', type=float, default=0.2, help='Extra seconds per MB uploaded (default: 0.2)')
+    parser.add_argument('--chat-latency', type=float, default=0.3, help='Seconds per chat completion (default: 0.3)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with 429 (default: 0)')
+    parser.add_argument('--retry-after', type=float, default=0.2, help='Retry-After seconds sent with a 429 (default: 0.2)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for the 429 injection')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        (args.host, args.port),
+        whisper_latency=args.whisper_latency,
+        whisper_seconds_per_mb=args.whisper_seconds_per_mb,
+        chat_latency=args.chat_latency,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    print(f"Fake OpenAI API at {server.base_url} (set OPENAI_BASE_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
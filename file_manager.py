@@ -56,6 +56,22 @@ def generate_output_filename(input_path: str) -> str:
     return str(output_path)
 
 
+def generate_checkpoint_filename(input_path: str) -> str:
+    """
+    Generate the checkpoint filename for an input file.
+    
+    The checkpoint sits next to the output transcription and records the
+    chunks completed so far, so an interrupted run can be resumed.
+    
+    Args:
+        input_path: Path to the input MP4 file
+        
+    Returns:
+        str: Path to the checkpoint JSON file
+    """
+    return generate_output_filename(input_path) + ".checkpoint.json"
+
+
 def save_transcription(text: str, output_path: str) -> None:
     """
     Save the final transcription text to a file.
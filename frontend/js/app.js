@@ -14,6 +14,7 @@ const uploadClientSelect = document.getElementById('upload-client');
 const clientFilterSelect = document.getElementById('client-filter');
 const jobsList = document.getElementById('jobs-list');
 const clearHistoryBtn = document.getElementById('clear-history-btn');
+const jobSearchInput = document.getElementById('job-search');
 const settingsToggle = document.getElementById('settings-toggle');
 const toastContainer = document.getElementById('toast-container');
 
@@ -33,6 +34,10 @@ const deleteJobBtn = document.getElementById('delete-job-btn');
 // State
 let selectedFile = null;
 let jobs = [];
+let jobsClientId = null;
+let nextJobsCursor = null;
+let searchQuery = '';
+let searchTimer = null;
 let clients = [];
 let currentJobId = null;
 let isEditMode = false;
@@ -42,8 +47,10 @@ init();
 
 function init() {
     fetchClients();
+    // Subscribe before loading the list so no update falls in between
+    if (window.EventSource) startEventStream();
+    else startPolling();
     fetchJobs();
-    startPolling();
     setupEventListeners();
 }
 
@@ -94,6 +101,10 @@ function setupEventListeners() {
 
     // History
     clearHistoryBtn.addEventListener('click', clearHistory);
+    jobSearchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(searchJobs, 300);
+    });
 
     // Modal actions
     editBtn.addEventListener('click', toggleEditMode);
@@ -187,11 +198,72 @@ function handleFileSelect(file) {
     addActivity(`File selected: ${file.name}`, 'info');
 }
 
+// Resumable uploads are sent in slices; a failed slice is retried from the server's offset
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
+function uploadStorageKey(file) {
+    return `upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function fetchUploadOffset(uploadId) {
+    const response = await fetch(`${API_URL}/uploads/${uploadId}`, { method: 'HEAD' });
+    if (!response.ok) return null;
+    return parseInt(response.headers.get('Upload-Offset'), 10);
+}
+
+async function uploadResumable(file) {
+    const storageKey = uploadStorageKey(file);
+    let uploadId = localStorage.getItem(storageKey);
+    let offset = uploadId ? await fetchUploadOffset(uploadId) : null;
+
+    if (offset === null) {
+        const response = await fetch(`${API_URL}/uploads`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, length: file.size })
+        });
+        if (!response.ok) throw new Error('Upload failed');
+        uploadId = (await response.json()).upload_id;
+        localStorage.setItem(storageKey, uploadId);
+        offset = 0;
+    } else if (offset > 0) {
+        addActivity(`Resuming upload at ${Math.round(offset / file.size * 100)}%`, 'processing');
+    }
+
+    let retries = 0;
+    while (offset < file.size) {
+        try {
+            const response = await fetch(`${API_URL}/uploads/${uploadId}`, {
+                method: 'PATCH',
+                headers: {
+                    'Content-Type': 'application/offset+octet-stream',
+                    'Upload-Offset': String(offset)
+                },
+                body: file.slice(offset, offset + UPLOAD_CHUNK_SIZE)
+            });
+            if (response.status === 409) {
+                offset = await fetchUploadOffset(uploadId);
+                continue;
+            }
+            if (!response.ok) throw new Error('Upload failed');
+            offset = parseInt(response.headers.get('Upload-Offset'), 10);
+            retries = 0;
+            setUploadProgress(offset / file.size);
+        } catch (e) {
+            if (++retries > UPLOAD_MAX_RETRIES) throw e;
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** retries));
+            const serverOffset = await fetchUploadOffset(uploadId).catch(() => null);
+            if (serverOffset !== null) offset = serverOffset;
+        }
+    }
+    return uploadId;
+}
+
 async function uploadFile() {
     if (!selectedFile) return;
 
     const formData = new FormData();
-    formData.append('file', selectedFile);
     formData.append('language', languageSelect.value);
     formData.append('model', modelSelect.value);
     if (customPromptInput.value.trim()) formData.append('custom_prompt', customPromptInput.value.trim());
@@ -201,8 +273,10 @@ async function uploadFile() {
     addActivity('Uploading file...', 'processing');
 
     try {
+        formData.append('upload_id', await uploadResumable(selectedFile));
         const response = await fetch(`${API_URL}/transcribe`, { method: 'POST', body: formData });
         if (!response.ok) throw new Error('Upload failed');
+        localStorage.removeItem(uploadStorageKey(selectedFile));
 
         const job = await response.json();
         jobs.unshift(job);
@@ -226,6 +300,10 @@ function setUploadLoading(isLoading) {
     else uploadBtn.querySelector('.loader').classList.add('hidden');
 }
 
+function setUploadProgress(fraction) {
+    uploadBtn.querySelector('span').textContent = `Uploading... ${Math.round(fraction * 100)}%`;
+}
+
 function resetUploadForm() {
     selectedFile = null;
     fileInfo.textContent = '';
@@ -285,20 +363,35 @@ function renderClientSelects() {
 
 // --- Jobs & History ---
 
-async function fetchJobs(clientId = null) {
-    let url = `${API_URL}/jobs`;
-    if (clientId) url += `?client_id=${clientId}`;
+// The history is loaded a page at a time and holds summaries only;
+// a job's transcript and report are fetched when it is opened
+async function fetchJobs(clientId = null, loadMore = false) {
+    if (!loadMore) {
+        jobsClientId = clientId;
+        nextJobsCursor = null;
+    }
+    const params = new URLSearchParams();
+    if (jobsClientId) params.set('client_id', jobsClientId);
+    if (loadMore && nextJobsCursor) params.set('cursor', nextJobsCursor);
 
     try {
-        const response = await fetch(url);
+        const response = await fetch(`${API_URL}/jobs?${params}`);
         if (response.ok) {
-            jobs = await response.json();
+            const page = await response.json();
+            if (loadMore) {
+                const known = new Set(jobs.map(j => j.job_id));
+                jobs = jobs.concat(page.jobs.filter(j => !known.has(j.job_id)));
+            } else {
+                jobs = page.jobs;
+            }
+            nextJobsCursor = page.next_cursor;
             renderJobs();
         }
     } catch (e) { console.error(e); }
 }
 
 function renderJobs() {
+    if (searchQuery) return; // Search results are shown instead
     jobsList.innerHTML = '';
     if (jobs.length === 0) {
         jobsList.innerHTML = '<div class="empty-state-small">No jobs</div>';
@@ -330,12 +423,67 @@ function renderJobs() {
                 <h4>${displayTitle}</h4>
                 <div class="job-meta-sidebar">
                     <span>${job.client_name || 'No Client'}</span>
+                    <span>${progressLabel(job)}</span>
                     <span class="status-dot ${statusClass}" title="${job.status}"></span>
                 </div>
             `;
             jobsList.appendChild(item);
         });
     });
+
+    if (nextJobsCursor) {
+        const loadMoreBtn = document.createElement('button');
+        loadMoreBtn.className = 'text-btn-small load-more-btn';
+        loadMoreBtn.textContent = 'Load more';
+        loadMoreBtn.onclick = () => fetchJobs(jobsClientId, true);
+        jobsList.appendChild(loadMoreBtn);
+    }
+}
+
+// Full-text search runs on the server, so it covers jobs not loaded in the list
+async function searchJobs() {
+    searchQuery = jobSearchInput.value.trim();
+    if (!searchQuery) {
+        renderJobs();
+        return;
+    }
+
+    const params = new URLSearchParams({ q: searchQuery });
+    if (jobsClientId) params.set('client_id', jobsClientId);
+    try {
+        const response = await fetch(`${API_URL}/search?${params}`);
+        if (!response.ok) return;
+        const results = await response.json();
+        if (jobSearchInput.value.trim() !== searchQuery) return; // A newer search is on its way
+        renderSearchResults(results);
+    } catch (e) { console.error(e); }
+}
+
+function renderSearchResults(results) {
+    jobsList.innerHTML = '';
+    if (results.length === 0) {
+        jobsList.innerHTML = '<div class="empty-state-small">No matches</div>';
+        return;
+    }
+
+    results.forEach(result => {
+        const item = document.createElement('div');
+        item.className = 'job-item-sidebar';
+        item.onclick = () => viewResult(result.job_id);
+
+        const displayTitle = result.semantic_title || result.filename.replace(/\.(mp3|mp4|mpeg)$/i, '');
+        // The snippet is escaped by the server, only <mark> tags are HTML
+        item.innerHTML = `
+            <h4>${displayTitle}</h4>
+            <p class="search-snippet">${result.snippet || ''}</p>
+            <div class="job-meta-sidebar">
+                <span>${result.client_name || 'No Client'}</span>
+                <span>${new Date(result.created_at).toLocaleDateString()}</span>
+                <span class="status-dot ${result.status}" title="${result.status}"></span>
+            </div>
+        `;
+        jobsList.appendChild(item);
+    });
 }
 
 async function clearHistory() {
@@ -343,6 +491,7 @@ async function clearHistory() {
     try {
         await fetch(`${API_URL}/jobs`, { method: 'DELETE' });
         jobs = [];
+        nextJobsCursor = null;
         renderJobs();
         showToast('History cleared', 'success');
     } catch (e) { showToast('Error clearing history', 'error'); }
@@ -369,16 +518,43 @@ async function deleteCurrentJob() {
 
 // --- Results & To-Do ---
 
-window.viewResult = (jobId) => {
+window.viewResult = async (jobId) => {
     currentJobId = jobId;
-    const job = jobs.find(j => j.job_id === jobId);
-    if (!job) return;
+    let job = jobs.find(j => j.job_id === jobId);
+    if (!job) {
+        // A search result from a page that is not loaded yet
+        job = await fetchJob(jobId);
+        if (!job) return;
+        const idx = jobs.findIndex(j => j.created_at < job.created_at);
+        jobs.splice(idx === -1 ? jobs.length : idx, 0, job);
+    }
+
+    if (job.status === 'failed') {
+        retryJob(job);
+        return;
+    }
 
     if (job.status !== 'completed') {
         showToast(`Job is ${job.status}`, 'info');
         return;
     }
 
+    if (!job.result) {
+        // The list only holds summaries: load the full job on first open
+        try {
+            const fullJob = await fetchJob(jobId);
+            if (!fullJob || !fullJob.result) return;
+            const idx = jobs.findIndex(j => j.job_id === jobId);
+            if (idx !== -1) jobs[idx] = fullJob;
+            job = fullJob;
+        } catch (e) {
+            console.error(e);
+            showToast('Error loading transcription', 'error');
+            return;
+        }
+        if (currentJobId !== jobId) return;
+    }
+
     const { transcription, analysis } = job.result;
 
     // Update modal title
@@ -398,6 +574,28 @@ window.viewResult = (jobId) => {
     resultModal.classList.remove('hidden');
 };
 
+async function retryJob(job) {
+    const title = job.semantic_title || job.filename;
+    if (!confirm(`Job failed: ${job.error || 'unknown error'}\n\nRetry "${title}"? Chunks that already completed will not be sent again.`)) return;
+
+    try {
+        const response = await fetch(`${API_URL}/jobs/${job.job_id}/retry`, { method: 'POST' });
+        if (response.ok) {
+            const updatedJob = await response.json();
+            const idx = jobs.findIndex(j => j.job_id === job.job_id);
+            if (idx !== -1) jobs[idx] = updatedJob;
+            renderJobs();
+            addActivity(`Retrying: ${title}`, 'processing');
+        } else {
+            const error = await response.json();
+            showToast(error.detail || 'Failed to retry job', 'error');
+        }
+    } catch (e) {
+        console.error(e);
+        showToast('Error retrying job', 'error');
+    }
+}
+
 function renderTodoList(todoList) {
     const todoContainer = document.getElementById('todo-content');
     todoContainer.innerHTML = '';
@@ -589,39 +787,126 @@ window.toggleTodo = async (jobId, index, isDone) => {
     }
 };
 
-// --- Polling ---
+// --- Live Updates ---
+
+// Server-Sent Events: one connection for all jobs; the browser reconnects on its own
+// and sends Last-Event-ID, so no update is lost while it is away
+function startEventStream() {
+    const source = new EventSource(`${API_URL}/events`);
+    source.addEventListener('job.status', e => handleStatusEvent(JSON.parse(e.data)));
+    source.addEventListener('job.progress', e => handleProgressEvent(JSON.parse(e.data)));
+    source.addEventListener('job.deleted', e => handleDeletedEvent(JSON.parse(e.data)));
+}
+
+async function fetchJob(jobId) {
+    const response = await fetch(`${API_URL}/status/${jobId}`);
+    return response.ok ? response.json() : null;
+}
+
+// Summary of a job without its transcript and report
+async function fetchJobSummary(jobId) {
+    const response = await fetch(`${API_URL}/status?ids=${encodeURIComponent(jobId)}`);
+    if (!response.ok) return null;
+    const batch = await response.json();
+    return batch.jobs.length ? batch.jobs[0] : null;
+}
 
+async function handleStatusEvent(event) {
+    const idx = jobs.findIndex(j => j.job_id === event.job_id);
+    const job = idx !== -1 ? jobs[idx] : null;
+    if (job && job.status === event.status && event.status !== 'completed') return;
+
+    if (!job) {
+        // New job from another tab
+        try {
+            const newJob = await fetchJob(event.job_id);
+            if (!newJob) return;
+            if (!jobs.some(j => j.job_id === event.job_id)) jobs.unshift(newJob);
+        } catch (e) {
+            console.error('Error loading job', e);
+            return;
+        }
+    } else if (event.status === 'completed' || event.status === 'failed') {
+        // Final state: refresh the title and error; the transcript is loaded when opened
+        try {
+            const summary = await fetchJobSummary(event.job_id);
+            if (!summary) return;
+            Object.assign(job, {
+                status: summary.status,
+                semantic_title: summary.semantic_title,
+                error: summary.error,
+                progress: null
+            });
+            delete job.result;
+        } catch (e) {
+            console.error('Error loading job', e);
+            return;
+        }
+    } else {
+        job.status = event.status;
+        job.progress = null;
+    }
+    renderJobs();
+
+    const updatedJob = jobs.find(j => j.job_id === event.job_id);
+    const title = updatedJob ? (updatedJob.semantic_title || updatedJob.filename) : event.job_id;
+    if (event.status === 'completed') {
+        addActivity(`Job completed: ${title}`, 'success');
+        showToast(`Job ${title} completed`, 'success');
+    } else if (event.status === 'failed') {
+        addActivity(`Job failed: ${title}`, 'error');
+    } else if (event.status === 'processing') {
+        addActivity(`Processing: ${title}`, 'processing');
+    }
+}
+
+function handleProgressEvent(event) {
+    const job = jobs.find(j => j.job_id === event.job_id);
+    if (!job) return;
+    job.progress = event;
+    renderJobs();
+
+    const title = job.semantic_title || job.filename;
+    if (event.stage === 'transcribing') {
+        addActivity(`${title}: transcribed chunk ${event.completed}/${event.total}`, 'processing');
+    } else if (event.stage === 'analyzing') {
+        addActivity(`${title}: analyzing transcript`, 'processing');
+    }
+}
+
+function handleDeletedEvent(event) {
+    jobs = event.job_id === '*' ? [] : jobs.filter(j => j.job_id !== event.job_id);
+    renderJobs();
+}
+
+function progressLabel(job) {
+    if (job.status !== 'processing' || !job.progress) return '';
+    if (job.progress.stage === 'transcribing') return `${job.progress.completed}/${job.progress.total}`;
+    if (job.progress.stage === 'analyzing') return 'analyzing';
+    return '';
+}
+
+// Fallback for browsers without EventSource: one batch request per poll for
+// all active jobs, returning only the ones that changed since the last poll
 function startPolling() {
+    let cursor = null;
     setInterval(async () => {
         const activeJobs = jobs.filter(j => j.status === 'queued' || j.status === 'processing');
         if (activeJobs.length === 0) return;
 
-        for (const job of activeJobs) {
-            try {
-                const response = await fetch(`${API_URL}/status/${job.job_id}`);
-                if (response.ok) {
-                    const updatedJob = await response.json();
-                    if (updatedJob.status !== job.status || updatedJob.status === 'completed') {
-                        const idx = jobs.findIndex(j => j.job_id === job.job_id);
-                        if (idx !== -1) {
-                            jobs[idx] = updatedJob;
-                            renderJobs();
-                            if (updatedJob.status === 'completed') {
-                                const title = updatedJob.semantic_title || updatedJob.filename;
-                                addActivity(`Job completed: ${title}`, 'success');
-                                showToast(`Job ${title} completed`, 'success');
-                            } else if (updatedJob.status === 'error') {
-                                const title = updatedJob.semantic_title || updatedJob.filename;
-                                addActivity(`Job failed: ${title}`, 'error');
-                            } else if (updatedJob.status === 'processing') {
-                                const title = updatedJob.semantic_title || updatedJob.filename;
-                                addActivity(`Processing: ${title}`, 'processing');
-                            }
-                        }
-                    }
-                }
-            } catch (e) { console.error('Polling error', e); }
-        }
+        const ids = activeJobs.map(j => j.job_id).join(',');
+        let url = `${API_URL}/status?ids=${encodeURIComponent(ids)}`;
+        if (cursor !== null) url += `&since=${cursor}`;
+        try {
+            const response = await fetch(url);
+            if (!response.ok) return;
+            const batch = await response.json();
+            cursor = batch.cursor;
+            batch.missing.forEach(jobId => handleDeletedEvent({ job_id: jobId }));
+            for (const job of batch.jobs) {
+                await handleStatusEvent({ job_id: job.job_id, status: job.status });
+            }
+        } catch (e) { console.error('Polling error', e); }
     }, 3000);
 }
 
@@ -0,0 +1,108 @@
+"""
+Metrics Module
+
+Prometheus counters and histograms of the transcription pipeline, built on
+prometheus_client. Values live in the process that records them; set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the API and the
+dedicated workers and /metrics reports all of them together.
+"""
+
+import os
+from typing import List
+
+from dotenv import load_dotenv
+
+# Load environment variables; before importing prometheus_client, which
+# reads PROMETHEUS_MULTIPROC_DIR at import time
+load_dotenv()
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.registry import Collector  # noqa: E402
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Bucket upper bounds in seconds
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+# Collectors computed at scrape time, e.g. from the database
+_collectors: List[Collector] = []
+
+
+def register_collector(collector: Collector) -> None:
+    """
+    Add a collector whose samples are computed when /metrics is scraped.
+
+    Args:
+        collector: Object with a collect() method yielding metric families
+    """
+    _collectors.append(collector)
+    if not PROMETHEUS_MULTIPROC_DIR:
+        REGISTRY.register(collector)
+
+
+def render_metrics() -> bytes:
+    """
+    Render the metrics in the Prometheus text format.
+
+    With PROMETHEUS_MULTIPROC_DIR set, the values recorded by every process
+    sharing the directory are merged; otherwise those of this process.
+
+    Returns:
+        bytes: The exposition text, served with CONTENT_TYPE
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in _collectors:
+        registry.register(collector)
+    return generate_latest(registry)
+
+
+def start_metrics_server(port: int, host: str = '0.0.0.0') -> None:
+    """
+    Serve this process's metrics over HTTP from a daemon thread, for
+    dedicated workers scraped one by one.
+
+    Args:
+        port: Port to listen on
+        host: Interface to bind (default: all)
+    """
+    start_http_server(port, addr=host)
+
+
+# --- Metrics of the transcription pipeline ---
+
+JOBS_FINISHED = Counter('transcribe_jobs_finished_total', 'Jobs finished by this process', ('status',))
+STAGE_SECONDS = Histogram(
+    'transcribe_stage_seconds',
+    'Duration of pipeline stages (upload, upload_slice, extract, split, whisper_chunk, transcribe, analysis, title)',
+    ('stage',),
+    buckets=STAGE_BUCKETS
+)
+FFMPEG_SECONDS = Histogram(
+    'transcribe_ffmpeg_seconds', 'Duration of ffmpeg and ffprobe subprocesses', ('operation',), buckets=STAGE_BUCKETS
+)
+API_REQUESTS = Counter(
+    'transcribe_api_requests_total', 'OpenAI API attempts by outcome (ok, throttled, error)', ('api', 'outcome')
+)
+API_RETRIES = Counter('transcribe_api_retries_total', 'OpenAI API requests retried after a failure', ('api',))
+WHISPER_UPLOAD_BYTES = Counter('transcribe_whisper_upload_bytes_total', 'Audio bytes uploaded to Whisper, retries included')
+CACHE_REQUESTS = Counter(
+    'transcribe_cache_requests_total', 'Result cache lookups (hit, miss, shared, bypass)', ('cache', 'result')
+)
+DB_QUERY_SECONDS = Histogram(
+    'transcribe_db_query_seconds', 'Database statement latency by kind', ('operation',), buckets=QUERY_BUCKETS
+)
@@ -15,6 +15,8 @@ class AudioChunk:
     index: int
     duration: float
     size_mb: float
+    start: float = 0.0  # Offset in the source audio, in seconds
+    overlap: float = 0.0  # Seconds at the start repeated from the previous chunk
 
 
 @dataclass
@@ -23,6 +25,8 @@ class TranscriptionResult:
     chunk_index: int
     text: str
     processing_time: float
+    cached: bool = False  # Served from the local cache instead of a new API call
+    resumed: bool = False  # Restored from a checkpoint of an earlier run
 
 
 @dataclass
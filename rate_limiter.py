@@ -0,0 +1,417 @@
+"""
+Rate Limiter Module
+
+Process-wide adaptive rate limiting for OpenAI API calls.
+
+Every Whisper and chat completion request goes through a shared limiter that
+enforces a requests-per-minute budget and an optional cost budget (e.g. audio
+minutes per minute), honors Retry-After headers, and adapts the number of
+concurrent requests with AIMD: the limit grows additively while calls succeed
+and is cut multiplicatively when the API throttles us.
+
+Limiter state lives in each process. When several processes call the API
+(dedicated workers), RATE_LIMIT_PROCESSES splits every per-minute budget
+evenly between them so together they stay within the account limits.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from openai import AuthenticationError, BadRequestError, RateLimitError
+from dotenv import load_dotenv
+
+from metrics import API_REQUESTS, API_RETRIES
+
+# Load environment variables
+load_dotenv()
+
+T = TypeVar('T')
+
+# Errors that will not succeed on retry
+_NON_RETRYABLE_ERRORS = (AuthenticationError, BadRequestError, ValueError)
+
+
+class AdaptiveRateLimiter:
+    """
+    Thread-safe token-bucket limiter with AIMD concurrency control.
+
+    Usable from both threads (acquire) and coroutines (acquire_async); every
+    successful acquire must be paired with a release.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        cost_per_minute: float = 0.0,
+        initial_concurrency: float = 4.0,
+        max_concurrency: float = 16.0,
+        min_concurrency: float = 1.0,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5
+    ):
+        """
+        Args:
+            name: Name used in log messages
+            requests_per_minute: Maximum requests started per minute (0 disables)
+            cost_per_minute: Maximum cost units per minute, e.g. audio minutes (0 disables)
+            initial_concurrency: Starting number of concurrent requests
+            max_concurrency: Upper bound for the adaptive concurrency limit
+            min_concurrency: Lower bound for the adaptive concurrency limit
+            increase_step: Slots added per window of successful requests
+            decrease_factor: Multiplier applied to the limit when throttled
+        """
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.cost_per_minute = cost_per_minute
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self._lock = threading.Lock()
+        # Threads waiting in acquire are woken through the condition, coroutines
+        # in acquire_async through their loop, whenever a slot is released
+        self._slot_released = threading.Condition(self._lock)
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self._limit = max(min_concurrency, min(initial_concurrency, max_concurrency))
+        self._in_flight = 0
+        self._request_tokens = requests_per_minute
+        self._cost_tokens = cost_per_minute
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+
+    @property
+    def concurrency_limit(self) -> float:
+        """Current adaptive concurrency limit."""
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests currently holding a slot."""
+        return self._in_flight
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute > 0:
+            self._request_tokens = min(
+                self.requests_per_minute,
+                self._request_tokens + elapsed * self.requests_per_minute / 60.0
+            )
+        if self.cost_per_minute > 0:
+            self._cost_tokens = min(
+                self.cost_per_minute,
+                self._cost_tokens + elapsed * self.cost_per_minute / 60.0
+            )
+
+    def _try_acquire(self, cost: float) -> Optional[float]:
+        """
+        Take a slot and budget tokens if available. Must hold self._lock.
+
+        Returns:
+            Optional[float]: 0 if acquired, None if all slots are taken (wait
+                for a release), otherwise the number of seconds to wait
+        """
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight >= int(self._limit):
+            return None
+
+        self._refill(now)
+        wait = 0.0
+        if self.requests_per_minute > 0 and self._request_tokens < 1:
+            wait = max(wait, (1 - self._request_tokens) * 60.0 / self.requests_per_minute)
+        if self.cost_per_minute > 0:
+            # A single request larger than the whole budget still has to go through
+            cost = min(cost, self.cost_per_minute)
+            if self._cost_tokens < cost:
+                wait = max(wait, (cost - self._cost_tokens) * 60.0 / self.cost_per_minute)
+        if wait > 0:
+            return wait
+
+        if self.requests_per_minute > 0:
+            self._request_tokens -= 1
+        if self.cost_per_minute > 0:
+            self._cost_tokens -= cost
+        self._in_flight += 1
+        return 0.0
+
+    def acquire(self, cost: float = 0.0) -> None:
+        """
+        Block the calling thread until a request may be sent.
+
+        Args:
+            cost: Budget units consumed by the request (e.g. audio minutes)
+        """
+        with self._slot_released:
+            while True:
+                wait = self._try_acquire(cost)
+                if wait == 0:
+                    return
+                self._slot_released.wait(wait)
+
+    async def acquire_async(self, cost: float = 0.0) -> None:
+        """
+        Wait without blocking the event loop until a request may be sent.
+
+        Args:
+            cost: Budget units consumed by the request (e.g. audio minutes)
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = (loop, asyncio.Event())
+            with self._lock:
+                wait = self._try_acquire(cost)
+                if wait == 0:
+                    return
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1].wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def _wake_waiters(self) -> None:
+        """Let every waiting acquire re-check for a slot. Must hold self._lock."""
+        self._slot_released.notify_all()
+        for loop, released in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(released.set)
+            except RuntimeError:
+                # The waiter's loop has been closed
+                pass
+        self._async_waiters.clear()
+
+    def release(
+        self,
+        throttled: bool = False,
+        retry_after: Optional[float] = None,
+        succeeded: bool = True
+    ) -> None:
+        """
+        Return a slot and adapt the concurrency limit.
+
+        Args:
+            throttled: True if the request was rejected with a rate limit error
+            retry_after: Seconds the server asked us to wait, if any
+            succeeded: False if the request failed for another reason; the
+                limit is then left unchanged
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            now = time.monotonic()
+            if throttled:
+                # Cut once per burst of 429s rather than once per rejected request
+                if now - self._last_decrease > 1.0:
+                    self._limit = max(self.min_concurrency, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+                    print(f"[{self.name}] Throttled by API, concurrency limit "
+                          f"reduced to {int(self._limit)}")
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, now + retry_after)
+            elif succeeded:
+                # Additive increase: roughly +increase_step per window of successes
+                self._limit = min(
+                    self.max_concurrency,
+                    self._limit + self.increase_step / self._limit
+                )
+            self._wake_waiters()
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Extract the server-provided retry delay from an API error.
+
+    Args:
+        error: Exception raised by the OpenAI client
+
+    Returns:
+        Optional[float]: Delay in seconds, or None if the server gave none
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            return None
+    return None
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[float]) -> float:
+    """Delay before the next attempt: Retry-After if given, else jittered exponential backoff."""
+    if retry_after is not None:
+        return retry_after
+    return (2 ** attempt) * (0.5 + random.random())
+
+
+def call_with_retry(
+    func: Callable[[], T],
+    limiter: AdaptiveRateLimiter,
+    cost: float = 0.0,
+    max_retries: int = 3
+) -> T:
+    """
+    Call an API function through the limiter, retrying transient failures.
+
+    Args:
+        func: Zero-argument callable performing one API request
+        limiter: Limiter the request is accounted against
+        cost: Budget units consumed per attempt (e.g. audio minutes)
+        max_retries: Maximum number of attempts
+
+    Returns:
+        The value returned by func
+
+    Raises:
+        Exception: The last error once all attempts fail, or immediately for
+            authentication, bad request and configuration errors
+    """
+    for attempt in range(max_retries):
+        limiter.acquire(cost)
+        try:
+            result = func()
+        except _NON_RETRYABLE_ERRORS:
+            limiter.release(succeeded=False)
+            API_REQUESTS.labels(api=limiter.name, outcome='error').inc()
+            raise
+        except Exception as e:
+            throttled = isinstance(e, RateLimitError)
+            retry_after = get_retry_after(e)
+            limiter.release(throttled=throttled, retry_after=retry_after, succeeded=False)
+            API_REQUESTS.labels(api=limiter.name, outcome='throttled' if throttled else 'error').inc()
+            if attempt >= max_retries - 1:
+                raise
+            API_RETRIES.labels(api=limiter.name).inc()
+            wait_time = _backoff_delay(attempt, retry_after)
+            print(f"[{limiter.name}] API request failed (attempt {attempt + 1}/{max_retries}): {e}. "
+                  f"Retrying in {wait_time:.1f} seconds...")
+            time.sleep(wait_time)
+        else:
+            limiter.release()
+            API_REQUESTS.labels(api=limiter.name, outcome='ok').inc()
+            return result
+    raise RuntimeError("max_retries must be at least 1")
+
+
+async def call_with_retry_async(
+    func: Callable[[], Awaitable[T]],
+    limiter: AdaptiveRateLimiter,
+    cost: float = 0.0,
+    max_retries: int = 3
+) -> T:
+    """
+    Await an API coroutine through the limiter, retrying transient failures.
+
+    Args:
+        func: Zero-argument callable returning a coroutine for one API request
+        limiter: Limiter the request is accounted against
+        cost: Budget units consumed per attempt (e.g. audio minutes)
+        max_retries: Maximum number of attempts
+
+    Returns:
+        The value produced by the coroutine
+
+    Raises:
+        Exception: The last error once all attempts fail, or immediately for
+            authentication, bad request and configuration errors
+    """
+    for attempt in range(max_retries):
+        await limiter.acquire_async(cost)
+        try:
+            result = await func()
+        except _NON_RETRYABLE_ERRORS:
+            limiter.release(succeeded=False)
+            API_REQUESTS.labels(api=limiter.name, outcome='error').inc()
+            raise
+        except asyncio.CancelledError:
+            limiter.release(succeeded=False)
+            raise
+        except Exception as e:
+            throttled = isinstance(e, RateLimitError)
+            retry_after = get_retry_after(e)
+            limiter.release(throttled=throttled, retry_after=retry_after, succeeded=False)
+            API_REQUESTS.labels(api=limiter.name, outcome='throttled' if throttled else 'error').inc()
+            if attempt >= max_retries - 1:
+                raise
+            API_RETRIES.labels(api=limiter.name).inc()
+            wait_time = _backoff_delay(attempt, retry_after)
+            print(f"[{limiter.name}] API request failed (attempt {attempt + 1}/{max_retries}): {e}. "
+                  f"Retrying in {wait_time:.1f} seconds...")
+            await asyncio.sleep(wait_time)
+        else:
+            limiter.release()
+            API_REQUESTS.labels(api=limiter.name, outcome='ok').inc()
+            return result
+    raise RuntimeError("max_retries must be at least 1")
+
+
+# Process-wide limiters, one per API budget
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _build_limiter(name: str) -> AdaptiveRateLimiter:
+    max_concurrency = _env_float('OPENAI_MAX_CONCURRENCY', 16)
+    # Budgets are per account, so each of the processes calling the API gets its share
+    processes = max(1.0, _env_float('RATE_LIMIT_PROCESSES', 1))
+    if name == 'whisper':
+        return AdaptiveRateLimiter(
+            name,
+            requests_per_minute=_env_float('WHISPER_REQUESTS_PER_MINUTE', 50) / processes,
+            cost_per_minute=_env_float('WHISPER_AUDIO_MINUTES_PER_MINUTE', 0) / processes,
+            initial_concurrency=_env_float('WHISPER_INITIAL_CONCURRENCY', 4),
+            max_concurrency=max_concurrency
+        )
+    if name == 'chat':
+        return AdaptiveRateLimiter(
+            name,
+            requests_per_minute=_env_float('CHAT_REQUESTS_PER_MINUTE', 500) / processes,
+            initial_concurrency=_env_float('CHAT_INITIAL_CONCURRENCY', 4),
+            max_concurrency=max_concurrency
+        )
+    return AdaptiveRateLimiter(name, requests_per_minute=0, max_concurrency=max_concurrency)
+
+
+def get_rate_limiter(name: str) -> AdaptiveRateLimiter:
+    """
+    Return the process-wide limiter for an API budget, with its per-minute
+    budgets divided by RATE_LIMIT_PROCESSES.
+
+    Args:
+        name: Budget name ("whisper" or "chat")
+
+    Returns:
+        AdaptiveRateLimiter: Shared limiter configured from the environment
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _build_limiter(name)
+            _limiters[name] = limiter
+        return limiter
@@ -0,0 +1,224 @@
+"""
+Result Cache Module
+
+Persistent, size-bounded cache for API results, plus in-flight request
+coalescing so concurrent requests for the same key share one API call.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 hex digest of a file's contents.
+
+    Args:
+        file_path: Path to the file to hash
+        block_size: Bytes read per iteration (default: 1 MB)
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_cache_key(*parts: str) -> str:
+    """
+    Combine key components into a single fixed-length cache key.
+
+    Args:
+        *parts: Strings that together identify a result
+
+    Returns:
+        str: SHA-256 hex digest of the joined parts
+    """
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    SQLite-backed key/value cache with least-recently-used eviction and an
+    optional time to live.
+
+    Safe to share between threads and between processes using the same file.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: float = 0):
+        """
+        Args:
+            path: SQLite database file for the cache
+            max_bytes: Total size of stored values above which the least
+                recently used entries are evicted
+            ttl_seconds: Entries stored longer ago than this are treated as
+                misses and removed (0 keeps them until evicted)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS ix_cache_entries_last_access '
+            'ON cache_entries (last_access)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS ix_cache_entries_created_at '
+            'ON cache_entries (created_at)'
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a value and mark it as recently used.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Optional[str]: Cached value, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds and row[1] < now - self.ttl_seconds:
+                self._conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                'UPDATE cache_entries SET last_access = ? WHERE key = ?',
+                (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """
+        Store a value, evicting least recently used entries if over budget.
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, value, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, value, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.ttl_seconds:
+            self._conn.execute(
+                'DELETE FROM cache_entries WHERE created_at < ?',
+                (time.time() - self.ttl_seconds,)
+            )
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            'SELECT key, size FROM cache_entries ORDER BY last_access'
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany('DELETE FROM cache_entries WHERE key = ?', evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return hit and miss counts for this process.
+
+        Returns:
+            Dict[str, int]: {"hits": ..., "misses": ...}
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+
+    Callers that arrive while a call for their key is running wait for its
+    result instead of starting their own. Works across threads and event loops.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    async def do_async(self, key: str, func: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+        """
+        Run func for key unless an identical call is already in flight.
+
+        Args:
+            key: Identity of the call
+            func: Zero-argument callable returning the coroutine to run
+
+        Returns:
+            Tuple[str, bool]: The result and whether it was shared from
+                another caller's in-flight call
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return await asyncio.wrap_future(future), True
+
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # Waiters were not cancelled themselves; give them a regular error
+            future.set_exception(RuntimeError(f"In-flight request for {key} was cancelled"))
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
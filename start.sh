@@ -1,4 +1,21 @@
 #!/bin/bash
 echo "Starting AI Transcriber App..."
 echo "Open http://localhost:8000 in your browser"
+
+# Metrics shared between processes start from an empty directory
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+# Optional dedicated worker processes (the API then stops processing jobs itself)
+WORKER_PROCESSES=${WORKER_PROCESSES:-0}
+if [ "$WORKER_PROCESSES" -gt 0 ]; then
+    echo "Starting $WORKER_PROCESSES worker process(es)..."
+    ./venv/bin/python -m backend.worker --processes "$WORKER_PROCESSES" &
+    WORKER_PID=$!
+    trap 'kill $WORKER_PID' EXIT
+    export EMBEDDED_WORKER=0
+fi
+
 ./venv/bin/uvicorn backend.main:app --reload --host 0.0.0.0 --port 8000
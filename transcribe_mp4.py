@@ -2,38 +2,48 @@
 """
 MP4 Transcription Script
 
-Transcribes Italian audio from MP4 video files using OpenAI's Whisper API.
-Handles large files by splitting them into chunks that comply with API size limits.
+Transcribes Italian audio from MP4 video files with the configured
+transcription engine (OpenAI's Whisper API by default). Handles large files
+by splitting them into chunks within the engine's request size limit.
 """
 
 import argparse
 import os
 import sys
 import time
-from typing import List
+from typing import Iterable, List, Optional
 
 from audio_processor import (
-    extract_audio,
+    probe_media,
+    extract_audio_with_silences,
     get_file_size_mb,
-    get_audio_duration,
     calculate_chunk_duration,
-    split_audio
+    plan_chunks,
+    iter_audio_chunks,
+    get_encoding_profile,
+    ENCODING_PROFILES,
+    DEFAULT_ENCODING_PROFILE
+)
+from whisper_client import transcribe_chunk_stream
+from transcription_engines import (
+    TranscriptionEngine,
+    create_transcription_engine,
+    TRANSCRIPTION_ENGINES,
+    TRANSCRIPTION_ENGINE
 )
-from whisper_client import transcribe_with_retry
 from file_manager import (
     create_temp_directory,
     cleanup_temp_files,
     generate_output_filename,
+    generate_checkpoint_filename,
     save_transcription
 )
+from transcript_merger import merge_transcriptions
 from progress_tracker import display_status, display_progress, display_summary
 from models import AudioChunk, TranscriptionResult
+from checkpoint import ChunkCheckpoint, FileCheckpoint, compute_plan_key, compute_segment_plan_key
 
 
-# Constants
-MAX_FILE_SIZE_MB = 24  # Target chunk size (1 MB buffer below API limit)
-WHISPER_API_LIMIT_MB = 25  # Actual API limit
-
 
 def parse_arguments() -> argparse.Namespace:
     """
@@ -43,12 +53,35 @@ def parse_arguments() -> argparse.Namespace:
         argparse.Namespace: Parsed arguments
     """
     parser = argparse.ArgumentParser(
-        description='Transcribe Italian audio from MP4 files using OpenAI Whisper API'
+        description='Transcribe Italian audio from MP4 files using OpenAI Whisper or another transcription engine'
     )
     parser.add_argument(
         'input_file',
         help='Path to the input MP4 file'
     )
+    parser.add_argument(
+        '-c', '--concurrency',
+        type=int,
+        default=None,
+        help="Number of chunks transcribed in parallel, up to the engine's limit (default: the engine's limit)"
+    )
+    parser.add_argument(
+        '-e', '--engine',
+        choices=sorted(TRANSCRIPTION_ENGINES),
+        default=TRANSCRIPTION_ENGINE,
+        help=f'Transcription engine (default: {TRANSCRIPTION_ENGINE})'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume a failed run, only re-sending the chunks that did not complete'
+    )
+    parser.add_argument(
+        '-p', '--profile',
+        choices=sorted(ENCODING_PROFILES),
+        default=DEFAULT_ENCODING_PROFILE,
+        help=f'Audio encoding profile used for extraction (default: {DEFAULT_ENCODING_PROFILE})'
+    )
     return parser.parse_args()
 
 
@@ -75,116 +108,157 @@ def validate_input_file(input_file: str) -> None:
         sys.exit(1)
 
 
-def process_audio_chunks(chunks: List[AudioChunk]) -> List[TranscriptionResult]:
+def process_audio_chunks(
+    chunks: Iterable[AudioChunk],
+    total: int,
+    plan_key: str,
+    max_workers: Optional[int] = None,
+    checkpoint: Optional[ChunkCheckpoint] = None,
+    engine: Optional[TranscriptionEngine] = None
+) -> List[TranscriptionResult]:
     """
-    Process multiple audio chunks through Whisper API.
+    Process audio chunks through the transcription engine in parallel as they are produced.
     
     Args:
-        chunks: List of audio chunks to process
+        chunks: Audio chunks to process; a generator that cuts them lets
+            transcription start before the last chunk is written
+        total: Number of chunks
+        plan_key: Identity of the chunk plan, for the checkpoint
+        max_workers: Maximum number of chunks transcribed concurrently
+            (default: the engine's limit)
+        checkpoint: Optional storage for completed chunks; chunks it already
+            holds are not sent again
+        engine: Transcription engine (default: TRANSCRIPTION_ENGINE)
         
     Returns:
-        List[TranscriptionResult]: Transcription results for all chunks
+        List[TranscriptionResult]: Transcription results for all chunks,
+            ordered by chunk index
     """
-    results = []
-    total_chunks = len(chunks)
-    
-    for chunk in chunks:
+    def report_progress(result: TranscriptionResult, completed: int, total: int) -> None:
         display_progress(
-            chunk.index + 1,
-            total_chunks,
-            f"Transcribing chunk {chunk.index + 1}"
-        )
-        
-        start_time = time.time()
-        text = transcribe_with_retry(chunk.path, language="it")
-        processing_time = time.time() - start_time
-        
-        result = TranscriptionResult(
-            chunk_index=chunk.index,
-            text=text,
-            processing_time=processing_time
+            completed,
+            total,
+            f"Transcribed chunk {result.chunk_index + 1} in {result.processing_time:.1f}s"
         )
-        results.append(result)
     
-    return results
+    return transcribe_chunk_stream(
+        chunks,
+        total,
+        plan_key,
+        language="it",
+        max_workers=max_workers,
+        on_chunk_complete=report_progress,
+        checkpoint=checkpoint,
+        engine=engine
+    )
 
 
-def main(input_file: str) -> None:
+def main(input_file: str, concurrency: Optional[int] = None, resume: bool = False, profile: Optional[str] = None, engine_name: Optional[str] = None) -> None:
     """
     Main orchestration function for the transcription workflow.
     
     Args:
         input_file: Path to the input MP4 file
+        concurrency: Number of chunks transcribed in parallel (default: the engine's limit)
+        resume: Reuse chunks completed by a previous failed run
+        profile: Name of the audio encoding profile (default: AUDIO_ENCODING_PROFILE)
+        engine_name: Transcription engine (default: TRANSCRIPTION_ENGINE)
     """
     temp_dir = None
     start_time = time.time()
+    checkpoint = FileCheckpoint(generate_checkpoint_filename(input_file))
+    if not resume:
+        checkpoint.clear()
     
     try:
         # Validate input
         display_status("Validating input file...")
         validate_input_file(input_file)
+        engine = create_transcription_engine(engine_name)
+        display_status(f"Transcription engine: {engine.name} ({engine.model}, chunks up to {engine.max_chunk_mb:g} MB)")
         
         # Create temporary directory
         temp_dir = create_temp_directory()
         display_status(f"Created temporary directory: {temp_dir}")
         
         # Extract audio from MP4
-        display_status("Extracting audio from MP4...")
-        audio_file = os.path.join(temp_dir, "extracted_audio.mp3")
-        extract_audio(input_file, audio_file)
+        encoding_profile = get_encoding_profile(profile)
+        display_status(f"Extracting audio from MP4 ({encoding_profile.description})...")
+        audio_file = os.path.join(temp_dir, "extracted_audio" + encoding_profile.extension)
+        # A single probe and a single decode pass: the pauses used to place
+        # chunk boundaries are detected while the audio is encoded
+        media = probe_media(input_file)
+        silences = extract_audio_with_silences(input_file, audio_file, encoding_profile)
         display_status("Audio extraction complete")
         
         # Check file size and determine if chunking is needed
         audio_size_mb = get_file_size_mb(audio_file)
         display_status(f"Audio file size: {audio_size_mb:.2f} MB")
         
+        duration = media.duration
         chunks: List[AudioChunk] = []
         
-        if audio_size_mb > MAX_FILE_SIZE_MB:
+        if audio_size_mb > engine.max_chunk_mb:
             # Need to split into chunks
             display_status("File exceeds size limit. Splitting into chunks...")
             
-            duration = get_audio_duration(audio_file)
             chunk_duration = calculate_chunk_duration(
                 audio_size_mb,
                 duration,
-                MAX_FILE_SIZE_MB
+                engine.max_chunk_mb
+            )
+            
+            segments = plan_chunks(duration, chunk_duration, silences)
+            hard_cuts = sum(1 for segment in segments if segment.overlap > 0)
+            display_status(
+                f"Planned {len(segments)} chunks "
+                f"({len(segments) - 1 - hard_cuts} cut in pauses, {hard_cuts} overlapping)"
             )
             
-            chunk_paths = split_audio(audio_file, chunk_duration, temp_dir)
-            display_status(f"Created {len(chunk_paths)} chunks")
+            # Each chunk is transcribed as soon as it has been cut
+            def cut_chunks():
+                for chunk in iter_audio_chunks(audio_file, segments, temp_dir, engine.max_chunk_mb):
+                    chunks.append(chunk)
+                    yield chunk
             
-            # Create AudioChunk objects
-            for idx, chunk_path in enumerate(chunk_paths):
-                chunk_size = get_file_size_mb(chunk_path)
-                chunks.append(AudioChunk(
-                    path=chunk_path,
-                    index=idx,
-                    duration=chunk_duration,
-                    size_mb=chunk_size
-                ))
+            chunk_source = cut_chunks()
+            total_chunks = len(segments)
+            plan_key = compute_segment_plan_key(audio_size_mb, segments)
         else:
             # Single file, no chunking needed
             display_status("File size is within limits. No chunking required.")
             chunks.append(AudioChunk(
                 path=audio_file,
                 index=0,
-                duration=0.0,
+                duration=duration,
                 size_mb=audio_size_mb
             ))
+            chunk_source = chunks
+            total_chunks = 1
+            plan_key = compute_plan_key(chunks)
         
-        # Process chunks through Whisper API
-        display_status(f"Starting transcription of {len(chunks)} chunk(s)...")
-        results = process_audio_chunks(chunks)
+        # Process chunks through the transcription engine
+        display_status(f"Starting transcription of {total_chunks} chunk(s)...")
+        results = process_audio_chunks(
+            chunk_source,
+            total_chunks,
+            plan_key,
+            max_workers=concurrency,
+            checkpoint=checkpoint,
+            engine=engine
+        )
+        resumed = sum(1 for result in results if result.resumed)
+        if resumed:
+            display_status(f"Resumed {resumed} chunk(s) from the previous run")
         
         # Combine transcription results in sequential order
         display_status("Combining transcription results...")
-        results.sort(key=lambda r: r.chunk_index)
-        combined_text = "\n".join(result.text for result in results)
+        combined_text = merge_transcriptions(chunks, results)
         
         # Save transcription to output file
         output_file = generate_output_filename(input_file)
         save_transcription(combined_text, output_file)
+        checkpoint.clear()
         
         # Display summary
         total_time = time.time() - start_time
@@ -198,6 +272,8 @@ def main(input_file: str) -> None:
         sys.exit(3)
     except RuntimeError as e:
         print(f"\nProcessing Error: {e}")
+        if os.path.exists(checkpoint.path):
+            print("Completed chunks were saved. Re-run with --resume to only send the missing ones.")
         sys.exit(2)
     except IOError as e:
         print(f"\nFile System Error: {e}")
@@ -214,4 +290,4 @@ def main(input_file: str) -> None:
 
 if __name__ == "__main__":
     args = parse_arguments()
-    main(args.input_file)
+    main(args.input_file, args.concurrency, args.resume, args.profile, args.engine)
@@ -0,0 +1,111 @@
+"""
+Transcript Merger Module
+
+Joins chunk transcriptions in order, removing the text repeated at seams
+where consecutive chunks overlap.
+"""
+
+import re
+from difflib import SequenceMatcher
+from typing import List, Sequence, Tuple
+
+from models import AudioChunk, TranscriptionResult
+
+
+# Spoken words per second, generously rounded up, to bound the seam search
+WORDS_PER_SECOND = 4
+# Words at the edges of a seam that may be garbled (cut mid-word) and are skipped
+EDGE_TOLERANCE_WORDS = 3
+MIN_MATCH_WORDS = 2
+# A single shared word is trusted as a seam anchor only if it is at least this long
+MIN_SINGLE_WORD_LENGTH = 6
+
+
+def _normalize(word: str) -> str:
+    return re.sub(r'[^\w]', '', word.lower())
+
+
+def dedupe_seam(previous: str, following: str, overlap_seconds: float) -> Tuple[str, str]:
+    """
+    Remove the words repeated on both sides of a seam between two chunks.
+
+    The overlapping audio is transcribed twice, so the tail of `previous` and
+    the head of `following` share a run of words. The longest common run near
+    both edges is kept once: `following` loses everything up to its end, and
+    `previous` loses the words after it, which are cut off mid-word by the
+    hard cut and appear whole in `following`.
+
+    Args:
+        previous: Text of the earlier chunk
+        following: Text of the chunk that starts overlap_seconds before the
+            previous chunk ends
+        overlap_seconds: Length of the shared audio
+
+    Returns:
+        Tuple[str, str]: Both texts with the repetition removed, or unchanged
+            if no reliable match is found
+    """
+    if overlap_seconds <= 0 or not previous or not following:
+        return previous, following
+
+    window = max(MIN_MATCH_WORDS, int(overlap_seconds * WORDS_PER_SECOND)) + EDGE_TOLERANCE_WORDS
+    previous_words = previous.split()
+    tail = previous_words[-window:]
+    following_words = following.split()
+    head = following_words[:window]
+
+    tail_keys = [_normalize(word) for word in tail]
+    matcher = SequenceMatcher(
+        a=tail_keys,
+        b=[_normalize(word) for word in head],
+        autojunk=False
+    )
+    match = matcher.find_longest_match(0, len(tail), 0, len(head))
+
+    trailing = len(tail) - (match.a + match.size)
+    reliable = match.size >= MIN_MATCH_WORDS or (
+        match.size == 1 and len(tail_keys[match.a]) >= MIN_SINGLE_WORD_LENGTH
+    )
+    if not reliable or trailing > EDGE_TOLERANCE_WORDS or match.b > EDGE_TOLERANCE_WORDS:
+        return previous, following
+
+    kept_previous = previous_words[:len(previous_words) - trailing]
+    return ' '.join(kept_previous), ' '.join(following_words[match.b + match.size:])
+
+
+def merge_texts(texts: Sequence[str], overlaps: Sequence[float]) -> str:
+    """
+    Join chunk texts in order, de-duplicating overlapping seams.
+
+    Args:
+        texts: Text of each chunk, in order
+        overlaps: Seconds each chunk overlaps the previous one (0 for the first)
+
+    Returns:
+        str: Combined text, one chunk per line
+    """
+    merged: List[str] = []
+    for index, text in enumerate(texts):
+        if merged:
+            merged[-1], text = dedupe_seam(merged[-1], text, overlaps[index])
+        merged.append(text)
+    return "\n".join(merged)
+
+
+def merge_transcriptions(chunks: List[AudioChunk], results: List[TranscriptionResult]) -> str:
+    """
+    Combine chunk results into the final transcription.
+
+    Args:
+        chunks: Chunks that were transcribed (their overlap drives de-duplication)
+        results: Results for those chunks, in any order
+
+    Returns:
+        str: Combined text, one chunk per line
+    """
+    overlaps = {chunk.index: chunk.overlap for chunk in chunks}
+    ordered = sorted(results, key=lambda r: r.chunk_index)
+    return merge_texts(
+        [result.text for result in ordered],
+        [overlaps.get(result.chunk_index, 0.0) for result in ordered]
+    )
@@ -0,0 +1,263 @@
+"""
+Transcription Engines Module
+
+Backends that turn one audio chunk into text. The engine is selected with
+TRANSCRIPTION_ENGINE and carries its own model, request size limit and
+concurrency limit; whisper_client adds retries, caching and chunk
+scheduling on top of whichever engine is configured.
+"""
+
+import asyncio
+import hashlib
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+from openai import AsyncOpenAI, OpenAI
+from dotenv import load_dotenv
+
+from metrics import WHISPER_UPLOAD_BYTES
+
+
+# Load environment variables
+load_dotenv()
+
+# Engine selection; unset values fall back to the engine's own defaults
+TRANSCRIPTION_ENGINE = os.getenv('TRANSCRIPTION_ENGINE', 'openai')
+TRANSCRIPTION_MODEL = os.getenv('TRANSCRIPTION_MODEL')
+TRANSCRIPTION_BASE_URL = os.getenv('TRANSCRIPTION_BASE_URL')
+TRANSCRIPTION_API_KEY = os.getenv('TRANSCRIPTION_API_KEY')
+TRANSCRIPTION_MAX_CHUNK_MB = os.getenv('TRANSCRIPTION_MAX_CHUNK_MB')
+TRANSCRIPTION_CONCURRENCY = os.getenv('TRANSCRIPTION_CONCURRENCY')
+
+
+def _read_audio_file(audio_path: str) -> bytes:
+    """Read an audio file into memory so it can be uploaded asynchronously."""
+    with open(audio_path, 'rb') as audio_file:
+        return audio_file.read()
+
+
+class TranscriptionEngine(ABC):
+    """
+    Base class for transcription backends.
+
+    Attributes:
+        name: Engine name, as used in TRANSCRIPTION_ENGINE
+        model: Model the engine transcribes with
+        max_chunk_mb: Largest audio chunk sent in one request; longer audio
+            is split into chunks below this size
+        max_concurrency: Most chunks transcribed in parallel per job
+        limiter_name: Shared rate limiter budget the requests count against,
+            or None for engines that need no rate limiting or retries
+        cacheable: Whether results are kept in the transcription cache
+    """
+
+    name = ''
+    default_model = ''
+    default_max_chunk_mb = 24.0
+    default_concurrency = 4
+    limiter_name: Optional[str] = None
+    cacheable = True
+
+    def __init__(self, model: Optional[str] = None, max_chunk_mb: Optional[float] = None, max_concurrency: Optional[int] = None):
+        self.model = model or self.default_model
+        self.max_chunk_mb = float(max_chunk_mb or self.default_max_chunk_mb)
+        self.max_concurrency = max(1, int(max_concurrency or self.default_concurrency))
+
+    @property
+    def cache_namespace(self) -> str:
+        """Identifies the engine and model in transcription cache keys."""
+        return f"{self.name}:{self.model}"
+
+    @abstractmethod
+    def transcribe(self, audio_path: str, language: str = "it") -> str:
+        """
+        Transcribe one audio file.
+
+        Args:
+            audio_path: Path to the audio file, at most max_chunk_mb
+            language: Language code of the speech
+
+        Returns:
+            str: Transcribed text
+        """
+
+    @abstractmethod
+    async def transcribe_async(self, audio_path: str, language: str = "it") -> str:
+        """Transcribe one audio file without blocking the event loop."""
+
+
+class OpenAIEngine(TranscriptionEngine):
+    """
+    OpenAI's Whisper API, or any proxy of it set with base_url.
+
+    Counts against the shared "whisper" rate limit budget.
+    """
+
+    name = 'openai'
+    default_model = 'whisper-1'
+    default_max_chunk_mb = 24.0  # 1 MB below the 25 MB API limit
+    default_concurrency = 4
+    limiter_name = 'whisper'
+    api_key_env = 'OPENAI_API_KEY'
+
+    def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 max_chunk_mb: Optional[float] = None, max_concurrency: Optional[int] = None):
+        super().__init__(model, max_chunk_mb, max_concurrency)
+        # None lets the client fall back to OPENAI_BASE_URL and the public API
+        self.base_url = base_url
+        self.api_key = api_key
+
+    @property
+    def cache_namespace(self) -> str:
+        # Same key as before engines were configurable, so existing cache entries stay valid
+        return self.model
+
+    def _api_key(self) -> str:
+        api_key = self.api_key or os.getenv(self.api_key_env)
+        if not api_key:
+            raise ValueError(
+                f"{self.api_key_env} not found in environment variables. "
+                "Please set it in your .env file or environment."
+            )
+        return api_key
+
+    def _client(self) -> OpenAI:
+        # Retries are handled by the shared rate limiter, not per client
+        return OpenAI(api_key=self._api_key(), base_url=self.base_url, max_retries=0)
+
+    def _async_client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(api_key=self._api_key(), base_url=self.base_url, max_retries=0)
+
+    def transcribe(self, audio_path: str, language: str = "it") -> str:
+        client = self._client()
+        WHISPER_UPLOAD_BYTES.inc(os.path.getsize(audio_path))
+        with open(audio_path, 'rb') as audio_file:
+            response = client.audio.transcriptions.create(
+                model=self.model,
+                file=audio_file,
+                language=language
+            )
+        return response.text
+
+    async def transcribe_async(self, audio_path: str, language: str = "it") -> str:
+        loop = asyncio.get_running_loop()
+        audio_bytes = await loop.run_in_executor(None, _read_audio_file, audio_path)
+        WHISPER_UPLOAD_BYTES.inc(len(audio_bytes))
+        async with self._async_client() as client:
+            response = await client.audio.transcriptions.create(
+                model=self.model,
+                file=(os.path.basename(audio_path), audio_bytes),
+                language=language
+            )
+        return response.text
+
+
+class OpenAICompatibleEngine(OpenAIEngine):
+    """
+    A self-hosted server with an OpenAI-compatible /audio/transcriptions
+    endpoint (e.g. faster-whisper-server, LocalAI, whisper.cpp server).
+
+    Needs a base_url; the API key is optional. Requests count against their
+    own "transcription" rate limit budget, not OpenAI's.
+    """
+
+    name = 'openai_compatible'
+    default_max_chunk_mb = 24.0
+    default_concurrency = 2  # A LAN server usually has one GPU
+    limiter_name = 'transcription'
+    api_key_env = 'TRANSCRIPTION_API_KEY'
+
+    def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 max_chunk_mb: Optional[float] = None, max_concurrency: Optional[int] = None):
+        if not base_url:
+            raise ValueError(
+                "The openai_compatible transcription engine needs TRANSCRIPTION_BASE_URL, "
+                "e.g. http://whisper.lan:8000/v1"
+            )
+        super().__init__(model, base_url, api_key, max_chunk_mb, max_concurrency)
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"{self.name}:{self.base_url}:{self.model}"
+
+    def _api_key(self) -> str:
+        # The client requires a key even when the server does not check it
+        return self.api_key or os.getenv(self.api_key_env) or 'not-needed'
+
+
+class LocalTestEngine(TranscriptionEngine):
+    """
+    Deterministic in-process engine for tests and offline development.
+
+    Returns text derived from the audio bytes, so the same chunk always gives
+    the same transcript; no network access, API key or rate limiting.
+    """
+
+    name = 'local'
+    default_model = 'local-test'
+    default_concurrency = 8
+    cacheable = False
+
+    def transcribe(self, audio_path: str, language: str = "it") -> str:
+        digest = hashlib.sha256(_read_audio_file(audio_path)).hexdigest()
+        size_kb = os.path.getsize(audio_path) // 1024
+        return f"[{language}] Local transcript {digest[:12]} ({size_kb} KB of audio)."
+
+    async def transcribe_async(self, audio_path: str, language: str = "it") -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.transcribe, audio_path, language)
+
+
+TRANSCRIPTION_ENGINES: Dict[str, Type[TranscriptionEngine]] = {
+    OpenAIEngine.name: OpenAIEngine,
+    OpenAICompatibleEngine.name: OpenAICompatibleEngine,
+    LocalTestEngine.name: LocalTestEngine,
+}
+
+_engine: Optional[TranscriptionEngine] = None
+
+
+def create_transcription_engine(name: Optional[str] = None) -> TranscriptionEngine:
+    """
+    Create an engine configured from the environment.
+
+    Args:
+        name: Engine name (default: TRANSCRIPTION_ENGINE or 'openai')
+
+    Returns:
+        TranscriptionEngine: The configured engine
+
+    Raises:
+        ValueError: If the engine does not exist or is missing settings
+    """
+    name = name or TRANSCRIPTION_ENGINE
+    try:
+        engine_class = TRANSCRIPTION_ENGINES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown transcription engine '{name}'. "
+            f"Available engines: {', '.join(TRANSCRIPTION_ENGINES)}"
+        )
+    options = {
+        'model': TRANSCRIPTION_MODEL,
+        'max_chunk_mb': float(TRANSCRIPTION_MAX_CHUNK_MB) if TRANSCRIPTION_MAX_CHUNK_MB else None,
+        'max_concurrency': int(TRANSCRIPTION_CONCURRENCY) if TRANSCRIPTION_CONCURRENCY else None,
+    }
+    if issubclass(engine_class, OpenAIEngine):
+        options['base_url'] = TRANSCRIPTION_BASE_URL
+        options['api_key'] = TRANSCRIPTION_API_KEY
+    return engine_class(**options)
+
+
+def get_transcription_engine() -> TranscriptionEngine:
+    """
+    Return the process-wide engine selected by TRANSCRIPTION_ENGINE.
+
+    Returns:
+        TranscriptionEngine: Shared engine configured from the environment
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_transcription_engine()
+    return _engine
@@ -1,109 +1,348 @@
 """
 Whisper API Client Module
 
-Handles communication with OpenAI's Whisper API for audio transcription.
+Sends audio chunks to the configured transcription engine (OpenAI's
+Whisper API by default) with retries, caching and bounded concurrency.
 """
 
+import asyncio
+import inspect
 import os
 import time
-from typing import Optional
-from openai import OpenAI, AuthenticationError, APIError, RateLimitError
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple
+from openai import AuthenticationError, BadRequestError
 from dotenv import load_dotenv
 
+from checkpoint import ChunkCheckpoint, compute_plan_key
+from models import AudioChunk, TranscriptionResult
+from rate_limiter import call_with_retry_async, get_rate_limiter
+from result_cache import ResultCache, SingleFlight, hash_file, make_cache_key
+from metrics import CACHE_REQUESTS, STAGE_SECONDS
+from transcription_engines import TranscriptionEngine, get_transcription_engine
+
 
 # Load environment variables
 load_dotenv()
 
+# Local cache of transcriptions keyed by chunk audio content, language, engine and model
+WHISPER_CACHE_ENABLED = os.getenv('WHISPER_CACHE_ENABLED', '1') != '0'
+WHISPER_CACHE_PATH = os.getenv('WHISPER_CACHE_PATH', os.path.join('cache', 'whisper_cache.db'))
+WHISPER_CACHE_MAX_MB = float(os.getenv('WHISPER_CACHE_MAX_MB', '512'))
+
+# Called as (result, completed_count, total_chunks) when a chunk finishes; may be a coroutine function
+ChunkCallback = Callable[[TranscriptionResult, int, int], Optional[Awaitable[None]]]
+
+_cache: Optional[ResultCache] = None
+_in_flight = SingleFlight()
+
+
+class TranscriptionError(RuntimeError):
+    """Raised when a chunk cannot be transcribed after all retry attempts."""
 
-def _get_openai_client() -> OpenAI:
+
+def _get_cache() -> Optional[ResultCache]:
+    """Return the process-wide transcription cache, or None if disabled."""
+    global _cache
+    if WHISPER_CACHE_ENABLED and _cache is None:
+        _cache = ResultCache(WHISPER_CACHE_PATH, int(WHISPER_CACHE_MAX_MB * 1024 * 1024))
+    return _cache
+
+
+async def transcribe_with_retry_async(
+    audio_path: str,
+    language: str = "it",
+    max_retries: int = 3,
+    audio_seconds: float = 0.0,
+    engine: Optional[TranscriptionEngine] = None
+) -> str:
     """
-    Create and return an OpenAI client with API key from environment.
+    Transcribe audio asynchronously through the shared rate limiter with retry logic.
+    
+    Retries back off exponentially, or for as long as the API's
+    Retry-After header asks. Engines without a limiter (the local engine)
+    are called once, directly.
     
+    Args:
+        audio_path: Path to the audio file to transcribe
+        language: Language code for transcription (default: "it" for Italian)
+        max_retries: Maximum number of retry attempts (default: 3)
+        audio_seconds: Duration of the audio, charged against the
+            audio-minutes-per-minute budget
+        engine: Engine to use (default: the one set by TRANSCRIPTION_ENGINE)
+        
     Returns:
-        OpenAI: Configured OpenAI client
+        str: Transcribed text
         
     Raises:
-        ValueError: If OPENAI_API_KEY is not set
+        ValueError: If API key is not configured
+        AuthenticationError: If API authentication fails (no retry)
+        TranscriptionError: If all retry attempts fail
     """
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        raise ValueError(
-            "OPENAI_API_KEY not found in environment variables. "
-            "Please set it in your .env file or environment."
+    engine = engine or get_transcription_engine()
+    try:
+        with STAGE_SECONDS.labels(stage='whisper_chunk').time():
+            if engine.limiter_name is None:
+                return await engine.transcribe_async(audio_path, language)
+            return await call_with_retry_async(
+                lambda: engine.transcribe_async(audio_path, language),
+                limiter=get_rate_limiter(engine.limiter_name),
+                cost=audio_seconds / 60.0,
+                max_retries=max_retries
+            )
+    except (AuthenticationError, BadRequestError, ValueError):
+        raise
+    except Exception as e:
+        raise TranscriptionError(
+            f"Failed to transcribe audio after {max_retries} attempts: {e}"
         )
-    return OpenAI(api_key=api_key)
 
 
-def transcribe_audio(audio_path: str, language: str = "it") -> str:
+async def transcribe_cached_async(
+    audio_path: str,
+    language: str = "it",
+    audio_seconds: float = 0.0,
+    engine: Optional[TranscriptionEngine] = None
+) -> Tuple[str, bool]:
     """
-    Transcribe an audio file using OpenAI's Whisper API.
+    Transcribe audio, reusing earlier results for identical audio.
+    
+    Results are cached by a hash of the audio bytes plus language, engine
+    and model. Concurrent requests for the same audio share a single API call.
     
     Args:
         audio_path: Path to the audio file to transcribe
         language: Language code for transcription (default: "it" for Italian)
+        audio_seconds: Duration of the audio, charged against the
+            audio-minutes-per-minute budget
+        engine: Engine to use (default: the one set by TRANSCRIPTION_ENGINE)
         
     Returns:
-        str: Transcribed text
+        Tuple[str, bool]: Transcribed text and whether it was served without
+            a new API call (cache hit or shared in-flight request)
         
     Raises:
-        ValueError: If API key is not configured
-        AuthenticationError: If API authentication fails
-        APIError: If API request fails
+        TranscriptionError: If all retry attempts fail
     """
-    client = _get_openai_client()
+    engine = engine or get_transcription_engine()
+    cache = _get_cache() if engine.cacheable else None
+    if cache is None:
+        return await transcribe_with_retry_async(audio_path, language, audio_seconds=audio_seconds, engine=engine), False
     
-    with open(audio_path, 'rb') as audio_file:
-        response = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            language=language
-        )
+    loop = asyncio.get_running_loop()
+    key = make_cache_key(await loop.run_in_executor(None, hash_file, audio_path), language, engine.cache_namespace)
+    cached = await loop.run_in_executor(None, cache.get, key)
+    if cached is not None:
+        CACHE_REQUESTS.labels(cache='whisper', result='hit').inc()
+        return cached, True
+    
+    async def _transcribe_and_store() -> str:
+        text = await transcribe_with_retry_async(audio_path, language, audio_seconds=audio_seconds, engine=engine)
+        await loop.run_in_executor(None, cache.put, key, text)
+        return text
     
-    return response.text
+    text, shared = await _in_flight.do_async(key, _transcribe_and_store)
+    CACHE_REQUESTS.labels(cache='whisper', result='shared' if shared else 'miss').inc()
+    return text, shared
 
 
-def transcribe_with_retry(
-    audio_path: str,
+async def transcribe_chunk_stream_async(
+    chunks: AsyncIterable[AudioChunk],
+    total: int,
+    plan_key: str,
     language: str = "it",
-    max_retries: int = 3
-) -> str:
+    max_workers: Optional[int] = None,
+    on_chunk_complete: Optional[ChunkCallback] = None,
+    checkpoint: Optional[ChunkCheckpoint] = None,
+    engine: Optional[TranscriptionEngine] = None
+) -> List[TranscriptionResult]:
     """
-    Transcribe audio with exponential backoff retry logic.
+    Transcribe audio chunks as they are produced, on the running event loop.
+    
+    Each chunk is sent as soon as the stream yields it, so producing later
+    chunks (e.g. cutting them with FFmpeg) overlaps with transcribing
+    earlier ones. At most max_workers requests are in flight at once, and
+    on_chunk_complete runs as each chunk finishes, while later chunks are
+    still being produced.
+    
+    With a checkpoint, chunks completed by an earlier run of the same chunk
+    plan are restored instead of re-sent, each new result is saved as soon
+    as it finishes, and a failing chunk lets the others finish first so
+    their results are kept for the next attempt.
     
     Args:
-        audio_path: Path to the audio file to transcribe
+        chunks: Audio chunks to transcribe, in any order
+        total: Number of chunks the stream is planned to yield; progress
+            counts any extra ones it yields
+        plan_key: Identity of the chunk plan, for the checkpoint
         language: Language code for transcription (default: "it" for Italian)
-        max_retries: Maximum number of retry attempts (default: 3)
+        max_workers: Maximum number of concurrent API requests, capped
+            at the engine's limit (default: the engine's limit)
+        on_chunk_complete: Optional callback invoked as
+            (result, completed_count, total_chunks) when a chunk finishes
+        checkpoint: Optional storage for completed chunk results
+        engine: Engine to use (default: the one set by TRANSCRIPTION_ENGINE)
         
     Returns:
-        str: Transcribed text
+        List[TranscriptionResult]: Results ordered by chunk_index
         
     Raises:
-        ValueError: If API key is not configured
-        AuthenticationError: If API authentication fails (no retry)
-        APIError: If all retry attempts fail
+        TranscriptionError: If any chunk fails after all retry attempts
+    """
+    results: List[TranscriptionResult] = []
+    restored = {}
+    if checkpoint is not None:
+        restored = await checkpoint.load_async(plan_key)
+        for result in restored.values():
+            result.resumed = True
+            results.append(result)
+    
+    engine = engine or get_transcription_engine()
+    semaphore = asyncio.Semaphore(max(1, min(max_workers or engine.max_concurrency, engine.max_concurrency)))
+    
+    async def _transcribe_chunk(chunk: AudioChunk) -> TranscriptionResult:
+        async with semaphore:
+            start_time = time.time()
+            text, cached = await transcribe_cached_async(
+                chunk.path,
+                language=language,
+                audio_seconds=chunk.duration,
+                engine=engine
+            )
+            result = TranscriptionResult(
+                chunk_index=chunk.index,
+                text=text,
+                processing_time=time.time() - start_time,
+                cached=cached
+            )
+            if checkpoint is not None:
+                await checkpoint.save_async(plan_key, chunk, result)
+        results.append(result)
+        if on_chunk_complete:
+            reported = on_chunk_complete(result, len(results), max(total, produced))
+            if inspect.isawaitable(reported):
+                await reported
+        return result
+    
+    tasks: List[asyncio.Future] = []
+    produced = 0
+    try:
+        async for chunk in chunks:
+            produced += 1
+            if chunk.index not in restored:
+                tasks.append(asyncio.ensure_future(_transcribe_chunk(chunk)))
+            # Stop producing once a chunk has failed
+            failed = next((task for task in tasks if task.done() and not task.cancelled() and task.exception()), None)
+            if failed is not None:
+                failed.result()
+        
+        await asyncio.gather(*tasks)
+    except BaseException as e:
+        if checkpoint is not None and not isinstance(e, asyncio.CancelledError):
+            # Let chunks already under way finish so their results are checkpointed
+            await asyncio.gather(*tasks, return_exceptions=True)
+        else:
+            # Stop the remaining requests as soon as one chunk fails
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    
+    results.sort(key=lambda r: r.chunk_index)
+    return results
+
+
+async def _iterate_list(items: List[AudioChunk]) -> AsyncIterator[AudioChunk]:
+    for item in items:
+        yield item
+
+
+async def _iterate_blocking(items: Iterable[AudioChunk]) -> AsyncIterator[AudioChunk]:
+    """Adapt a blocking iterable, advancing it in a worker thread."""
+    iterator = iter(items)
+    loop = asyncio.get_running_loop()
+    done = object()
+    while True:
+        item = await loop.run_in_executor(None, next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+async def transcribe_chunks_async(
+    chunks: List[AudioChunk],
+    language: str = "it",
+    max_workers: Optional[int] = None,
+    on_chunk_complete: Optional[ChunkCallback] = None,
+    checkpoint: Optional[ChunkCheckpoint] = None,
+    engine: Optional[TranscriptionEngine] = None
+) -> List[TranscriptionResult]:
+    """
+    Transcribe audio chunks concurrently on the running event loop.
+    
+    At most max_workers requests are in flight at once, so the wall-clock
+    time is roughly that of the slowest chunk instead of the sum. See
+    transcribe_chunk_stream_async for the checkpoint behaviour.
+    
+    Args:
+        chunks: List of audio chunks to transcribe
+        language: Language code for transcription (default: "it" for Italian)
+        max_workers: Maximum number of concurrent API requests, capped
+            at the engine's limit (default: the engine's limit)
+        on_chunk_complete: Optional callback invoked as
+            (result, completed_count, total_chunks) when a chunk finishes
+        checkpoint: Optional storage for completed chunk results
+        engine: Engine to use (default: the one set by TRANSCRIPTION_ENGINE)
+        
+    Returns:
+        List[TranscriptionResult]: Results ordered by chunk_index
+        
+    Raises:
+        TranscriptionError: If any chunk fails after all retry attempts
+    """
+    if not chunks:
+        return []
+    return await transcribe_chunk_stream_async(
+        _iterate_list(chunks), len(chunks), compute_plan_key(chunks),
+        language, max_workers, on_chunk_complete, checkpoint, engine
+    )
+
+
+def transcribe_chunk_stream(
+    chunks: Iterable[AudioChunk],
+    total: int,
+    plan_key: str,
+    language: str = "it",
+    max_workers: Optional[int] = None,
+    on_chunk_complete: Optional[ChunkCallback] = None,
+    checkpoint: Optional[ChunkCheckpoint] = None,
+    engine: Optional[TranscriptionEngine] = None
+) -> List[TranscriptionResult]:
+    """
+    Transcribe chunks from a blocking iterator (e.g. iter_audio_chunks) as they are produced.
+    
+    The iterator is advanced in a worker thread, so producing the next chunk
+    overlaps with the requests already in flight. Runs on a private event
+    loop, so it must not be called from inside a running loop.
+    
+    Args:
+        chunks: Audio chunks to transcribe
+        total: Number of chunks the iterator is planned to yield; progress
+            counts any extra ones it yields
+        plan_key: Identity of the chunk plan, for the checkpoint
+        language: Language code for transcription (default: "it" for Italian)
+        max_workers: Maximum number of concurrent API requests, capped
+            at the engine's limit (default: the engine's limit)
+        on_chunk_complete: Optional callback invoked as
+            (result, completed_count, total_chunks) when a chunk finishes
+        checkpoint: Optional storage for completed chunk results
+        engine: Engine to use (default: the one set by TRANSCRIPTION_ENGINE)
+        
+    Returns:
+        List[TranscriptionResult]: Results ordered by chunk_index
+        
+    Raises:
+        TranscriptionError: If any chunk fails after all retry attempts
     """
-    last_error: Optional[Exception] = None
-    
-    for attempt in range(max_retries):
-        try:
-            return transcribe_audio(audio_path, language)
-        except AuthenticationError:
-            # Don't retry authentication errors
-            raise
-        except (APIError, RateLimitError, Exception) as e:
-            last_error = e
-            if attempt < max_retries - 1:
-                # Exponential backoff: 1s, 2s, 4s
-                wait_time = 2 ** attempt
-                print(f"API request failed (attempt {attempt + 1}/{max_retries}). "
-                      f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                # Last attempt failed
-                raise APIError(
-                    f"Failed to transcribe audio after {max_retries} attempts: {last_error}"
-                )
-    
-    # Should never reach here, but just in case
-    raise APIError(f"Transcription failed: {last_error}")
+    return asyncio.run(transcribe_chunk_stream_async(
+        _iterate_blocking(chunks), total, plan_key, language, max_workers, on_chunk_complete, checkpoint, engine
+    ))